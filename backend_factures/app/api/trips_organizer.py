@@ -1,20 +1,33 @@
+import queue
 import threading
+from concurrent.futures import Future
 import colorlog
 import schedule
 import time
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import logging
+from app.services.event_bus import TRIP_SAVED_TO_TEMP, WEEKEND_INVOICE_SAVED, event_bus
+
+SWEEP_REQUESTED = "sweep_requested"
 
 class BackgroundTripOrganizer:
-    def __init__(self, file_manager, check_interval_minutes: int = 60):
+    def __init__(self, file_manager, check_interval_minutes: int = 60, sweep_mode: str = "hash_join"):
         self.file_manager = file_manager
         self.check_interval_minutes = check_interval_minutes
+        self.sweep_mode = sweep_mode
         self.is_running = False
         self.thread = None
         self.logger = self._setup_colored_logger()
+        self._events: "queue.Queue[tuple]" = queue.Queue()
+        self._pending_lock = threading.Lock()
+        self._pending_by_code: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+        self.counters = {
+            "events_received": {WEEKEND_INVOICE_SAVED: 0, TRIP_SAVED_TO_TEMP: 0},
+            "matches": {WEEKEND_INVOICE_SAVED: 0, TRIP_SAVED_TO_TEMP: 0, "sweep": 0}
+        }
 
         if not self.logger.handlers:
             logging.basicConfig(
@@ -48,14 +61,26 @@ class BackgroundTripOrganizer:
             self.logger.warning("El organizador en segundo plano ya está ejecutándose")
             return
         self.is_running = True
+        event_bus.subscribe(WEEKEND_INVOICE_SAVED, self._on_weekend_invoice_saved)
+        event_bus.subscribe(TRIP_SAVED_TO_TEMP, self._on_trip_saved_to_temp)
         self.thread = threading.Thread(target=self._run_scheduler, daemon=True, name="BackgroundTripOrganizer")
         self.thread.start()
         self.logger.info(f"✅ Organizador en segundo plano iniciado. Revisando cada {self.check_interval_minutes} minutos")
         
     def stop(self):
         self.is_running = False
+        event_bus.unsubscribe(WEEKEND_INVOICE_SAVED, self._on_weekend_invoice_saved)
+        event_bus.unsubscribe(TRIP_SAVED_TO_TEMP, self._on_trip_saved_to_temp)
+        self._events.put(None)
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=5)
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event is not None and event[0] == SWEEP_REQUESTED:
+                event[1].set_result({"success": False, "error": "El organizador se detuvo antes de ejecutar la organización"})
         self.logger.info("🛑 Organizador en segundo plano detenido")
         
     def _run_scheduler(self):
@@ -65,68 +90,142 @@ class BackgroundTripOrganizer:
         while self.is_running:
             try:
                 schedule.run_pending()
-                time.sleep(30) 
+                try:
+                    event = self._events.get(timeout=30)
+                except queue.Empty:
+                    continue
+                if event is None:
+                    continue
+                if event[0] == SWEEP_REQUESTED:
+                    event[1].set_result(self.organize_now())
+                else:
+                    self._handle_event(*event)
             except Exception as e:
                 self.logger.error(f"❌ Error en el organizador en segundo plano: {e}")
                 time.sleep(60)  
                 
         self.logger.info("🔄 Loop del planificador terminado")
                 
+    def _on_weekend_invoice_saved(self, payload: Dict[str, Any]):
+        self._events.put((WEEKEND_INVOICE_SAVED, payload))
+
+    def _on_trip_saved_to_temp(self, payload: Dict[str, Any]):
+        self._events.put((TRIP_SAVED_TO_TEMP, payload))
+
+    def _handle_event(self, event_name: str, payload: Dict[str, Any]):
+        self.counters["events_received"][event_name] += 1
+        if event_name == TRIP_SAVED_TO_TEMP:
+            pending_trip = {
+                "folder_name": payload["trip_folder_name"],
+                "code_facture": payload["code_facture"],
+                "business": payload["business"],
+                "trip_date": payload["trip_date"]
+            }
+            self._register_pending_trip(pending_trip)
+            candidates = [pending_trip]
+        else:
+            business = payload.get("business")
+            candidates = []
+            with self._pending_lock:
+                for code in payload.get("codes", []):
+                    candidates.extend(self._pending_by_code.get((business, code), {}).values())
+        if not candidates:
+            return
+        moved_count = 0
+        for pending_trip in candidates:
+            if self._try_move_pending_trip(pending_trip):
+                moved_count += 1
+        self.counters["matches"][event_name] += moved_count
+        if moved_count:
+            self.logger.info(f"⚡ Evento {event_name}: {moved_count} trips reconciliados")
+
+    def _register_pending_trip(self, pending_trip: Dict[str, Any]):
+        key = (pending_trip["business"], str(pending_trip["code_facture"]).strip().upper())
+        with self._pending_lock:
+            self._pending_by_code.setdefault(key, {})[pending_trip["folder_name"]] = pending_trip
+
+    def _unregister_pending_trip(self, pending_trip: Dict[str, Any]):
+        key = (pending_trip["business"], str(pending_trip["code_facture"]).strip().upper())
+        with self._pending_lock:
+            trips = self._pending_by_code.get(key, {})
+            trips.pop(pending_trip["folder_name"], None)
+            if not trips:
+                self._pending_by_code.pop(key, None)
+
+    def _try_move_pending_trip(self, pending_trip: Dict[str, Any]) -> Optional[bool]:
+        target_folder = self.file_manager._find_weekend_folder_for_trip(
+            pending_trip["code_facture"], pending_trip["trip_date"], pending_trip["business"]
+        )
+        if not target_folder:
+            self.logger.debug(f"⏳ Trip {pending_trip['folder_name']} aún no tiene facture_weekend correspondiente")
+            return False
+        result = self.file_manager.move_trip_from_temp_to_weekend(pending_trip["folder_name"], target_folder)
+        if result['success']:
+            self._unregister_pending_trip(pending_trip)
+            self.logger.info(f"✅ Trip {pending_trip['folder_name']} movido a {target_folder}")
+            return True
+        self.logger.error(f"❌ Error moviendo trip {pending_trip['folder_name']}: {result.get('error', 'Error desconocido')}")
+        return None
+
+    def _pending_trip_from_temp(self, trip: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        trip_data = trip['data']['data_facture']
+        date_str = trip_data.get('recibes_trip')
+        if date_str:
+            try:
+                date_str = date_str.replace(" ", "T")
+                dt = datetime.fromisoformat(date_str)
+                date_str = dt.strftime("%Y-%m-%d")
+            except Exception:
+                date_str = "invalid_date"
+        else:
+            date_str = "unknown_date"
+        trip_folder_name = f"{date_str}_{trip_data.get('code_facture')}"
+        code_facture = trip_data.get('code_facture', '')
+        if not code_facture:
+            self.logger.warning(f"⚠️ Trip {trip_folder_name} no tiene code_facture, omitiendo")
+            return None
+        return {
+            "folder_name": trip_folder_name,
+            "code_facture": code_facture,
+            "business": trip_data.get('name_business', 'Desconocida').split(",")[0],
+            "trip_date": self.file_manager._parse_datetime(trip_data.get('recibes_trip', ''))
+        }
+
     def _organize_pending_trips(self):
         try:
             self.logger.info("🔍 Revisando facturas trip pendientes en temp...")
             pending_trips = self.file_manager.get_all_trips_in_temp()
+            with self._pending_lock:
+                self._pending_by_code = {}
             if not pending_trips:
                 self.logger.info("📭 No hay facturas trip pendientes en temp")
                 return
                 
             self.logger.info(f"📦 Encontradas {len(pending_trips)} facturas trip pendientes")
+            if self.sweep_mode == "hash_join":
+                self._organize_pending_trips_hash_join(pending_trips)
+                return
             
             moved_count = 0
             error_count = 0
             
             for trip in pending_trips:
                 try:
-                    trip_data = trip['data']['data_facture']
-                    date_str = trip_data.get('recibes_trip')
-                    if date_str:
-                        try:
-                            date_str = date_str.replace(" ", "T")
-                            dt = datetime.fromisoformat(date_str)
-                            date_str = dt.strftime("%Y-%m-%d")
-                        except Exception:
-                            date_str = "invalid_date"
-                    else:
-                        date_str = "unknown_date"
-                    trip_folder_name = f"{date_str}_{trip_data.get('code_facture')}"
-                    code_facture = trip_data.get('code_facture', '')
-                    recibes_trip = trip_data.get('recibes_trip', '')
-                    name_business = trip_data.get('name_business', 'Desconocida').split(",")[0]
-                    
-                    if not code_facture:
-                        self.logger.warning(f"⚠️ Trip {trip_folder_name} no tiene code_facture, omitiendo")
+                    pending_trip = self._pending_trip_from_temp(trip)
+                    if pending_trip is None:
                         continue
-                    fecha_dt = self.file_manager._parse_datetime(recibes_trip)
-                    target_folder = self.file_manager._find_weekend_folder_for_trip(code_facture, fecha_dt,name_business)
-                    
-                    if target_folder:
-                        result = self.file_manager.move_trip_from_temp_to_weekend(
-                            trip_folder_name, target_folder  
-                        )
-                            
-                        if result['success']:
-                            moved_count += 1
-                            self.logger.info(f"✅ Trip {trip_folder_name} movido a {target_folder}")
-                        else:
-                            error_count += 1
-                            self.logger.error(f"❌ Error moviendo trip {trip_folder_name}: {result.get('error', 'Error desconocido')}")
-                    else:
-                        self.logger.debug(f"⏳ Trip {trip_folder_name} aún no tiene facture_weekend correspondiente")
+                    self._register_pending_trip(pending_trip)
+                    moved = self._try_move_pending_trip(pending_trip)
+                    if moved:
+                        moved_count += 1
+                    elif moved is None:
+                        error_count += 1
                         
                 except Exception as e:
                     error_count += 1
                     self.logger.error(f"❌ Error procesando trip {trip.get('folder_name', 'desconocido')}: {e}")
             
+            self.counters["matches"]["sweep"] += moved_count
             if moved_count > 0:
                 self.logger.info(f"🎉 Organización completada: {moved_count} trips movidos, {error_count} errores")
             elif error_count > 0:
@@ -137,6 +236,72 @@ class BackgroundTripOrganizer:
         except Exception as e:
             self.logger.error(f"💥 Error crítico en _organize_pending_trips: {e}")
 
+    def _organize_pending_trips_hash_join(self, pending_trips: List[Dict[str, Any]]):
+        sweep_start = time.perf_counter()
+        trips_by_business: Dict[str, List[Dict[str, Any]]] = {}
+        for trip in pending_trips:
+            try:
+                pending_trip = self._pending_trip_from_temp(trip)
+            except Exception as e:
+                self.logger.error(f"❌ Error procesando trip {trip.get('folder_name', 'desconocido')}: {e}")
+                continue
+            if pending_trip is None:
+                continue
+            self._register_pending_trip(pending_trip)
+            trips_by_business.setdefault(pending_trip["business"], []).append(pending_trip)
+
+        moves = []
+        for business, business_trips in trips_by_business.items():
+            code_table = self.file_manager.trip_index.refresh_business(business)
+            for pending_trip in business_trips:
+                candidates = code_table.get(str(pending_trip["code_facture"]).strip().upper(), [])
+                eligible = [
+                    (folder_date, folder) for folder_date, folder in candidates
+                    if folder_date.date() >= pending_trip["trip_date"].date()
+                ]
+                if eligible:
+                    moves.append((pending_trip, min(eligible, key=lambda item: item[0])[1]))
+        join_duration = time.perf_counter() - sweep_start
+
+        moved_count = 0
+        error_count = 0
+        for pending_trip, target_folder in moves:
+            result = self.file_manager.move_trip_from_temp_to_weekend(pending_trip["folder_name"], target_folder)
+            if result['success']:
+                moved_count += 1
+                self._unregister_pending_trip(pending_trip)
+            else:
+                error_count += 1
+                self.logger.error(f"❌ Error moviendo trip {pending_trip['folder_name']}: {result.get('error', 'Error desconocido')}")
+
+        self.counters["matches"]["sweep"] += moved_count
+        rows_joined = sum(len(business_trips) for business_trips in trips_by_business.values())
+        self.logger.info(
+            f"🧮 Barrido hash-join: {rows_joined} trips unidos contra {len(trips_by_business)} empresas, "
+            f"{len(moves)} coincidencias, {moved_count} movidos, {error_count} errores, "
+            f"join {join_duration:.3f}s, total {time.perf_counter() - sweep_start:.3f}s"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending_count = sum(len(trips) for trips in self._pending_by_code.values())
+        return {
+            "sweep_mode": self.sweep_mode,
+            "pending_trips": pending_count,
+            "events_queued": self._events.qsize(),
+            "events_received": dict(self.counters["events_received"]),
+            "matches": dict(self.counters["matches"])
+        }
+
+    def request_sweep(self) -> "Future[Dict[str, Any]]":
+        """Encola un barrido en el hilo del organizador para no competir con su barrido programado."""
+        future: "Future[Dict[str, Any]]" = Future()
+        if self.is_running and self.thread and self.thread.is_alive():
+            self._events.put((SWEEP_REQUESTED, future))
+        else:
+            future.set_result(self.organize_now())
+        return future
+
     def organize_now(self) -> Dict[str, Any]:
         try:
             self.logger.info("🚀 Ejecutando organización inmediata de trips pendientes...")
@@ -1,14 +1,20 @@
+import asyncio
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Body, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect,status
 from pydantic import BaseModel, ValidationError
 from app.models.model_recibe_facture import FactureWeekend
 from app.models.model_truck_facture import FactureTrip
 from app.services.file_manager_service import FileManagerService
+from app.services.job_manager import SETTLED_JOB_STATES, FactureJobManager
 from app.services.processing_images import ImageProcessorService
+from app.utils.cfdi_rule_extractor import get_rule_extraction_stats
+from app.utils.trip_ticket_templates import get_trip_template_stats
+from app.utils.ocr_text_compactor import get_text_compaction_stats
 
 file_manager = FileManagerService()
-image_processor = ImageProcessorService()
+image_processor = ImageProcessorService(file_manager=file_manager)
+job_manager = FactureJobManager(image_processor)
 router = APIRouter(prefix="/facture", tags=["FACTURES_OF_BUSINESS"])
 
 class CorrectionRequest(BaseModel):
@@ -28,9 +34,44 @@ async def recibe_image_facture(
     files: List[UploadFile] = File(..., description="Múltiples imágenes de facturas"),
     enhance_ocr: bool = Form(True, description="Mejorar calidad de las imagenes"),
     process_in_parallel: bool = Form(True, description="Procesar imágenes en paralelo"),
-    limit_thinking_ai : int = Form(2, description="Número de ejemplos de aprendizaje para IA")):
+    limit_thinking_ai : int = Form(2, description="Número de ejemplos de aprendizaje para IA"),
+    speculative_ocr: bool = Form(False, description="OCR simultáneo de la imagen original y mejorada con corte temprano"),
+    ocr_engine: Optional[str] = Form(None, description="Motor OCR a utilizar (ocr_space, tesseract)"),
+    async_job: bool = Form(False, description="Encolar el procesamiento y devolver un ID de trabajo inmediatamente")):
+    if not image_processor.ollama_client.is_ready() and image_processor.ollama_client.breaker.is_closed:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El modelo de IA aún se está cargando, intenta de nuevo en unos segundos",
+            headers={"Retry-After": "5"}
+        )
     try:
-        processing_result = await image_processor.process_images(files=files,enhance_ocr=enhance_ocr,process_in_parallel=process_in_parallel,base_api_url=request.base_url,limit_thinking_ai=limit_thinking_ai)
+        backends_available = image_processor.backends_available(ocr_engine)
+        if async_job or not backends_available:
+            job = await job_manager.submit(files=files,enhance_ocr=enhance_ocr,base_api_url=request.base_url,limit_thinking_ai=limit_thinking_ai,speculative_ocr=speculative_ocr,ocr_engine=ocr_engine,deferred=not backends_available)
+            return {
+                "success": True,
+                "status": status.HTTP_202_ACCEPTED,
+                "message": "Imágenes recibidas, procesamiento en segundo plano" if backends_available else "Servicios de OCR o IA no disponibles, imágenes guardadas en cola diferida",
+                "data": {
+                    "job_id": job["job_id"],
+                    "state": job["state"],
+                    "total_images": job["total_images"],
+                    "status_url": f"{request.base_url}api/facture/jobs/{job['job_id']}",
+                    "circuit_breakers": None if backends_available else image_processor.get_circuit_breakers()
+                },
+                "error": None
+            }
+        processing_result = await image_processor.process_images(files=files,enhance_ocr=enhance_ocr,process_in_parallel=process_in_parallel,base_api_url=request.base_url,limit_thinking_ai=limit_thinking_ai,speculative_ocr=speculative_ocr,ocr_engine=ocr_engine)
+        if processing_result["deferred_count"]:
+            deferred_names = {result["filename"] for result in processing_result["deferred_results"]}
+            deferred_files = [file for file in files if file.filename in deferred_names]
+            for file in deferred_files:
+                await file.seek(0)
+            job = await job_manager.submit(files=deferred_files,enhance_ocr=enhance_ocr,base_api_url=request.base_url,limit_thinking_ai=limit_thinking_ai,speculative_ocr=speculative_ocr,ocr_engine=ocr_engine,deferred=True)
+            processing_result["deferred_job"] = {
+                "job_id": job["job_id"],
+                "status_url": f"{request.base_url}api/facture/jobs/{job['job_id']}"
+            }
         return {
             "success": True,
             "status": status.HTTP_200_OK,
@@ -71,7 +112,8 @@ async def correct_invoice_data(
                 detail=f"Error de validación en los datos: {e.errors()}"
             )
         
-        correction_result = file_manager.correct_invoice_data(
+        correction_result = await asyncio.to_thread(
+            file_manager.correct_invoice_data,
             path_dir=path_dir,
             model_type=model_type,
             corrected_data=validated_data.dict()
@@ -103,19 +145,143 @@ async def correct_invoice_data(
             "data": None,
             "error": str(e)
         }
+@router.get("/circuit-breakers")
+async def get_circuit_breakers():
+    return {
+        "breakers": image_processor.get_circuit_breakers(),
+        "deferred_images": job_manager.get_stats()["deferred_images"]
+    }
+
+@router.get("/job-queue/status")
+async def get_job_queue_status():
+    return job_manager.get_stats()
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo no encontrado: {job_id}"
+        )
+    return {
+        "success": True,
+        "status": status.HTTP_200_OK,
+        "message": "Estado del trabajo",
+        "data": job,
+        "error": None
+    }
+
+@router.websocket("/jobs/{job_id}/ws")
+async def job_progress_websocket(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    job = job_manager.get_job(job_id)
+    if not job:
+        await websocket.send_json({"event": "error", "error": f"Trabajo no encontrado: {job_id}"})
+        await websocket.close()
+        return
+    events = job_manager.subscribe(job_id)
+    try:
+        await websocket.send_json(json.loads(json.dumps({"event": "snapshot", "job": job}, default=str)))
+        if job["state"] in SETTLED_JOB_STATES:
+            return
+        while True:
+            event = await events.get()
+            await websocket.send_json(json.loads(json.dumps(event, default=str)))
+            if event["event"] in ("job_finished", "job_deferred"):
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_manager.unsubscribe(job_id, events)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
 @router.get("/background-service/status")
 async def get_background_service_status():
     if file_manager and file_manager.background_organizer:
         return {
             "is_running": file_manager.background_organizer.is_running,
-            "check_interval_minutes": file_manager.background_organizer.check_interval_minutes
+            "check_interval_minutes": file_manager.background_organizer.check_interval_minutes,
+            "trip_index": file_manager.trip_index.get_stats(),
+            "invoice_writer": file_manager.writer.get_stats(),
+            "events": file_manager.background_organizer.get_stats()
         }
     return {"is_running": False, "error": "Servicio no inicializado"}
 
+@router.get("/enhancement-engine/status")
+async def get_enhancement_engine_status():
+    if image_processor and image_processor.enhancement_engine:
+        return image_processor.enhancement_engine.get_stats()
+    return {"is_running": False, "error": "Motor no inicializado"}
+
+@router.get("/ready")
+async def get_readiness():
+    warm_up_status = image_processor.ollama_client.get_warm_up_status()
+    if not warm_up_status["ready"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=warm_up_status,
+            headers={"Retry-After": "5"}
+        )
+    return warm_up_status
+
+@router.get("/llm/status")
+async def get_llm_status():
+    if image_processor and image_processor.ollama_client:
+        return {
+            "model": image_processor.text_processor.model_name,
+            "cascade": image_processor.text_processor.get_cascade_stats(),
+            "ollama": image_processor.ollama_client.get_stats()
+        }
+    return {"error": "Cliente de IA no inicializado"}
+
+@router.get("/ocr/status")
+async def get_ocr_status():
+    if image_processor and image_processor.ocr_engines:
+        return {
+            "default_engine": image_processor.default_ocr_engine,
+            "engines": {name: engine.get_stats() for name, engine in image_processor.ocr_engines.items()}
+        }
+    return {"error": "Servicio OCR no inicializado"}
+
+@router.get("/extraction/stats")
+async def get_extraction_stats():
+    return {
+        "weekend_rules": get_rule_extraction_stats(),
+        "trip_templates": get_trip_template_stats(),
+        "text_compaction": get_text_compaction_stats()
+    }
+
+@router.get("/cache/stats")
+async def get_processed_cache_stats():
+    if image_processor and image_processor.processed_cache:
+        return {
+            "processed_images": image_processor.processed_cache.get_stats(),
+            "ocr_results": image_processor.ocr_cache.get_stats(),
+            "llm_responses": image_processor.text_processor.response_cache.get_stats()
+        }
+    return {"error": "Caché no inicializada"}
+
+@router.get("/catalog/stats")
+async def get_catalog_stats():
+    if file_manager:
+        return file_manager.catalog.get_stats()
+    return {"error": "Servicio no inicializado"}
+
+@router.post("/catalog/rebuild")
+async def rebuild_catalog():
+    if file_manager:
+        counts = await asyncio.to_thread(file_manager.rebuild_catalog)
+        return {"success": True, "facturas": counts}
+    return {"success": False, "error": "Servicio no inicializado"}
+
 @router.post("/background-service/organize-now")
 async def organize_now():
     if file_manager:
-        result = file_manager.organize_pending_trips_now()
+        result = await asyncio.to_thread(file_manager.organize_pending_trips_now)
         return result
     return {"success": False, "error": "Servicio no inicializado"}
 
@@ -128,6 +294,8 @@ async def instructions_message():
         "data": {
             "endpoints_available": {
                 "process_images": "/facture/image (POST)",
+                "job_status": "/facture/jobs/{job_id} (GET)",
+                "job_progress": "/facture/jobs/{job_id}/ws (WEBSOCKET)",
                 "correct_data": "/facture/correct/{empresa}/{fecha_carpeta} (PUT)", 
                 "verify_invoice": "/facture/verify/{empresa}/{fecha_carpeta} (GET)",
                 "list_invoices": "/facture/list/{empresa} (GET)"
@@ -1,3 +1,4 @@
+import asyncio
 import atexit
 from pathlib import Path
 from fastapi import FastAPI
@@ -6,15 +7,50 @@ from contextlib import asynccontextmanager
 import threading
 import time
 from app.routes import router_facture
-from app.services.file_manager_service import FileManagerService
 file_manager_service = None
+warm_up_task = None
+async def warm_up_models(ollama_client, model_names):
+    result = await ollama_client.warm_up(model_names)
+    if result["state"] == "ready":
+        print(f"✅ Modelos {', '.join(model_names)} cargados y fijados (keep_alive={ollama_client.keep_alive}) en {result['load_time']:.1f}s")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global file_manager_service
-    file_manager_service = FileManagerService()
+    global file_manager_service, warm_up_task
+    file_manager_service = router_facture.file_manager
+    file_manager_service.recover_pending_writes()
+    file_manager_service.trip_index.build()
+    file_manager_service.ensure_catalog()
     file_manager_service.start_background_organizer(check_interval_minutes=60)
     print("✅ Servicio en segundo plano iniciado")
+    for ocr_engine in router_facture.image_processor.ocr_engines.values():
+        await ocr_engine.start()
+    print(f"✅ Motores OCR listos (por defecto: {router_facture.image_processor.default_ocr_engine})")
+    await router_facture.image_processor.ollama_client.start()
+    print("✅ Cliente asíncrono de Ollama listo")
+    ollama_client = router_facture.image_processor.ollama_client
+    if ollama_client.require_warm_up:
+        model_names = router_facture.image_processor.text_processor.cascade_models
+        warm_up_task = asyncio.create_task(warm_up_models(ollama_client, model_names))
+        print(f"⏳ Calentando los modelos {', '.join(model_names)}; las cargas esperarán hasta que estén listos")
+    router_facture.image_processor.enhancement_engine.start()
+    print(f"✅ Motor de mejora de imágenes iniciado con {router_facture.image_processor.enhancement_engine.max_workers} procesos")
+    await router_facture.job_manager.start()
+    print(f"✅ Cola de trabajos iniciada con {router_facture.job_manager.max_workers} workers")
     yield
+    if warm_up_task and not warm_up_task.done():
+        warm_up_task.cancel()
+    await router_facture.job_manager.stop()
+    print("✅ Cola de trabajos detenida")
+    await router_facture.image_processor.cleanup()
+    if file_manager_service:
+        await asyncio.to_thread(file_manager_service.writer.flush)
+        print("✅ Escrituras pendientes de facturas completadas")
+    print("✅ Motor de mejora de imágenes detenido")
+    for ocr_engine in router_facture.image_processor.ocr_engines.values():
+        await ocr_engine.close()
+    print("✅ Motores OCR cerrados")
+    await router_facture.image_processor.ollama_client.close()
+    print("✅ Cliente de Ollama cerrado")
     if file_manager_service:
         file_manager_service.stop_background_organizer()
         print("✅ Servicio en segundo plano detenido")
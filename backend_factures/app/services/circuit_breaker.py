@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"Circuito {name} abierto; se rechaza la llamada")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_size: int = 10,
+        min_calls: int = 3,
+        failure_rate: float = 0.5,
+        open_seconds: float = 30.0
+    ):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.trips = 0
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at: Optional[float] = None
+        self._probe_started_at: Optional[float] = None
+        self._last_failure_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == CLOSED
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probe_started_at = None
+                print(f"🟡 Circuito {self.name} semiabierto: se permite una llamada de prueba")
+            if self._state == HALF_OPEN and (self._probe_started_at is None or now - self._probe_started_at >= self.open_seconds):
+                self._probe_started_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(True)
+            if self._state != CLOSED:
+                self._close()
+
+    def record_failure(self, error: Any = None):
+        with self._lock:
+            self._outcomes.append(False)
+            self._last_failure_at = time.monotonic()
+            self._last_error = str(error) if error is not None else None
+            if self._state == HALF_OPEN:
+                self._open()
+            elif self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for outcome in self._outcomes if not outcome)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def reset(self):
+        """Cierra el circuito tras una sonda de salud exitosa."""
+        with self._lock:
+            if self._state != CLOSED:
+                self._close()
+
+    def failed_since(self, since: float) -> bool:
+        with self._lock:
+            return self._last_failure_at is not None and self._last_failure_at >= since
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            failures = sum(1 for outcome in self._outcomes if not outcome)
+            return {
+                "name": self.name,
+                "state": self._state,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures,
+                "failure_rate": round(failures / len(self._outcomes), 4) if self._outcomes else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "open_for": round(time.monotonic() - self._opened_at, 1) if self._state != CLOSED else None,
+                "last_error": self._last_error
+            }
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probe_started_at = None
+        self.trips += 1
+        print(f"🔴 Circuito {self.name} abierto por tasa de errores: {self._last_error}")
+
+    def _close(self):
+        self._state = CLOSED
+        self._opened_at = None
+        self._probe_started_at = None
+        self._outcomes.clear()
+        print(f"🟢 Circuito {self.name} cerrado; el servicio respondió de nuevo")
@@ -0,0 +1,44 @@
+from typing import Any, Dict
+
+ENHANCEMENT_DECISIONS = ("skip", "light", "heavy")
+
+
+class EnhancementPolicy:
+    def __init__(
+        self,
+        triage_max_side: int = 1000,
+        blur_threshold: float = 80.0,
+        sharp_threshold: float = 300.0,
+        dark_mean_intensity: float = 100.0,
+        clean_mean_intensity: float = 170.0,
+        low_contrast: float = 0.15,
+        clean_contrast: float = 0.25
+    ):
+        self.triage_max_side = triage_max_side
+        self.blur_threshold = blur_threshold
+        self.sharp_threshold = sharp_threshold
+        self.dark_mean_intensity = dark_mean_intensity
+        self.clean_mean_intensity = clean_mean_intensity
+        self.low_contrast = low_contrast
+        self.clean_contrast = clean_contrast
+
+    def decide(self, image_stats: Dict[str, Any]) -> str:
+        mean_intensity = image_stats["mean_intensity"]
+        contrast = image_stats["contrast"]
+        blur_variance = image_stats["blur_variance"]
+        if (
+            blur_variance < self.blur_threshold
+            or mean_intensity < self.dark_mean_intensity
+            or contrast < self.low_contrast
+        ):
+            return "heavy"
+        if (
+            mean_intensity >= self.clean_mean_intensity
+            and contrast >= self.clean_contrast
+            and blur_variance >= self.sharp_threshold
+        ):
+            return "skip"
+        return "light"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
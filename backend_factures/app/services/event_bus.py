@@ -0,0 +1,34 @@
+import threading
+from typing import Any, Callable, Dict, List
+
+WEEKEND_INVOICE_SAVED = "weekend_invoice_saved"
+TRIP_SAVED_TO_TEMP = "trip_saved_to_temp"
+INVOICE_FOLDER_REMOVED = "invoice_folder_removed"
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_name: str, handler: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            self._handlers.setdefault(event_name, []).append(handler)
+
+    def unsubscribe(self, event_name: str, handler: Callable[[Dict[str, Any]], None]):
+        with self._lock:
+            handlers = self._handlers.get(event_name, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def publish(self, event_name: str, payload: Dict[str, Any]):
+        with self._lock:
+            handlers = list(self._handlers.get(event_name, []))
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"⚠️ Error en manejador del evento {event_name}: {e}")
+
+
+event_bus = EventBus()
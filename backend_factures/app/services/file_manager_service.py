@@ -1,6 +1,5 @@
 from dataclasses import asdict
 import os
-import json
 import shutil
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
@@ -8,12 +7,20 @@ import re
 from pathlib import Path
 import imghdr
 from app.api.trips_organizer import BackgroundTripOrganizer
+from app.services.event_bus import INVOICE_FOLDER_REMOVED, TRIP_SAVED_TO_TEMP, WEEKEND_INVOICE_SAVED, event_bus
+from app.services.invoice_catalog import InvoiceCatalog
+from app.services.invoice_writer import InvoiceWriter
+from app.services.trip_code_index import TripCodeIndex
+from app.utils import json_codec
 
 class FileManagerService:
     def __init__(self, base_path: str = "Facturas"):
         self.base_path = Path(base_path)
         self.temp_path = Path("temp")
         self.base_path.mkdir(exist_ok=True)
+        self.trip_index = TripCodeIndex.for_base_path(self.base_path)
+        self.catalog = InvoiceCatalog()
+        self.writer = InvoiceWriter.for_journal_path()
         self.background_organizer = BackgroundTripOrganizer(self)
 
     def start_background_organizer(self, check_interval_minutes: int = 60):
@@ -24,7 +31,20 @@ class FileManagerService:
         self.background_organizer.stop()
         
     def organize_pending_trips_now(self) -> Dict[str, Any]:
-        return self.background_organizer.organize_now()
+        return self.background_organizer.request_sweep().result()
+
+    def ensure_catalog(self):
+        if self.catalog.is_empty():
+            self.rebuild_catalog()
+
+    def recover_pending_writes(self):
+        for _, future in self.writer.recover():
+            future.add_done_callback(self._on_invoice_written)
+
+    def rebuild_catalog(self) -> Dict[str, int]:
+        counts = self.catalog.rebuild(self.base_path, self.temp_path)
+        print(f"✅ Catálogo de facturas reconstruido: {counts}")
+        return counts
     
     def organize_invoice(
         self,  
@@ -72,7 +92,13 @@ class FileManagerService:
                 result["location"] = "weekend_folder"
             else:
                 result = self._save_trip_to_folder(
-                    self.temp_path, trip_folder_name, data, data_crud, original_image, enhanced_image
+                    self.temp_path, trip_folder_name, data, data_crud, original_image, enhanced_image,
+                    trip_event={
+                        "trip_folder_name": trip_folder_name,
+                        "code_facture": code_facture,
+                        "business": data.name_business.split(",")[0],
+                        "trip_date": fecha_dt
+                    }
                 )
                 result["location"] = "temp_folder"
             
@@ -84,46 +110,7 @@ class FileManagerService:
 
     def _find_weekend_folder_for_trip(self, code_facture: str, trip_date: datetime,business : str) -> Optional[Path]:
         try:
-            company_folder = self.base_path / business
-            if not company_folder.exists():
-                return None
-            
-            for weekend_folder in company_folder.iterdir():
-                if not weekend_folder.is_dir():
-                    continue
-                folder_name = weekend_folder.name
-                try:
-                    folder_date = datetime.strptime(folder_name.split('_')[0], "%Y-%m-%d")
-                    if folder_date.date() < trip_date.date():
-                        continue
-                        
-                except ValueError:
-                    continue
-                json_file = weekend_folder / "factura.json"
-                if not json_file.exists():
-                    continue
-                
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        weekend_data = json.load(f)
-                    if 'data_facture' not in weekend_data:
-                        continue
-                    data_facture = weekend_data['data_facture']
-                    if 'concepts' in data_facture and isinstance(data_facture['concepts'], list):
-                        for concept in data_facture['concepts']:
-                            description = concept.get('description', '')
-                            if code_facture in description:
-                                return weekend_folder
-                    general_description = data_facture.get('description', '')
-                    if code_facture in general_description:
-                        return weekend_folder
-                        
-                except Exception as e:
-                    print(f"⚠️ Error leyendo JSON de {json_file}: {e}")
-                    continue
-                    
-            return None
-            
+            return self.trip_index.find(code_facture, trip_date, business)
         except Exception as e:
             print(f"❌ Error buscando weekend folder: {e}")
             return None
@@ -135,11 +122,11 @@ class FileManagerService:
         data, 
         data_crud: str,
         original_image: bytes, 
-        enhanced_image: bytes
+        enhanced_image: bytes,
+        trip_event: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         try:
             trip_folder = parent_folder / trip_folder_name
-            trip_folder.mkdir(exist_ok=True)
             json_data = {
                 "metadata": {
                     "processed_at": datetime.now().isoformat(),
@@ -150,16 +137,18 @@ class FileManagerService:
                 "data_crud": data_crud
             }
             
-            json_file = trip_folder / "factura.json"
-            with open(json_file, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, indent=2, ensure_ascii=False,default=str)
-    
-            original_file = trip_folder / "factura_original.jpeg"
-            with open(original_file, 'wb') as f:
-                f.write(original_image)
-            enhanced_file = trip_folder / "factura_enhanced.png"
-            with open(enhanced_file, 'wb') as f:
-                f.write(enhanced_image)
+            future = self.writer.submit(
+                trip_folder,
+                {"factura.json": json_data},
+                {"factura_original.jpeg": original_image, "factura_enhanced.png": enhanced_image},
+                metadata={
+                    "invoice_type": "facture_trip",
+                    "business": data.name_business.split(",")[0],
+                    "data_facture": json_data["data_facture"],
+                    "trip_event": trip_event
+                }
+            )
+            future.add_done_callback(self._on_invoice_written)
             return {
                 "success": True,
                 "message": f"Factura trip guardada en {trip_folder}",
@@ -168,7 +157,8 @@ class FileManagerService:
                     f"{trip_folder}/factura.json",
                     f"{trip_folder}/factura_original.jpeg", 
                     f"{trip_folder}/factura_enhanced.png"
-                ]
+                ],
+                "write_future": future
             }
             
         except Exception as e:
@@ -185,8 +175,7 @@ class FileManagerService:
                 json_file = trip_folder / "factura.json"
                 if json_file.exists():
                     try:
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            trip_data = json.load(f)
+                        trip_data = json_codec.load_file(json_file)
                         trips.append({
                             "folder_name": trip_folder.name,
                             "data": trip_data,
@@ -205,13 +194,19 @@ class FileManagerService:
             source_folder = self.temp_path / trip_folder_name
             target_folder = weekend_folder / trip_folder_name
             
+            self.writer.flush(source_folder)
+            self.writer.flush(target_folder)
             if not source_folder.exists():
                 return {"success": False, "error": f"Carpeta {trip_folder_name} no existe en temp"}
             
             if target_folder.exists():
                 shutil.rmtree(target_folder)  
+                self.catalog.remove_folder(target_folder)
+                self._publish_folder_removed(target_folder)
             
             shutil.move(str(source_folder), str(target_folder))
+            self.catalog.move_folder(source_folder, target_folder)
+            self._publish_folder_removed(source_folder)
             
             return {
                 "success": True,
@@ -231,22 +226,38 @@ class FileManagerService:
             date_emision = datetime.fromisoformat(data.datetime_emisor.replace('Z', '+00:00'))
         folder_name = self._create_date_based_folder_name(date_emision)
         path_date_folder = path_business / folder_name
-        if path_date_folder.exists():
-            self._delete_existing_facture(path_date_folder)
-        path_date_folder.mkdir(exist_ok=True)
         return self.organice_archives_week(data, data_crud, path_date_folder, original_image, enhanced_image)
 
+    def _on_invoice_written(self, future):
+        result = future.result()
+        if not result["success"]:
+            return
+        metadata = result["metadata"]
+        folder = Path(result["folder"])
+        invoice_type = metadata.get("invoice_type")
+        data_facture = metadata.get("data_facture") or {}
+        self.catalog.record_invoice(folder, metadata.get("business"), invoice_type, data_facture)
+        if invoice_type == "facture_weekend":
+            self.trip_index.add_folder(metadata.get("business"), folder, data_facture)
+            self._publish_weekend_saved(metadata.get("business"), folder, data_facture)
+        elif metadata.get("trip_event"):
+            trip_event = dict(metadata["trip_event"])
+            trip_event["trip_date"] = self._parse_datetime(trip_event.get("trip_date"))
+            event_bus.publish(TRIP_SAVED_TO_TEMP, trip_event)
+
+    def _publish_weekend_saved(self, business: str, weekend_folder: Path, data_facture: Dict[str, Any]):
+        event_bus.publish(WEEKEND_INVOICE_SAVED, {
+            "business": business,
+            "folder": str(weekend_folder),
+            "codes": sorted(TripCodeIndex.extract_codes(data_facture))
+        })
+
+    def _publish_folder_removed(self, folder: Path):
+        event_bus.publish(INVOICE_FOLDER_REMOVED, {"folder": str(folder)})
+
     def _create_date_based_folder_name(self, date_emision: datetime) -> str:
         return date_emision.strftime("%Y-%m-%d_%H-%M-%S")
 
-    def _delete_existing_facture(self, date_folder: Path):
-        try:
-            for file in date_folder.iterdir():
-                if file.is_file():
-                    file.unlink()
-        except Exception as e:
-            print(f"⚠️ Error eliminando archivos en {date_folder}: {e}")
-
     def organice_archives_week(self, data, data_crud: str, date_folder: Path, original_image: bytes, enhanced_image: bytes):
         if isinstance(data.datetime_emisor, datetime):
             date_emision = data.datetime_emisor
@@ -254,74 +265,64 @@ class FileManagerService:
             date_emision = datetime.fromisoformat(data.datetime_emisor.replace('Z', '+00:00'))
         base_name = f"factura"
         
-        archivos_guardados = []
-        path_facture_json = date_folder / f"{base_name}.json"
         data_path_facture = {
             "data_crud": data_crud,
             "data_facture": data.dict(),
             "processing_timestamp": datetime.now().isoformat(),
             "date_folder": date_folder.name
         }
-        with open(path_facture_json, "w", encoding="utf-8") as f:
-            json.dump(data_path_facture, f, ensure_ascii=False, indent=2, default=str)
-        archivos_guardados.append(str(path_facture_json))
+        documents = {f"{base_name}.json": data_path_facture}
+        images = {}
         if original_image:
             ext_original = imghdr.what(None, h=original_image) or "png"
-            path_original_image = date_folder / f"{base_name}_original.{ext_original}"
-            with open(path_original_image, "wb") as f:
-                f.write(original_image)
-            archivos_guardados.append(str(path_original_image))
-        
+            images[f"{base_name}_original.{ext_original}"] = original_image
         if enhanced_image:
             ext_enhanced = imghdr.what(None, h=enhanced_image) or "png"
-            path_enhanced_image = date_folder / f"{base_name}_enhanced.{ext_enhanced}"
-            with open(path_enhanced_image, "wb") as f:
-                f.write(enhanced_image)
-            archivos_guardados.append(str(path_enhanced_image))    
+            images[f"{base_name}_enhanced.{ext_enhanced}"] = enhanced_image
+        archivos_guardados = [str(date_folder / name) for name in list(documents) + list(images)]
+        future = self.writer.submit(
+            date_folder,
+            documents,
+            images,
+            replace_existing=True,
+            metadata={
+                "invoice_type": "facture_weekend",
+                "business": date_folder.parent.name,
+                "data_facture": data_path_facture["data_facture"]
+            }
+        )
+        future.add_done_callback(self._on_invoice_written)
         return {
             "success": True,
             "empresa": data.name_receptor,
             "carpeta_fecha": date_folder.name,
             "ruta": str(date_folder),
             "archivos_guardados": archivos_guardados,
-            "fecha_emision": date_emision.isoformat()
+            "fecha_emision": date_emision.isoformat(),
+            "write_future": future
         }
 
     def get_business_folders(self) -> List[Dict[str, Any]]:
+        self.catalog.sync_weekend_folders(self.base_path)
         businesses = []
-        for item in self.base_path.iterdir():
-            if item.is_dir():
-                date_folders = []
-                for date_folder in item.iterdir():
-                    if date_folder.is_dir() and self._is_valid_date_folder(date_folder.name):
-                        date_folders.append({
-                            "nombre": date_folder.name,
-                            "ruta": str(date_folder),
-                            "fecha": self._parse_date_folder_name(date_folder.name)
-                        })
-                date_folders.sort(key=lambda x: x["fecha"], reverse=True)
-                businesses.append({
-                    "nombre": item.name,
-                    "ruta": str(item),
-                    "carpetas_fecha": date_folders,
-                    "total_facturas": len(date_folders)
-                })
-        
+        for business, date_folders in self.catalog.list_weekend_folders().items():
+            businesses.append({
+                "nombre": business,
+                "ruta": str(self.base_path / business),
+                "carpetas_fecha": date_folders,
+                "total_facturas": len(date_folders)
+            })
         return businesses
 
     def get_date_folder_contents(self, empresa: str, fecha_carpeta: str) -> Optional[Dict[str, Any]]:
         folder_path = self.base_path / empresa / fecha_carpeta
-        if not folder_path.exists() or not folder_path.is_dir():
-            return None
-        archivos = []
-        for file in folder_path.iterdir():
-            if file.is_file():
-                archivos.append({
-                    "nombre": file.name,
-                    "ruta": str(file),
-                    "tamaño": file.stat().st_size,
-                    "extension": file.suffix
-                })
+        entry = self.catalog.get_folder(empresa, fecha_carpeta)
+        if entry is not None:
+            archivos = entry["archivos"]
+        else:
+            if not folder_path.exists() or not folder_path.is_dir():
+                return None
+            archivos = InvoiceCatalog.describe_files(folder_path)
         return {
             "empresa": empresa,
             "carpeta_fecha": fecha_carpeta,
@@ -337,14 +338,14 @@ class FileManagerService:
     ) -> Dict[str, Any]:
         try:
             folder_path = Path(path_dir)
+            self.writer.flush(folder_path)
             if not folder_path.exists():
                 return {"success": False, "error": f"Carpeta no encontrada: {path_dir}"}
             json_files = list(folder_path.glob("factura.json"))
             if not json_files:
                 return {"success": False, "error": "Archivo de factura no encontrado en la carpeta"}
             json_file_path = json_files[0]
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
+            existing_data = json_codec.load_file(json_file_path)
             original_path = folder_path
             parent_path = folder_path.parent
             existing_data["data_facture"] = corrected_data
@@ -362,8 +363,19 @@ class FileManagerService:
                     print(f"✅ Carpeta renombrada: {original_path.name} -> {new_folder_name}")
                 except Exception as rename_error:
                     print(f"⚠️ Error renombrando carpeta: {rename_error}")
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(existing_data, f, ensure_ascii=False, indent=2, default=str)
+            write_result = self.writer.submit(folder_path, {json_file_path.name: existing_data}, {}).result()
+            if not write_result["success"]:
+                return {"success": False, "error": write_result["error"]}
+            self._publish_folder_removed(original_path)
+            self.trip_index.remove_folder(original_path)
+            if folder_renamed:
+                self.catalog.move_folder(original_path, folder_path)
+            if model_type == "facture_weekend":
+                self.catalog.record_invoice(folder_path, parent_path.name, model_type, corrected_data)
+                self.trip_index.add_folder(parent_path.name, folder_path, corrected_data)
+                self._publish_weekend_saved(parent_path.name, folder_path, corrected_data)
+            else:
+                self.catalog.record_invoice(folder_path, str(corrected_data.get('name_business', 'Desconocida')).split(",")[0], model_type, corrected_data)
             
             return {
                 "success": True,
@@ -437,19 +449,16 @@ class FileManagerService:
         return datetime.strptime(folder_name, "%Y-%m-%d_%H-%M-%S")
 
     def search_invoices_by_date_range(self, empresa: str, fecha_inicio: datetime, fecha_fin: datetime) -> List[Dict[str, Any]]:
+        self.catalog.sync_weekend_folders(self.base_path)
         resultados = []
-        empresa_path = self.base_path / empresa
-        if not empresa_path.exists():
-            return resultados
-        
-        for date_folder in empresa_path.iterdir():
-            if date_folder.is_dir() and self._is_valid_date_folder(date_folder.name):
-                folder_date = self._parse_date_folder_name(date_folder.name)
-                if fecha_inicio <= folder_date <= fecha_fin:
-                    factura_info = self.get_date_folder_contents(empresa, date_folder.name)
-                    if factura_info:
-                        resultados.append(factura_info)
-        resultados.sort(key=lambda x: self._parse_date_folder_name(x["carpeta_fecha"]), reverse=True)
+        for folder in self.catalog.search_weekend_folders(empresa, fecha_inicio, fecha_fin):
+            resultados.append({
+                "empresa": empresa,
+                "carpeta_fecha": folder["nombre"],
+                "ruta": folder["ruta"],
+                "archivos": folder["archivos"],
+                "total_archivos": len(folder["archivos"])
+            })
         return resultados
     def _parse_datetime(self, date_value: Any) -> datetime:
         if isinstance(date_value, datetime):
@@ -485,9 +494,13 @@ class FileManagerService:
     def delete_invoice(self, empresa: str, fecha_carpeta: str) -> Dict[str, Any]:
         try:
             folder_path = self.base_path / empresa / fecha_carpeta
+            self.writer.flush(folder_path)
             if not folder_path.exists():
                 return {"success": False, "error": "Carpeta no encontrada"}
             shutil.rmtree(folder_path)    
+            self.trip_index.remove_folder(folder_path)
+            self.catalog.remove_folder(folder_path)
+            self._publish_folder_removed(folder_path)
             return {
                 "success": True,
                 "mensaje": f"Factura {fecha_carpeta} eliminada correctamente",
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from app.services.enhancement_policy import ENHANCEMENT_DECISIONS, EnhancementPolicy
+
+
+def enhance_image_bytes(image_bytes: bytes, policy: Optional[EnhancementPolicy] = None) -> Tuple[bytes, Dict[str, Any]]:
+    """Se ejecuta dentro del proceso worker: decodifica, binariza y devuelve el PNG."""
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    enhanced_bytes = image_bytes
+    success = False
+    decision = "heavy"
+    image_stats = None
+    try:
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if img is not None:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if policy is not None:
+                image_stats = compute_triage_stats(gray, policy.triage_max_side)
+                decision = policy.decide(image_stats)
+
+            if decision == "skip":
+                success = True
+            else:
+                if decision == "light":
+                    binary = cv2.adaptiveThreshold(
+                        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                        cv2.THRESH_BINARY, 17, 14
+                    )
+                    background_threshold = 130
+                    large_black_rectangles = None
+                else:
+                    large_black_rectangles = detect_large_black_rectangles(gray)
+                    image_analysis = analyze_image_for_binarization(gray)
+                    if image_analysis['needs_high_precision']:
+                        binary = cv2.adaptiveThreshold(
+                            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                            cv2.THRESH_BINARY, 13, 10
+                        )
+                        background_threshold = 120
+                    else:
+                        binary = cv2.adaptiveThreshold(
+                            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                            cv2.THRESH_BINARY, 17, 14
+                        )
+                        background_threshold = 130
+
+                if np.sum(binary == 0) > np.sum(binary == 255):
+                    binary = cv2.bitwise_not(binary)
+
+                _, background_mask = cv2.threshold(gray, background_threshold, 255, cv2.THRESH_BINARY)
+                final = binary.copy()
+                if large_black_rectangles is not None:
+                    safe_background = cv2.bitwise_and(background_mask, cv2.bitwise_not(large_black_rectangles))
+                else:
+                    safe_background = background_mask
+                final[safe_background == 255] = 255
+                encoded, encoded_image = cv2.imencode('.png', final)
+                if encoded:
+                    enhanced_bytes = encoded_image.tobytes()
+                    success = True
+    except Exception as e:
+        print(f"❌ Error en mejora de imagen: {str(e)}")
+
+    return enhanced_bytes, {
+        "success": success,
+        "decision": decision,
+        "image_stats": image_stats,
+        "cpu_time": time.process_time() - cpu_start,
+        "wall_time": time.perf_counter() - wall_start,
+        "worker_pid": os.getpid()
+    }
+
+
+def compute_triage_stats(gray_image: np.ndarray, max_side: int) -> Dict[str, Any]:
+    height, width = gray_image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale < 1.0:
+        gray_image = cv2.resize(gray_image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    image_stats = analyze_image_for_binarization(gray_image)
+    image_stats["blur_variance"] = float(cv2.Laplacian(gray_image, cv2.CV_32F).var())
+    return image_stats
+
+
+def detect_large_black_rectangles(gray_image: np.ndarray, min_area: int = 5000) -> np.ndarray:
+    try:
+        _, black_areas = cv2.threshold(gray_image, 80, 255, cv2.THRESH_BINARY_INV)
+        kernel_close = np.ones((7, 7), np.uint8)
+        closed_black = cv2.morphologyEx(black_areas, cv2.MORPH_CLOSE, kernel_close)
+        kernel_dilate = np.ones((5, 5), np.uint8)
+        dilated_black = cv2.dilate(closed_black, kernel_dilate, iterations=2)
+        contours, _ = cv2.findContours(dilated_black, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        large_rectangles_mask = np.zeros_like(gray_image, dtype=np.uint8)
+
+        for contour in contours:
+            area = cv2.contourArea(contour)
+
+            if area > min_area:
+                x, y, w, h = cv2.boundingRect(contour)
+                aspect_ratio = w / h if w > h else h / w
+                if aspect_ratio < 8:
+                    cv2.rectangle(large_rectangles_mask, (x, y), (x + w, y + h), 255, -1)
+        kernel_final = np.ones((10, 10), np.uint8)
+        large_rectangles_mask = cv2.dilate(large_rectangles_mask, kernel_final, iterations=1)
+        return large_rectangles_mask
+
+    except Exception as e:
+        print(f"Error en detección de rectángulos: {e}")
+        return np.zeros_like(gray_image, dtype=np.uint8)
+
+
+def analyze_image_for_binarization(gray_image: np.ndarray) -> dict:
+    mean_intensity = np.mean(gray_image)
+    std_intensity = np.std(gray_image)
+    grad_x = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=3)
+    gradient_magnitude = cv2.magnitude(grad_x, grad_y)
+    text_fineness = float(np.mean(gradient_magnitude)) / 255.0
+    needs_high_precision = text_fineness > 0.15
+    is_dark_image = mean_intensity < 100
+
+    return {
+        'mean_intensity': float(mean_intensity),
+        'contrast': float(std_intensity) / 255.0,
+        'text_fineness': text_fineness,
+        'needs_high_precision': needs_high_precision,
+        'is_dark_image': bool(is_dark_image)
+    }
+
+
+class ImageEnhancementEngine:
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending_jobs = 0
+        self._completed_jobs = 0
+        self._failed_jobs = 0
+        self._total_cpu_time = 0.0
+        self._last_cpu_time = 0.0
+        self._decisions = {decision: 0 for decision in ENHANCEMENT_DECISIONS}
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    async def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def enhance(self, image_bytes: bytes, policy: Optional[EnhancementPolicy] = None) -> Tuple[bytes, Dict[str, Any]]:
+        self.start()
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._pending_jobs += 1
+        try:
+            future = self._executor.submit(enhance_image_bytes, image_bytes, policy)
+            enhanced_bytes, job_stats = await asyncio.wrap_future(future)
+        except Exception as e:
+            with self._lock:
+                self._failed_jobs += 1
+            print(f"❌ Error en el motor de mejora de imágenes: {e}")
+            return image_bytes, {"success": False, "error": str(e)}
+        finally:
+            with self._lock:
+                self._pending_jobs -= 1
+
+        elapsed = time.perf_counter() - submitted_at
+        job_stats["queue_wait"] = max(0.0, elapsed - job_stats.get("wall_time", 0.0))
+        with self._lock:
+            self._completed_jobs += 1
+            self._last_cpu_time = job_stats.get("cpu_time", 0.0)
+            self._total_cpu_time += self._last_cpu_time
+            decision = job_stats.get("decision")
+            if decision in self._decisions:
+                self._decisions[decision] += 1
+        return enhanced_bytes, job_stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "is_running": self._executor is not None,
+                "max_workers": self.max_workers,
+                "queue_depth": max(0, self._pending_jobs - self.max_workers),
+                "running_jobs": min(self._pending_jobs, self.max_workers),
+                "completed_jobs": self._completed_jobs,
+                "failed_jobs": self._failed_jobs,
+                "last_job_cpu_time": round(self._last_cpu_time, 4),
+                "average_job_cpu_time": round(self._total_cpu_time / self._completed_jobs, 4) if self._completed_jobs else 0.0,
+                "total_cpu_time": round(self._total_cpu_time, 4),
+                "decisions": dict(self._decisions)
+            }
@@ -0,0 +1,291 @@
+import json
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.utils import json_codec
+
+WEEKEND_FOLDER_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}')
+
+
+class InvoiceCatalog:
+    def __init__(self, db_path: str = "cache/invoice_catalog.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._synced_signatures: Dict[str, tuple] = {}
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS invoices (
+                folder_path TEXT PRIMARY KEY,
+                business TEXT NOT NULL,
+                folder_name TEXT NOT NULL,
+                parent_path TEXT NOT NULL,
+                invoice_type TEXT NOT NULL,
+                folder_date TEXT,
+                document_date TEXT,
+                code_facture TEXT,
+                subtotal REAL,
+                total REAL,
+                net_weight REAL,
+                files TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_business_date ON invoices(business, invoice_type, folder_date)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_parent ON invoices(parent_path)")
+        self._conn.commit()
+
+    @staticmethod
+    def describe_files(folder_path: Path) -> List[Dict[str, Any]]:
+        archivos = []
+        for file in Path(folder_path).iterdir():
+            if file.is_file():
+                archivos.append({
+                    "nombre": file.name,
+                    "ruta": str(file),
+                    "tamaño": file.stat().st_size,
+                    "extension": file.suffix
+                })
+        return archivos
+
+    def record_invoice(
+        self,
+        folder_path: Path,
+        business: str,
+        invoice_type: str,
+        data_facture: Dict[str, Any],
+        archivos: Optional[List[Dict[str, Any]]] = None
+    ):
+        folder_path = Path(folder_path)
+        if archivos is None:
+            archivos = self.describe_files(folder_path)
+        if invoice_type == "facture_weekend":
+            folder_date = self._parse_weekend_folder_date(folder_path.name)
+            document_date = data_facture.get('datetime_emisor')
+        else:
+            folder_date = None
+            document_date = data_facture.get('recibes_trip')
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO invoices
+                (folder_path, business, folder_name, parent_path, invoice_type, folder_date, document_date,
+                 code_facture, subtotal, total, net_weight, files, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    str(folder_path),
+                    business,
+                    folder_path.name,
+                    str(folder_path.parent),
+                    invoice_type,
+                    folder_date.isoformat() if folder_date else None,
+                    str(document_date) if document_date else None,
+                    data_facture.get('code_facture'),
+                    self._to_float(data_facture.get('subtotal')),
+                    self._to_float(data_facture.get('total')),
+                    self._to_float(data_facture.get('net_weight')),
+                    json.dumps(archivos, ensure_ascii=False),
+                    datetime.now().isoformat()
+                )
+            )
+            self._conn.commit()
+
+    def move_folder(self, old_folder_path: Path, new_folder_path: Path):
+        old_prefix = str(Path(old_folder_path))
+        new_prefix = str(Path(new_folder_path))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT folder_path, files FROM invoices WHERE folder_path = ? OR substr(folder_path, 1, ?) = ?",
+                (old_prefix, len(old_prefix) + 1, old_prefix + "/")
+            ).fetchall()
+            for folder_path, files in rows:
+                moved_path = Path(new_prefix + folder_path[len(old_prefix):])
+                archivos = json.loads(files)
+                for archivo in archivos:
+                    archivo["ruta"] = str(moved_path / archivo["nombre"])
+                self._conn.execute(
+                    "UPDATE invoices SET folder_path = ?, folder_name = ?, parent_path = ?, files = ?, updated_at = ? WHERE folder_path = ?",
+                    (str(moved_path), moved_path.name, str(moved_path.parent), json.dumps(archivos, ensure_ascii=False), datetime.now().isoformat(), folder_path)
+                )
+            self._conn.commit()
+
+    def remove_folder(self, folder_path: Path):
+        prefix = str(Path(folder_path))
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM invoices WHERE folder_path = ? OR substr(folder_path, 1, ?) = ?",
+                (prefix, len(prefix) + 1, prefix + "/")
+            )
+            self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM invoices LIMIT 1").fetchone() is None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT invoice_type, COUNT(*) FROM invoices GROUP BY invoice_type").fetchall()
+        return {
+            "db_path": str(self.db_path),
+            "invoices_by_type": {invoice_type: count for invoice_type, count in rows}
+        }
+
+    def list_weekend_folders(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT business, folder_name, folder_path, folder_date FROM invoices
+                WHERE invoice_type = 'facture_weekend'
+                ORDER BY business, folder_date DESC
+                """
+            ).fetchall()
+        businesses: Dict[str, List[Dict[str, Any]]] = {}
+        for business, folder_name, folder_path, folder_date in rows:
+            businesses.setdefault(business, []).append({
+                "nombre": folder_name,
+                "ruta": folder_path,
+                "fecha": datetime.fromisoformat(folder_date)
+            })
+        return businesses
+
+    def get_folder(self, business: str, folder_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT folder_path, files FROM invoices WHERE business = ? AND folder_name = ? AND invoice_type = 'facture_weekend'",
+                (business, folder_name)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"ruta": row[0], "archivos": json.loads(row[1])}
+
+    def search_weekend_folders(self, business: str, fecha_inicio: datetime, fecha_fin: datetime) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT folder_name, folder_path, files FROM invoices
+                WHERE business = ? AND invoice_type = 'facture_weekend' AND folder_date BETWEEN ? AND ?
+                ORDER BY folder_date DESC
+                """,
+                (business, fecha_inicio.isoformat(), fecha_fin.isoformat())
+            ).fetchall()
+        return [{"nombre": row[0], "ruta": row[1], "archivos": json.loads(row[2])} for row in rows]
+
+    def rebuild(self, base_path: Path, temp_path: Optional[Path] = None) -> Dict[str, int]:
+        with self._lock:
+            self._conn.execute("DELETE FROM invoices")
+            self._conn.commit()
+        counts = {"facture_weekend": 0, "facture_trip": 0}
+        base_path = Path(base_path)
+        if base_path.exists():
+            for company_folder in base_path.iterdir():
+                if not company_folder.is_dir():
+                    continue
+                for invoice_folder in company_folder.iterdir():
+                    if not invoice_folder.is_dir():
+                        continue
+                    if WEEKEND_FOLDER_PATTERN.match(invoice_folder.name):
+                        counts = self._rebuild_folder(invoice_folder, company_folder.name, "facture_weekend", counts)
+                    for trip_folder in invoice_folder.iterdir():
+                        if trip_folder.is_dir():
+                            counts = self._rebuild_folder(trip_folder, company_folder.name, "facture_trip", counts)
+        if temp_path is not None and Path(temp_path).exists():
+            for trip_folder in Path(temp_path).iterdir():
+                if trip_folder.is_dir():
+                    counts = self._rebuild_folder(trip_folder, None, "facture_trip", counts)
+        return counts
+
+    def sync_weekend_folders(self, base_path: Path) -> Dict[str, int]:
+        """Concilia el catálogo con las carpetas weekend en disco de cada empresa cuyo directorio cambió.
+
+        Cubre las carpetas escritas antes del catálogo o fuera del InvoiceWriter sin una reconstrucción manual.
+        """
+        counts = {"added": 0, "removed": 0}
+        base_path = Path(base_path)
+        if not base_path.exists():
+            return counts
+        for company_folder in base_path.iterdir():
+            if not company_folder.is_dir():
+                continue
+            folder_stat = company_folder.stat()
+            # st_nlink cuenta las subcarpetas y cubre sistemas de archivos con mtime de baja resolución
+            signature = (folder_stat.st_mtime_ns, folder_stat.st_nlink)
+            if self._synced_signatures.get(str(company_folder)) == signature:
+                continue
+            on_disk = {
+                folder.name: folder for folder in company_folder.iterdir()
+                if folder.is_dir() and WEEKEND_FOLDER_PATTERN.match(folder.name)
+            }
+            with self._lock:
+                catalogued = {
+                    row[0] for row in self._conn.execute(
+                        "SELECT folder_name FROM invoices WHERE business = ? AND invoice_type = 'facture_weekend'",
+                        (company_folder.name,)
+                    )
+                }
+            for folder_name in sorted(on_disk.keys() - catalogued):
+                folder = on_disk[folder_name]
+                self.record_invoice(folder, company_folder.name, "facture_weekend", self._load_data_facture(folder) or {})
+                counts["added"] += 1
+            for folder_name in catalogued - on_disk.keys():
+                self.remove_folder(company_folder / folder_name)
+                counts["removed"] += 1
+            self._synced_signatures[str(company_folder)] = signature
+        if counts["added"] or counts["removed"]:
+            print(f"🗂️ Catálogo conciliado con el disco: {counts['added']} carpetas agregadas, {counts['removed']} eliminadas")
+        return counts
+
+    def _load_data_facture(self, folder: Path) -> Optional[Dict[str, Any]]:
+        json_file = folder / "factura.json"
+        if not json_file.exists():
+            return None
+        try:
+            invoice_data = json_codec.load_file(json_file)
+        except Exception as e:
+            print(f"⚠️ Error leyendo JSON de {json_file}: {e}")
+            return None
+        return invoice_data.get('data_facture') or {}
+
+    def _rebuild_folder(self, folder: Path, business: Optional[str], invoice_type: str, counts: Dict[str, int]) -> Dict[str, int]:
+        data_facture = self._load_data_facture(folder)
+        if data_facture is None:
+            return counts
+        if business is None:
+            business = str(data_facture.get('name_business', 'Desconocida')).split(",")[0]
+        self.record_invoice(folder, business, invoice_type, data_facture)
+        counts[invoice_type] = counts.get(invoice_type, 0) + 1
+        return counts
+
+    def _parse_weekend_folder_date(self, folder_name: str) -> Optional[datetime]:
+        try:
+            return datetime.strptime(folder_name, "%Y-%m-%d_%H-%M-%S")
+        except ValueError:
+            return None
+
+    def _to_float(self, value: Any) -> Optional[float]:
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Uso: python -m app.services.invoice_catalog rebuild")
+        sys.exit(1)
+    catalog = InvoiceCatalog()
+    result = catalog.rebuild(Path("Facturas"), Path("temp"))
+    print(f"✅ Catálogo reconstruido: {result}")
+    catalog.close()
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils import json_codec
+
+
+class InvoiceWriter:
+    _instances: Dict[str, "InvoiceWriter"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, journal_path: str = "cache/write_journal.sqlite3", max_workers: int = 4):
+        self.journal_path = Path(journal_path)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="InvoiceWriter")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._running: Dict[str, Future] = {}
+        self._submitted = 0
+        self._coalesced = 0
+        self._completed = 0
+        self._failed = 0
+        self._conn = sqlite3.connect(str(self.journal_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_writes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                folder TEXT NOT NULL,
+                replace_existing INTEGER NOT NULL,
+                documents TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_files (
+                write_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                content BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_files_write ON pending_files(write_id)")
+        self._conn.commit()
+
+    @classmethod
+    def for_journal_path(cls, journal_path: str = "cache/write_journal.sqlite3") -> "InvoiceWriter":
+        key = str(Path(journal_path).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(journal_path)
+            return cls._instances[key]
+
+    def submit(
+        self,
+        folder: Path,
+        documents: Dict[str, Dict[str, Any]],
+        images: Dict[str, bytes],
+        replace_existing: bool = False,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Future:
+        metadata = metadata or {}
+        write_id = self._journal(folder, documents, images, replace_existing, metadata)
+        return self._enqueue(Path(folder), documents, images, replace_existing, metadata, [write_id])
+
+    def recover(self) -> List[Tuple[Dict[str, Any], Future]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, folder, replace_existing, documents, metadata FROM pending_writes ORDER BY id"
+            ).fetchall()
+            recovered = []
+            for write_id, folder, replace_existing, documents, metadata in rows:
+                files = self._conn.execute(
+                    "SELECT name, content FROM pending_files WHERE write_id = ?", (write_id,)
+                ).fetchall()
+                recovered.append((write_id, folder, bool(replace_existing), json_codec.loads(documents), json_codec.loads(metadata), dict(files)))
+        futures = []
+        for write_id, folder, replace_existing, documents, metadata, images in recovered:
+            future = self._enqueue(Path(folder), documents, images, replace_existing, metadata, [write_id])
+            futures.append((metadata, future))
+        if futures:
+            print(f"🔁 {len(futures)} escrituras pendientes recuperadas del journal")
+        return futures
+
+    def flush(self, folder: Optional[Path] = None, timeout: Optional[float] = None):
+        with self._lock:
+            if folder is None:
+                futures = [entry["future"] for entry in self._pending.values()] + list(self._running.values())
+            else:
+                key = str(Path(folder))
+                futures = [
+                    future for future in (
+                        self._pending.get(key, {}).get("future"),
+                        self._running.get(key)
+                    ) if future is not None
+                ]
+        wait(futures, timeout=timeout)
+
+    def shutdown(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            journaled = self._conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+            return {
+                "max_workers": self.max_workers,
+                "pending_folders": len(self._pending),
+                "running_folders": len(self._running),
+                "journaled_writes": journaled,
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "completed": self._completed,
+                "failed": self._failed
+            }
+
+    def _journal(
+        self,
+        folder: Path,
+        documents: Dict[str, Dict[str, Any]],
+        images: Dict[str, bytes],
+        replace_existing: bool,
+        metadata: Dict[str, Any]
+    ) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO pending_writes (folder, replace_existing, documents, metadata, created_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(folder),
+                    int(replace_existing),
+                    json_codec.dumps(documents, pretty=False).decode("utf-8"),
+                    json_codec.dumps(metadata, pretty=False).decode("utf-8"),
+                    datetime.now().isoformat()
+                )
+            )
+            write_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO pending_files (write_id, name, content) VALUES (?, ?, ?)",
+                [(write_id, name, content) for name, content in images.items()]
+            )
+            self._conn.commit()
+        return write_id
+
+    def _enqueue(
+        self,
+        folder: Path,
+        documents: Dict[str, Dict[str, Any]],
+        images: Dict[str, bytes],
+        replace_existing: bool,
+        metadata: Dict[str, Any],
+        write_ids: List[int]
+    ) -> Future:
+        key = str(folder)
+        with self._lock:
+            self._submitted += 1
+            entry = self._pending.get(key)
+            if entry is not None:
+                if replace_existing:
+                    entry["documents"] = dict(documents)
+                    entry["images"] = dict(images)
+                    entry["replace_existing"] = True
+                else:
+                    entry["documents"].update(documents)
+                    entry["images"].update(images)
+                entry["metadata"] = metadata
+                entry["write_ids"].extend(write_ids)
+                self._coalesced += 1
+                return entry["future"]
+            entry = {
+                "folder": folder,
+                "documents": dict(documents),
+                "images": dict(images),
+                "replace_existing": replace_existing,
+                "metadata": metadata,
+                "write_ids": list(write_ids),
+                "future": Future()
+            }
+            self._pending[key] = entry
+            if key not in self._running:
+                self._start_locked(key)
+            return entry["future"]
+
+    def _start_locked(self, key: str):
+        entry = self._pending.pop(key)
+        self._running[key] = entry["future"]
+        self._executor.submit(self._run_write, key, entry)
+
+    def _run_write(self, key: str, entry: Dict[str, Any]):
+        future: Future = entry["future"]
+        try:
+            saved_files = self._write_folder(entry)
+            with self._lock:
+                self._conn.executemany("DELETE FROM pending_files WHERE write_id = ?", [(write_id,) for write_id in entry["write_ids"]])
+                self._conn.executemany("DELETE FROM pending_writes WHERE id = ?", [(write_id,) for write_id in entry["write_ids"]])
+                self._conn.commit()
+                self._completed += 1
+            result = {"success": True, "folder": key, "archivos_guardados": saved_files, "metadata": entry["metadata"]}
+        except Exception as e:
+            print(f"❌ Error escribiendo archivos en {key}: {e}")
+            with self._lock:
+                self._failed += 1
+            result = {"success": False, "folder": key, "error": str(e), "metadata": entry["metadata"]}
+        with self._lock:
+            self._running.pop(key, None)
+            if key in self._pending:
+                self._start_locked(key)
+        future.set_result(result)
+
+    def _write_folder(self, entry: Dict[str, Any]) -> List[str]:
+        folder: Path = entry["folder"]
+        folder.mkdir(parents=True, exist_ok=True)
+        saved_files = []
+        for name, document in entry["documents"].items():
+            content = json_codec.dumps(document)
+            saved_files.append(self._atomic_write(folder / name, content))
+        for name, content in entry["images"].items():
+            saved_files.append(self._atomic_write(folder / name, content))
+        if entry["replace_existing"]:
+            written = set(entry["documents"]) | set(entry["images"])
+            for file in folder.iterdir():
+                if file.is_file() and file.name not in written:
+                    file.unlink()
+        self._fsync_directory(folder)
+        return saved_files
+
+    def _atomic_write(self, path: Path, content: bytes) -> str:
+        temp_file = path.with_name(f".{path.name}.tmp")
+        with open(temp_file, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+        return str(path)
+
+    def _fsync_directory(self, folder: Path):
+        try:
+            fd = os.open(str(folder), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
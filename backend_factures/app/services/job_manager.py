@@ -0,0 +1,365 @@
+import asyncio
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from fastapi import UploadFile
+from app.utils import json_codec
+
+FINISHED_JOB_STATES = ("completed", "failed")
+SETTLED_JOB_STATES = FINISHED_JOB_STATES + ("deferred",)
+SETTLED_IMAGE_STATES = ("done", "failed", "deferred")
+
+
+class FactureJobManager:
+    def __init__(
+        self,
+        image_processor,
+        jobs_path: str = "jobs",
+        max_workers: int = 4,
+        probe_interval: float = 30.0,
+        retention_seconds: Optional[float] = None,
+        max_finished_jobs: Optional[int] = None
+    ):
+        self.image_processor = image_processor
+        self.jobs_path = Path(jobs_path)
+        self.jobs_path.mkdir(exist_ok=True)
+        self.max_workers = max_workers
+        self.probe_interval = probe_interval
+        self.retention_seconds = retention_seconds if retention_seconds is not None else float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+        self.max_finished_jobs = max_finished_jobs if max_finished_jobs is not None else int(os.getenv("JOB_MAX_FINISHED", "500"))
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished_at: Dict[str, float] = {}
+        self.evicted_jobs = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._save_locks: Dict[str, asyncio.Lock] = {}
+        self._probe_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._restore_unfinished_jobs()
+        await self.prune_jobs()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(), name=f"FactureJobWorker-{index}")
+            for index in range(self.max_workers)
+        ]
+        self._probe_task = asyncio.create_task(self._probe_loop(), name="FactureDeferredProbe")
+
+    async def stop(self):
+        tasks = self._workers + ([self._probe_task] if self._probe_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._probe_task = None
+
+    async def submit(
+        self,
+        files: List[UploadFile],
+        enhance_ocr: bool = True,
+        base_api_url: str = "",
+        limit_thinking_ai: int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[str] = None,
+        deferred: bool = False
+    ) -> Dict[str, Any]:
+        if self._queue is None:
+            await self.start()
+        validated_files = await self.image_processor.validate_files(files)
+        job_id = uuid.uuid4().hex
+        job_folder = self.jobs_path / job_id
+        images = []
+        image_files = []
+        for index, file_data in enumerate(validated_files):
+            safe_name = re.sub(r'[^\w.\-]', '_', file_data["filename"] or f"imagen_{index}")
+            image_path = job_folder / f"{index:03d}_{safe_name}"
+            image_files.append((image_path, await file_data["file"].read()))
+            images.append({
+                "index": index,
+                "filename": file_data["filename"],
+                "path": str(image_path),
+                "state": "deferred" if deferred else "pending",
+                "result": None
+            })
+        job = {
+            "job_id": job_id,
+            "state": "deferred" if deferred else "queued",
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat(),
+            "options": {
+                "enhance_ocr": enhance_ocr,
+                "base_api_url": str(base_api_url),
+                "limit_thinking_ai": limit_thinking_ai,
+                "speculative_ocr": speculative_ocr,
+                "ocr_engine": ocr_engine
+            },
+            "images": images
+        }
+        await asyncio.to_thread(self._write_job_images, job_folder, image_files)
+        self.jobs[job_id] = job
+        await self._save_job(job)
+        if deferred:
+            print(f"⏸️ Trabajo {job_id} en cola diferida con {len(images)} imágenes hasta que los servicios respondan")
+        else:
+            for image in images:
+                self._queue.put_nowait((job_id, image["index"]))
+        return self._job_summary(job)
+
+    async def drain_deferred(self) -> int:
+        drained = 0
+        for job in self.jobs.values():
+            deferred_images = [image for image in job["images"] if image["state"] == "deferred"]
+            if not deferred_images or not self.image_processor.backends_available(job["options"]["ocr_engine"]):
+                continue
+            for image in deferred_images:
+                image["state"] = "pending"
+                self._queue.put_nowait((job["job_id"], image["index"]))
+            job["state"] = "queued"
+            await self._touch(job)
+            drained += len(deferred_images)
+        if drained:
+            print(f"▶️ {drained} imágenes diferidas devueltas a la cola de procesamiento")
+        return drained
+
+    async def prune_jobs(self) -> int:
+        """Descarta los trabajos terminados que superan la retención por antigüedad o por cantidad."""
+        now = time.time()
+        expired = [
+            job_id for job_id, finished_at in self._finished_at.items()
+            if self.retention_seconds and now - finished_at > self.retention_seconds
+        ]
+        overflow = len(self._finished_at) - len(expired) - self.max_finished_jobs
+        if overflow > 0:
+            retained = sorted((finished_at, job_id) for job_id, finished_at in self._finished_at.items() if job_id not in expired)
+            expired.extend(job_id for _, job_id in retained[:overflow])
+        if not expired:
+            return 0
+        for job_id in expired:
+            self._finished_at.pop(job_id, None)
+            self.jobs.pop(job_id, None)
+            self._save_locks.pop(job_id, None)
+        await asyncio.to_thread(self._delete_job_folders, expired)
+        self.evicted_jobs += len(expired)
+        print(f"🧹 {len(expired)} trabajos terminados eliminados por retención")
+        return len(expired)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            job = self._load_job(job_id)
+        return self._job_summary(job) if job else None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        events = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers:
+            subscribers.discard(events)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        states: Dict[str, int] = {}
+        for job in self.jobs.values():
+            states[job["state"]] = states.get(job["state"], 0) + 1
+        return {
+            "max_workers": self.max_workers,
+            "running_workers": len(self._workers),
+            "queued_images": self._queue.qsize() if self._queue else 0,
+            "deferred_images": self._count_deferred_images(),
+            "jobs_by_state": states,
+            "finished_jobs_retained": len(self._finished_at),
+            "evicted_jobs": self.evicted_jobs,
+            "retention_seconds": self.retention_seconds,
+            "max_finished_jobs": self.max_finished_jobs
+        }
+
+    def _count_deferred_images(self) -> int:
+        return sum(1 for job in self.jobs.values() for image in job["images"] if image["state"] == "deferred")
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.prune_jobs()
+                if not self._count_deferred_images() and self.image_processor.backends_available():
+                    continue
+                if await self.image_processor.probe_backends():
+                    await self.drain_deferred()
+            except Exception as e:
+                print(f"⚠️ Error en la sonda de servicios: {e}")
+
+    async def _worker_loop(self):
+        while True:
+            job_id, image_index = await self._queue.get()
+            try:
+                await self._process_job_image(job_id, image_index)
+            except Exception as e:
+                print(f"❌ Error procesando imagen {image_index} del trabajo {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process_job_image(self, job_id: str, image_index: int):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        image = job["images"][image_index]
+        image["state"] = "processing"
+        if job["state"] == "queued":
+            job["state"] = "processing"
+        await self._touch(job)
+        self._publish(job_id, {"event": "image_started", "job_id": job_id, "index": image_index, "filename": image["filename"]})
+
+        options = job["options"]
+        try:
+            image_bytes = await asyncio.to_thread(Path(image["path"]).read_bytes)
+            result = await self.image_processor.process_image_bytes(
+                image_bytes,
+                image["filename"],
+                enhance_ocr=options["enhance_ocr"],
+                base_api_url=options["base_api_url"],
+                limit_thinking_ai=options["limit_thinking_ai"],
+                speculative_ocr=options["speculative_ocr"],
+                ocr_engine=options["ocr_engine"]
+            )
+        except Exception as e:
+            result = {"filename": image["filename"], "success": False, "error": str(e)}
+
+        image["result"] = result
+        if result.get("deferred"):
+            image["state"] = "deferred"
+        else:
+            image["state"] = "done" if result.get("success") else "failed"
+        if all(item["state"] in SETTLED_IMAGE_STATES for item in job["images"]):
+            if any(item["state"] == "deferred" for item in job["images"]):
+                job["state"] = "deferred"
+            else:
+                job["state"] = "completed" if any(item["state"] == "done" for item in job["images"]) else "failed"
+        await self._touch(job)
+        self._publish(job_id, {
+            "event": "image_finished",
+            "job_id": job_id,
+            "index": image_index,
+            "filename": image["filename"],
+            "state": image["state"],
+            "result": result
+        })
+        if job["state"] in FINISHED_JOB_STATES:
+            self._finished_at[job_id] = time.time()
+            self._publish(job_id, {"event": "job_finished", "job_id": job_id, "state": job["state"]})
+        elif job["state"] == "deferred":
+            # Nada más avanzará hasta que la sonda devuelva las imágenes a la cola
+            self._publish(job_id, {
+                "event": "job_deferred",
+                "job_id": job_id,
+                "state": job["state"],
+                "deferred_images": sum(1 for item in job["images"] if item["state"] == "deferred")
+            })
+
+    def _publish(self, job_id: str, event: Dict[str, Any]):
+        for events in self._subscribers.get(job_id, set()):
+            events.put_nowait(event)
+
+    async def _touch(self, job: Dict[str, Any]):
+        job["updated_at"] = datetime.now().isoformat()
+        await self._save_job(job)
+
+    def _job_summary(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job["job_id"],
+            "state": job["state"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "total_images": len(job["images"]),
+            "finished_images": sum(1 for image in job["images"] if image["state"] in ("done", "failed")),
+            "deferred_images": sum(1 for image in job["images"] if image["state"] == "deferred"),
+            "images": [
+                {
+                    "index": image["index"],
+                    "filename": image["filename"],
+                    "state": image["state"],
+                    "result": image["result"]
+                }
+                for image in job["images"]
+            ]
+        }
+
+    async def _save_job(self, job: Dict[str, Any]):
+        # Se serializa en el event loop para fijar el estado actual; el lock mantiene el orden de escritura
+        content = json_codec.dumps(job)
+        async with self._save_locks.setdefault(job["job_id"], asyncio.Lock()):
+            await asyncio.to_thread(self._write_job_file, job["job_id"], content)
+
+    def _write_job_file(self, job_id: str, content: bytes):
+        job_file = self.jobs_path / job_id / "job.json"
+        temp_file = job_file.with_name(f".{job_file.name}.tmp")
+        with open(temp_file, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, job_file)
+        self._fsync_directory(job_file.parent)
+
+    def _fsync_directory(self, folder: Path):
+        try:
+            fd = os.open(str(folder), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _write_job_images(self, job_folder: Path, image_files: List[Tuple[Path, bytes]]):
+        job_folder.mkdir(parents=True, exist_ok=True)
+        for image_path, content in image_files:
+            image_path.write_bytes(content)
+
+    def _load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+            return None
+        job_file = self.jobs_path / job_id / "job.json"
+        if not job_file.exists():
+            return None
+        try:
+            return json_codec.load_file(job_file)
+        except Exception as e:
+            print(f"⚠️ Error leyendo trabajo {job_id}: {e}")
+            return None
+
+    def _delete_job_folders(self, job_ids: List[str]):
+        for job_id in job_ids:
+            shutil.rmtree(self.jobs_path / job_id, ignore_errors=True)
+
+    def _restore_unfinished_jobs(self):
+        for job_folder in self.jobs_path.iterdir():
+            if not job_folder.is_dir():
+                continue
+            job = self._load_job(job_folder.name)
+            if not job:
+                continue
+            if job["state"] in FINISHED_JOB_STATES:
+                self._finished_at[job["job_id"]] = datetime.fromisoformat(job["updated_at"]).timestamp()
+                continue
+            self.jobs[job["job_id"]] = job
+            for image in job["images"]:
+                if image["state"] in ("pending", "processing"):
+                    image["state"] = "pending"
+                    self._queue.put_nowait((job["job_id"], image["index"]))
+            if job["state"] == "deferred":
+                print(f"⏸️ Trabajo {job['job_id']} sigue en cola diferida tras reinicio")
+            else:
+                print(f"🔁 Trabajo {job['job_id']} reanudado tras reinicio")
@@ -0,0 +1,46 @@
+import hashlib
+import re
+from typing import Any, Dict, Optional
+from app.services.sqlite_lru_cache import SQLiteLRUCache
+from app.utils import json_codec
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class LLMResponseCache(SQLiteLRUCache):
+    table_name = "llm_responses"
+    columns = (
+        ("model_name", "TEXT NOT NULL"),
+        ("prompt_hash", "TEXT NOT NULL"),
+        ("result", "BLOB NOT NULL")
+    )
+
+    def __init__(
+        self,
+        db_path: str = "cache/llm_responses.sqlite3",
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 30 * 24 * 3600
+    ):
+        super().__init__(db_path, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+    @staticmethod
+    def prompt_hash(system_prompt: str, prompt_variant: str = "") -> str:
+        return hashlib.sha256(f"{system_prompt}\x00{prompt_variant}".encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build_key(cls, text: str, model_name: str, system_prompt: str, prompt_variant: str = "") -> str:
+        text_hash = hashlib.sha256(cls.normalize_text(text).encode("utf-8")).hexdigest()
+        prompt_hash = cls.prompt_hash(system_prompt, prompt_variant)
+        return hashlib.sha256(f"{text_hash}:{model_name}:{prompt_hash}".encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        row = self._load(cache_key, ("result",))
+        return json_codec.loads(row[0]) if row else None
+
+    def put(self, cache_key: str, model_name: str, prompt_hash: str, result: Dict[str, Any]):
+        payload = json_codec.dumps(result, pretty=False)
+        self._store(cache_key, {"model_name": model_name, "prompt_hash": prompt_hash, "result": payload}, len(payload))
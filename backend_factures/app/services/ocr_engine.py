@@ -0,0 +1,60 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.ocr_result_cache import OCRResultCache
+
+
+class OCREngine(ABC):
+    engine_name = "base"
+
+    def __init__(self, cache: Optional[OCRResultCache] = None):
+        self.cache = cache
+        self.ocr_params: Dict[str, Any] = {}
+        self.breaker = CircuitBreaker(f"ocr:{self.engine_name}")
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def extract_text(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = OCRResultCache.build_key(image_bytes, {"engine": self.engine_name, **self.ocr_params})
+            cached_result = await self.cache.get_async(cache_key)
+            if cached_result is not None:
+                cached_result["cached"] = True
+                return cached_result
+        if not self.breaker.allow_request():
+            result = self._error_result(f"Circuito de OCR {self.engine_name} abierto")
+            result.update(engine=self.engine_name, backend_error=True, circuit_open=True)
+            return result
+        result = await self._request_ocr(image_bytes, filename)
+        result["engine"] = self.engine_name
+        if result.get("backend_error"):
+            self.breaker.record_failure(result.get("error"))
+        else:
+            self.breaker.record_success()
+        if cache_key is not None and result.get("success"):
+            await self.cache.put_async(cache_key, image_bytes, {"engine": self.engine_name, **self.ocr_params}, result)
+        return result
+
+    @abstractmethod
+    async def _request_ocr(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        """Ejecuta el OCR del motor; marca backend_error cuando el servicio no está disponible."""
+
+    async def health_check(self) -> bool:
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"engine": self.engine_name}
+
+    def _error_result(self, error: str) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": error,
+            "text": "",
+            "word_count": 0,
+            "confidence": 0.0
+        }
@@ -0,0 +1,39 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+from app.services.sqlite_lru_cache import SQLiteLRUCache
+
+
+class OCRResultCache(SQLiteLRUCache):
+    table_name = "ocr_results"
+    columns = (
+        ("image_hash", "TEXT NOT NULL"),
+        ("params", "TEXT NOT NULL"),
+        ("result", "TEXT NOT NULL")
+    )
+
+    def __init__(self, db_path: str = "cache/ocr_results.sqlite3", max_bytes: int = 256 * 1024 * 1024):
+        super().__init__(db_path, max_bytes=max_bytes)
+
+    @staticmethod
+    def build_key(image_bytes: bytes, params: Dict[str, Any]) -> str:
+        image_hash = hashlib.sha256(image_bytes).hexdigest()
+        params_key = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{image_hash}:{params_key}".encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        row = self._load(cache_key, ("result",))
+        return json.loads(row[0]) if row else None
+
+    def put(self, cache_key: str, image_bytes: bytes, params: Dict[str, Any], result: Dict[str, Any]):
+        stored_result = {key: value for key, value in result.items() if key != "raw_response"}
+        payload = json.dumps(stored_result, ensure_ascii=False, default=str)
+        self._store(
+            cache_key,
+            {
+                "image_hash": hashlib.sha256(image_bytes).hexdigest(),
+                "params": json.dumps(params, sort_keys=True),
+                "result": payload
+            },
+            len(payload.encode("utf-8"))
+        )
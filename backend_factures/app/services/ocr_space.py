@@ -1,77 +1,178 @@
 import asyncio
-from typing import Any, Dict
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
 import aiohttp
+from app.services.ocr_engine import OCREngine
+from app.services.ocr_result_cache import OCRResultCache
+from app.services.rate_limiter import TokenBucket
 
+# Solo frases de saturación; "File size exceeds the maximum..." y demás errores de validación no se reintentan
+THROTTLING_MARKERS = ("rate limit", "too many requests", "concurrent", "timed out waiting for results")
 
-class OCRSpaceService:
-    def __init__(self, api_key: str):
+
+class OCRSpaceService(OCREngine):
+    engine_name = "ocr_space"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.ocr.space/parse/image",
+        connections_per_host: int = 8,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        cache: Optional[OCRResultCache] = None,
+        requests_per_second: float = 2.0,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 20.0
+    ):
+        super().__init__(cache)
         self.api_key = api_key
-        self.base_url = "https://api.ocr.space/parse/image"
+        self.base_url = base_url
         self.timeout = 30
-        
-    async def extract_text(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        self.connections_per_host = connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests_per_second = requests_per_second
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._rate_limiter = TokenBucket(requests_per_second)
+        self._in_flight_limit: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._retries = 0
+        self.ocr_params = {
+            "language": "spa",
+            "isOverlayRequired": "false",
+            "isTable": "true",
+            "scale": "true",
+            "OCREngine": "2"
+        }
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        if self._in_flight_limit is None:
+            self._in_flight_limit = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed or self._in_flight_limit is None:
+            await self.start()
+        return self._session
+
+    async def _request_ocr(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        session = await self._get_session()
+        queue_wait = 0.0
+        attempt = 0
+        while True:
+            attempt += 1
+            waiting_since = time.monotonic()
+            self._waiting += 1
+            acquired = False
+            try:
+                async with self._in_flight_limit:
+                    await self._rate_limiter.acquire()
+                    self._waiting -= 1
+                    acquired = True
+                    queue_wait += time.monotonic() - waiting_since
+                    self._in_flight += 1
+                    try:
+                        result, retryable = await self._post_ocr(session, image_bytes, filename)
+                    finally:
+                        self._in_flight -= 1
+            finally:
+                if not acquired:
+                    self._waiting -= 1
+            if not retryable or attempt > self.max_retries:
+                result["queue_wait"] = round(queue_wait, 4)
+                result["attempts"] = attempt
+                result["backend_error"] = retryable
+                return result
+            self._retries += 1
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+            await asyncio.sleep(random.uniform(0, delay))
+
+    def _is_throttling_message(self, error_message: Any) -> bool:
+        message = " ".join(error_message) if isinstance(error_message, list) else str(error_message or "")
+        message = message.lower()
+        return any(marker in message for marker in THROTTLING_MARKERS)
+
+    async def _post_ocr(self, session: aiohttp.ClientSession, image_bytes: bytes, filename: str) -> Tuple[Dict[str, Any], bool]:
         try:
-            async with aiohttp.ClientSession() as session:
-                data = aiohttp.FormData()
-                data.add_field('file', 
-                             image_bytes, 
-                             filename=filename,
-                             content_type='image/png')
+            data = aiohttp.FormData()
+            data.add_field('file', 
+                           image_bytes, 
+                           filename=filename,
+                           content_type='image/png')
+            
+            data.add_field('apikey', self.api_key)
+            for field_name, field_value in self.ocr_params.items():
+                data.add_field(field_name, field_value)
+            async with session.post(
+                self.base_url,
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
                 
-                data.add_field('apikey', self.api_key)
-                data.add_field('language', 'spa')
-                data.add_field('isOverlayRequired', 'false')
-                data.add_field('isTable', 'true')
-                data.add_field('scale', 'true')
-                data.add_field('OCREngine', '2')  
-                async with session.post(
-                    self.base_url,
-                    data=data,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
-                ) as response:
-                    
-                    if response.status != 200:
-                        return {
-                            "success": False,
-                            "error": f"Error en API OCR: {response.status}",
-                            "text": "",
-                            "word_count": 0,
-                            "confidence": 0.0
-                        }
-                    
-                    result = await response.json()
-                    if result.get("IsErroredOnProcessing", True):
-                        return {
-                            "success": False,
-                            "error": result.get("ErrorMessage", "Error desconocido en OCR"),
-                            "text": "",
-                            "word_count": 0,
-                            "confidence": 0.0
-                        }
-                    
-                    parsed_results = result.get("ParsedResults", [])
-                    if not parsed_results:
-                        return {
-                            "success": False,
-                            "error": "No se obtuvieron resultados del OCR",
-                            "text": "",
-                            "word_count": 0,
-                            "confidence": 0.0
-                        }
-                    parsed_result = parsed_results[0]
-                    extracted_text = parsed_result.get("ParsedText", "").strip()
-                    text_overlay = parsed_result.get("TextOverlay", {})
-                    word_count = len(extracted_text.split())
-                    confidence = self._calculate_confidence(text_overlay)
-                    
+                if response.status != 200:
                     return {
-                        "success": True,
-                        "text": extracted_text,
-                        "word_count": word_count,
-                        "confidence": confidence,
-                        "raw_response": result
-                    }
-                    
+                        "success": False,
+                        "error": f"Error en API OCR: {response.status}",
+                        "text": "",
+                        "word_count": 0,
+                        "confidence": 0.0
+                    }, response.status == 429 or response.status >= 500
+                
+                result = await response.json()
+                if result.get("IsErroredOnProcessing", True):
+                    error_message = result.get("ErrorMessage", "Error desconocido en OCR")
+                    return {
+                        "success": False,
+                        "error": error_message,
+                        "text": "",
+                        "word_count": 0,
+                        "confidence": 0.0
+                    }, self._is_throttling_message(error_message)
+                
+                parsed_results = result.get("ParsedResults", [])
+                if not parsed_results:
+                    return {
+                        "success": False,
+                        "error": "No se obtuvieron resultados del OCR",
+                        "text": "",
+                        "word_count": 0,
+                        "confidence": 0.0
+                    }, False
+                parsed_result = parsed_results[0]
+                extracted_text = parsed_result.get("ParsedText", "").strip()
+                text_overlay = parsed_result.get("TextOverlay", {})
+                word_count = len(extracted_text.split())
+                confidence = self._calculate_confidence(text_overlay)
+                
+                return {
+                    "success": True,
+                    "text": extracted_text,
+                    "word_count": word_count,
+                    "confidence": confidence,
+                    "raw_response": result
+                }, False
+                
         except asyncio.TimeoutError:
             return {
                 "success": False,
@@ -79,7 +180,7 @@ class OCRSpaceService:
                 "text": "",
                 "word_count": 0,
                 "confidence": 0.0
-            }
+            }, True
         except Exception as e:
             return {
                 "success": False,
@@ -87,8 +188,26 @@ class OCRSpaceService:
                 "text": "",
                 "word_count": 0,
                 "confidence": 0.0
-            }
+            }, isinstance(e, aiohttp.ClientConnectionError)
     
+    async def health_check(self) -> bool:
+        try:
+            session = await self._get_session()
+            async with session.get(self.base_url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return response.status < 500
+        except Exception:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "engine": self.engine_name,
+            "requests_per_second": self.requests_per_second,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "retries": self._retries
+        }
+
     def _calculate_confidence(self, text_overlay: Dict) -> float:
         try:
             lines = text_overlay.get("Lines", [])
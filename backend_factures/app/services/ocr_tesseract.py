@@ -0,0 +1,133 @@
+import asyncio
+import io
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from app.services.ocr_engine import OCREngine
+from app.services.ocr_result_cache import OCRResultCache
+
+
+def run_tesseract(image_bytes: bytes, language: str, config: str) -> Dict[str, Any]:
+    """Se ejecuta dentro del proceso worker para no bloquear el event loop."""
+    try:
+        import pytesseract
+        from PIL import Image
+    except ImportError as e:
+        return {
+            "success": False,
+            "error": f"Tesseract no disponible: {e}",
+            "text": "",
+            "word_count": 0,
+            "confidence": 0.0,
+            "backend_error": True
+        }
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        data = pytesseract.image_to_data(image, lang=language, config=config, output_type=pytesseract.Output.DICT)
+        lines: Dict[Any, list] = {}
+        confidences = []
+        for index, word in enumerate(data.get("text", [])):
+            word = word.strip()
+            if not word:
+                continue
+            line_key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(line_key, []).append(word)
+            confidence = float(data["conf"][index])
+            if confidence >= 0:
+                confidences.append(confidence)
+        extracted_text = "\r\n".join("\t".join(words) for words in lines.values()).strip()
+        return {
+            "success": bool(extracted_text),
+            "error": None if extracted_text else "Tesseract no extrajo texto",
+            "text": extracted_text,
+            "word_count": len(extracted_text.split()),
+            "confidence": sum(confidences) / len(confidences) if confidences else 0.0
+        }
+    except pytesseract.TesseractNotFoundError as e:
+        return {
+            "success": False,
+            "error": f"Tesseract no disponible: {e}",
+            "text": "",
+            "word_count": 0,
+            "confidence": 0.0,
+            "backend_error": True
+        }
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"Error en Tesseract: {str(e)}",
+            "text": "",
+            "word_count": 0,
+            "confidence": 0.0
+        }
+
+
+class TesseractOCRService(OCREngine):
+    engine_name = "tesseract"
+
+    def __init__(
+        self,
+        language: str = "spa",
+        config: str = "--oem 1 --psm 6",
+        max_workers: Optional[int] = None,
+        cache: Optional[OCRResultCache] = None
+    ):
+        super().__init__(cache)
+        self.language = language
+        self.config = config
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.ocr_params = {"language": language, "config": config}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending_jobs = 0
+        self._completed_jobs = 0
+
+    async def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    async def close(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def _request_ocr(self, image_bytes: bytes, filename: str) -> Dict[str, Any]:
+        await self.start()
+        with self._lock:
+            self._pending_jobs += 1
+        try:
+            future = self._executor.submit(run_tesseract, image_bytes, self.language, self.config)
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            result = self._error_result(f"Error en OCR local: {str(e)}")
+            result["backend_error"] = True
+            return result
+        finally:
+            with self._lock:
+                self._pending_jobs -= 1
+                self._completed_jobs += 1
+
+    async def health_check(self) -> bool:
+        if shutil.which("tesseract") is None:
+            return False
+        try:
+            await self.start()
+            return True
+        except Exception:
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "engine": self.engine_name,
+                "is_running": self._executor is not None,
+                "max_workers": self.max_workers,
+                "queue_depth": max(0, self._pending_jobs - self.max_workers),
+                "running_jobs": min(self._pending_jobs, self.max_workers),
+                "completed_jobs": self._completed_jobs
+            }
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import aiohttp
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.incremental_json import IncrementalJSONError, IncrementalJSONParser
+
+COLD_LOAD_THRESHOLD_SECONDS = 1.0
+KEEP_ALIVE_PATTERN = re.compile(r'^(-?\d+(?:\.\d+)?)([smh]?)$')
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        max_concurrent_generations: int = 4,
+        timeout: float = 120,
+        connections_per_host: int = 8,
+        keepalive_timeout: float = 60.0,
+        keep_alive: Optional[str] = None,
+        require_warm_up: Optional[bool] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrent_generations = max_concurrent_generations
+        self.timeout = timeout
+        self.connections_per_host = connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.keep_alive = keep_alive if keep_alive is not None else os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+        self.require_warm_up = require_warm_up if require_warm_up is not None else os.getenv("OLLAMA_WARMUP", "1") != "0"
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._streamed = 0
+        self._completed_streams = 0
+        self._aborted_streams: Dict[str, int] = {}
+        self._first_field_times = 0.0
+        self._first_field_count = 0
+        self._warm_models: Dict[str, float] = {}
+        self._warm_up: Dict[str, Any] = {"state": "pending", "models": {}, "attempts": 0, "load_time": None, "error": None}
+        self._latency = {"cold": [0, 0.0], "warm": [0, 0.0]}
+        self.breaker = CircuitBreaker("ollama")
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.connections_per_host,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_generations)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed or self._semaphore is None:
+            await self.start()
+        return self._session
+
+    async def warm_up(self, model_names: List[str], max_attempts: Optional[int] = None, retry_delay: float = 5.0) -> Dict[str, Any]:
+        """Carga los modelos en memoria con un prompt vacío y los fija con keep_alive, reintentando hasta que Ollama responda."""
+        self._warm_up.update(state="warming", models={}, attempts=0, error=None)
+        start_time = time.perf_counter()
+        for model_name in model_names:
+            while True:
+                self._warm_up["attempts"] += 1
+                model_start = time.perf_counter()
+                try:
+                    session = await self._get_session()
+                    async with session.post(
+                        f"{self.base_url}/api/generate",
+                        json={"model": model_name, "prompt": "", "keep_alive": self.keep_alive},
+                        timeout=aiohttp.ClientTimeout(total=max(self.timeout, 300))
+                    ) as response:
+                        response.raise_for_status()
+                        result = await response.json()
+                    self._warm_models[model_name] = time.monotonic()
+                    self.breaker.record_success()
+                    self._warm_up["models"][model_name] = {
+                        "load_time": time.perf_counter() - model_start,
+                        "load_duration": result.get("load_duration", 0) / 1e9
+                    }
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if _is_backend_error(e):
+                        self.breaker.record_failure(e)
+                    attempts = self._warm_up["attempts"]
+                    exhausted = max_attempts is not None and attempts >= max_attempts
+                    self._warm_up.update(state="failed" if exhausted else "retrying", error=str(e))
+                    print(f"⚠️ No se pudo calentar el modelo {model_name} (intento {attempts}): {e}")
+                    if exhausted:
+                        return dict(self._warm_up)
+                    await asyncio.sleep(min(retry_delay * attempts, 60))
+        self._warm_up.update(state="ready", load_time=time.perf_counter() - start_time, error=None, ready_at=time.time())
+        return dict(self._warm_up)
+
+    async def health_check(self) -> bool:
+        try:
+            session = await self._get_session()
+            async with session.get(f"{self.base_url}/api/tags", timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def is_ready(self) -> bool:
+        return not self.require_warm_up or self._warm_up["state"] == "ready"
+
+    def get_warm_up_status(self) -> Dict[str, Any]:
+        return {"ready": self.is_ready(), "keep_alive": self.keep_alive, **self._warm_up}
+
+    def _prepare_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        payload = dict(payload)
+        if self.keep_alive is not None:
+            payload.setdefault("keep_alive", self.keep_alive)
+        return payload
+
+    def _is_warm(self, model_name: Optional[str]) -> bool:
+        last_used = self._warm_models.get(model_name)
+        if last_used is None:
+            return False
+        keep_alive_seconds = _keep_alive_seconds(self.keep_alive)
+        return keep_alive_seconds is None or time.monotonic() - last_used < keep_alive_seconds
+
+    def _record_latency(self, model_name: Optional[str], was_warm: bool, elapsed: float, load_duration: Optional[int] = None):
+        if load_duration is not None:
+            was_warm = load_duration / 1e9 < COLD_LOAD_THRESHOLD_SECONDS
+        bucket = self._latency["warm" if was_warm else "cold"]
+        bucket[0] += 1
+        bucket[1] += elapsed
+        self._warm_models[model_name] = time.monotonic()
+
+    async def generate(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name)
+        session = await self._get_session()
+        payload = self._prepare_payload(payload)
+        async with self._semaphore:
+            self._in_flight += 1
+            was_warm = self._is_warm(payload.get("model"))
+            start_time = time.perf_counter()
+            try:
+                async with session.post(
+                    f"{self.base_url}/api/generate",
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+                ) as response:
+                    response.raise_for_status()
+                    result = await response.json()
+            except Exception as e:
+                if _is_backend_error(e):
+                    self.breaker.record_failure(e)
+                raise
+            else:
+                self.breaker.record_success()
+                self._record_latency(payload.get("model"), was_warm, time.perf_counter() - start_time, result.get("load_duration"))
+                return result
+            finally:
+                self._in_flight -= 1
+
+    async def generate_stream(
+        self,
+        payload: Dict[str, Any],
+        expected_keys: Optional[Iterable[str]] = None,
+        max_tokens: Optional[int] = None,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name)
+        session = await self._get_session()
+        payload = self._prepare_payload(dict(payload, stream=True))
+        if max_tokens:
+            payload["options"] = dict(payload.get("options") or {}, num_predict=max_tokens)
+        parser = IncrementalJSONParser(expected_keys)
+        chunks = []
+        tokens = 0
+        aborted = None
+        time_to_first_field = None
+        start_time = time.perf_counter()
+        async with self._semaphore:
+            self._in_flight += 1
+            self._streamed += 1
+            was_warm = self._is_warm(payload.get("model"))
+            request_start = time.perf_counter()
+            try:
+                async with session.post(
+                    f"{self.base_url}/api/generate",
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        message = json.loads(line)
+                        if message.get("error"):
+                            print(f"⛔ Ollama devolvió un error: {message['error']}")
+                            aborted = "error"
+                            break
+                        token = message.get("response", "")
+                        chunks.append(token)
+                        tokens += 1
+                        try:
+                            fields = parser.feed(token)
+                        except IncrementalJSONError as e:
+                            print(f"⛔ Generación abortada ({e.reason}): {e}")
+                            aborted = e.reason
+                            break
+                        for key, value in fields:
+                            if time_to_first_field is None:
+                                time_to_first_field = time.perf_counter() - start_time
+                            if on_field:
+                                on_field(key, value)
+                        if parser.done or message.get("done"):
+                            break
+                        if max_tokens and tokens >= max_tokens:
+                            print(f"⛔ Generación abortada: se superó el presupuesto de {max_tokens} tokens")
+                            aborted = "token_budget"
+                            break
+            except Exception as e:
+                if _is_backend_error(e):
+                    self.breaker.record_failure(e)
+                raise
+            finally:
+                self._in_flight -= 1
+        if aborted == "error":
+            self.breaker.record_failure(message.get("error"))
+        else:
+            self.breaker.record_success()
+            self._record_latency(payload.get("model"), was_warm, time.perf_counter() - request_start)
+        if aborted:
+            self._aborted_streams[aborted] = self._aborted_streams.get(aborted, 0) + 1
+        elif parser.done:
+            self._completed_streams += 1
+        if time_to_first_field is not None:
+            self._first_field_times += time_to_first_field
+            self._first_field_count += 1
+        return {
+            "response": "".join(chunks),
+            "data": parser.fields if parser.done and not aborted else None,
+            "partial_data": dict(parser.fields),
+            "aborted": aborted,
+            "tokens": tokens,
+            "time_to_first_field": time_to_first_field,
+            "total_time": time.perf_counter() - start_time
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "max_concurrent_generations": self.max_concurrent_generations,
+            "in_flight": self._in_flight,
+            "timeout": self.timeout,
+            "streamed_generations": self._streamed,
+            "completed_streams": self._completed_streams,
+            "aborted_streams": dict(self._aborted_streams),
+            "avg_time_to_first_field": self._first_field_times / self._first_field_count if self._first_field_count else None,
+            "warm_up": self.get_warm_up_status(),
+            "circuit_breaker": self.breaker.get_stats(),
+            "latency": {
+                state: {"count": count, "avg_seconds": total / count if count else None}
+                for state, (count, total) in self._latency.items()
+            }
+        }
+
+
+def _is_backend_error(error: Exception) -> bool:
+    """Errores que indican que Ollama no está disponible, no que el modelo respondió mal."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def _keep_alive_seconds(keep_alive: Optional[str]) -> Optional[float]:
+    """Segundos que Ollama mantiene el modelo cargado; None si queda fijado indefinidamente."""
+    if keep_alive is None:
+        return 300.0
+    match = KEEP_ALIVE_PATTERN.match(str(keep_alive).strip())
+    if not match:
+        return 300.0
+    value = float(match.group(1))
+    if value < 0:
+        return None
+    return value * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
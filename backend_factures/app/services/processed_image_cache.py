@@ -0,0 +1,82 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.services.sqlite_lru_cache import SQLiteLRUCache
+
+
+class ProcessedImageCache(SQLiteLRUCache):
+    table_name = "processed_images"
+    key_column = "image_hash"
+    columns = (
+        ("invoice_type", "TEXT NOT NULL"),
+        ("ocr_text", "TEXT NOT NULL"),
+        ("structured_data", "TEXT NOT NULL"),
+        ("saved_files", "TEXT NOT NULL"),
+        ("ocr_summary", "TEXT NOT NULL"),
+        ("folder", "TEXT NOT NULL")
+    )
+
+    def __init__(self, db_path: str = "cache/processed_images.sqlite3", max_entries: int = 5000):
+        self.invalidations = 0
+        super().__init__(db_path, max_entries=max_entries)
+
+    @staticmethod
+    def hash_bytes(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def get(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._load(image_hash, ("invoice_type", "ocr_text", "structured_data", "saved_files", "ocr_summary"))
+        if row is None:
+            return None
+        return {
+            "invoice_type": row[0],
+            "ocr_text": row[1],
+            "structured_data": json.loads(row[2]),
+            "archivos_guardados": json.loads(row[3]),
+            "ocr_summary": json.loads(row[4])
+        }
+
+    def put(
+        self,
+        image_hash: str,
+        invoice_type: str,
+        ocr_text: str,
+        structured_data: Dict[str, Any],
+        saved_files: List[str],
+        ocr_summary: Dict[str, Any],
+        folder: str
+    ):
+        """Registra una imagen cuyos archivos ya fueron escritos en disco por el InvoiceWriter."""
+        values = {
+            "invoice_type": invoice_type,
+            "ocr_text": ocr_text,
+            "structured_data": json.dumps(structured_data, ensure_ascii=False, default=str),
+            "saved_files": json.dumps(saved_files, ensure_ascii=False),
+            "ocr_summary": json.dumps(ocr_summary, ensure_ascii=False, default=str),
+            "folder": Path(folder).as_posix()
+        }
+        self._store(image_hash, values, sum(len(str(value).encode("utf-8")) for value in values.values()))
+
+    def invalidate_folder(self, folder: str) -> int:
+        """Elimina las entradas de la carpeta y de sus subcarpetas (trips dentro de un weekend)."""
+        folder = Path(folder).as_posix()
+        prefix = folder + "/"
+        removed = self._delete_where("folder = ? OR substr(folder, 1, ?) = ?", (folder, len(prefix), prefix))
+        self.invalidations += removed
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats["invalidations"] = self.invalidations
+        return stats
+
+    def _create_indexes(self):
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_processed_images_folder ON processed_images(folder)")
+
+    def _before_store_locked(self, key: str, values: Dict[str, Any]):
+        # Una carpeta con replace_existing solo conserva la última imagen escrita
+        self._conn.execute(
+            "DELETE FROM processed_images WHERE folder = ? AND image_hash != ?",
+            (values["folder"], key)
+        )
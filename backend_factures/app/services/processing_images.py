@@ -1,40 +1,94 @@
 from datetime import datetime
 import os
+import time
 import uuid
 from fastapi import UploadFile, HTTPException, status
 from typing import List, Dict, Any, Optional, Tuple
 import magic
-import cv2
 import numpy as np
 from PIL import Image
 import io
 import base64
 import asyncio
 from app.services.file_manager_service import FileManagerService
+from app.services.enhancement_policy import EnhancementPolicy
+from app.services.event_bus import INVOICE_FOLDER_REMOVED, event_bus
+from app.services.image_enhancement_engine import ImageEnhancementEngine
+from app.services.ocr_engine import OCREngine
+from app.services.ocr_result_cache import OCRResultCache
 from app.services.ocr_space import OCRSpaceService
+from app.services.ocr_tesseract import TesseractOCRService
+from app.services.ollama_client import OllamaClient
+from app.services.processed_image_cache import ProcessedImageCache
 from app.services.processing_text import AITextProcessorService
 
 class ImageProcessorService:
-    def __init__(self):
+    def __init__(
+        self,
+        enhancement_workers: Optional[int] = None,
+        ollama_base_url: str = "http://localhost:11434",
+        max_concurrent_generations: int = 4,
+        adaptive_enhancement: bool = True,
+        file_manager: Optional[FileManagerService] = None,
+        early_cutoff_word_count: Optional[int] = None
+    ):
         self.allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/tiff', 'image/bmp']
         self.max_file_size = 50 * 1024 * 1024 
         self.enhanced_dir = "temp"
         os.makedirs(self.enhanced_dir, exist_ok=True)
-        self.ocr_service = OCRSpaceService("K87033164188957")
+        self.ocr_cache = OCRResultCache()
+        self.cpu_worker_budget = max(1, int(os.getenv("CPU_WORKER_BUDGET", str(os.cpu_count() or 1))))
+        if enhancement_workers is None:
+            enhancement_workers = max(1, self.cpu_worker_budget // 2)
+        tesseract_workers = max(1, self.cpu_worker_budget - enhancement_workers)
+        self.ocr_engines: Dict[str, OCREngine] = {
+            "ocr_space": OCRSpaceService("K87033164188957", cache=self.ocr_cache),
+            "tesseract": TesseractOCRService(max_workers=tesseract_workers, cache=self.ocr_cache)
+        }
+        self.default_ocr_engine = os.getenv("OCR_ENGINE", "ocr_space")
+        self.enhancement_engine = ImageEnhancementEngine(max_workers=enhancement_workers)
+        self.enhancement_policy = EnhancementPolicy() if adaptive_enhancement else None
+        self.ollama_client = OllamaClient(ollama_base_url, max_concurrent_generations=max_concurrent_generations)
+        self.text_processor = AITextProcessorService(ollama_client=self.ollama_client)
+        self.file_manager = file_manager or FileManagerService()
+        self.processed_cache = ProcessedImageCache()
+        event_bus.subscribe(INVOICE_FOLDER_REMOVED, self._on_invoice_folder_removed)
+        self.early_cutoff_word_count = early_cutoff_word_count if early_cutoff_word_count is not None else int(os.getenv("OCR_EARLY_CUTOFF_WORDS", "40"))
     async def process_images(
         self, 
         files: List[UploadFile],
         enhance_ocr: bool = True,
         process_in_parallel: bool = True,
         base_api_url : str = "",
-        limit_thinking_ai : int = 2
+        limit_thinking_ai : int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[str] = None
     ) -> Dict[str, Any]:
+        engine = self._get_ocr_engine(ocr_engine)
         validated_files = await self._validate_files(files)
         if process_in_parallel:
-            results = await self._process_parallel(validated_files, enhance_ocr,base_api_url,limit_thinking_ai)
+            results = await self._process_parallel(validated_files, enhance_ocr,base_api_url,limit_thinking_ai,speculative_ocr,engine)
         else:
-            results = await self._process_sequential(validated_files, enhance_ocr,base_api_url,limit_thinking_ai)
+            results = await self._process_sequential(validated_files, enhance_ocr,base_api_url,limit_thinking_ai,speculative_ocr,engine)
         return self._format_results(results)
+    async def process_image_bytes(
+        self,
+        image_bytes: bytes,
+        filename: str,
+        enhance_ocr: bool = True,
+        base_api_url: str = "",
+        limit_thinking_ai: int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[str] = None
+    ) -> Dict[str, Any]:
+        file_data = {"content": image_bytes, "filename": filename}
+        return await self._process_single_image(
+            file_data, enhance_ocr, base_api_url, limit_thinking_ai, speculative_ocr, self._get_ocr_engine(ocr_engine)
+        )
+
+    async def validate_files(self, files: List[UploadFile]) -> List[Dict[str, Any]]:
+        return await self._validate_files(files)
+
     async def _validate_files(self, files: List[UploadFile]) -> List[Dict[str, Any]]:
         if not files:
             raise HTTPException(
@@ -80,10 +134,12 @@ class ImageProcessorService:
         validated_files: List[Dict[str, Any]], 
         enhance_ocr: bool,
         base_api_url : str = "",
-        limit_thinking_ai : int = 2
+        limit_thinking_ai : int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[OCREngine] = None
     ) -> List[Dict[str, Any]]:
         tasks = [
-            self._process_single_image(file_data, enhance_ocr,base_api_url,limit_thinking_ai) 
+            self._process_single_image(file_data, enhance_ocr,base_api_url,limit_thinking_ai,speculative_ocr,ocr_engine) 
             for file_data in validated_files
         ]
         return await asyncio.gather(*tasks, return_exceptions=True)
@@ -93,12 +149,14 @@ class ImageProcessorService:
         validated_files: List[Dict[str, Any]], 
         enhance_ocr: bool,
         base_api_url : str = "",
-        limit_thinking_ai : int = 2
+        limit_thinking_ai : int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[OCREngine] = None
     ) -> List[Dict[str, Any]]:
         results = []
         for file_data in validated_files:
             try:
-                result = await self._process_single_image(file_data, enhance_ocr,base_api_url,limit_thinking_ai)
+                result = await self._process_single_image(file_data, enhance_ocr,base_api_url,limit_thinking_ai,speculative_ocr,ocr_engine)
                 results.append(result)
             except Exception as e:
                 results.append({
@@ -113,27 +171,50 @@ class ImageProcessorService:
         file_data: Dict[str, Any], 
         enhance_ocr: bool,
         base_api_url : str = "",
-        limit_thinking_ai : int = 2
+        limit_thinking_ai : int = 2,
+        speculative_ocr: bool = False,
+        ocr_engine: Optional[OCREngine] = None
     ) -> Dict[str, Any]:
         start_time = datetime.now()
+        failures_since = time.monotonic()
+        ocr_engine = ocr_engine or self._get_ocr_engine()
         try:
-            image_bytes = await file_data["file"].read()
-            original_ocr = await self.ocr_service.extract_text(image_bytes, file_data["filename"])
+            image_bytes = file_data["content"] if "content" in file_data else await file_data["file"].read()
+            image_hash = ProcessedImageCache.hash_bytes(image_bytes)
+            cached = await self.processed_cache.get_async(image_hash)
+            if cached:
+                return self._build_cached_result(file_data["filename"], cached, base_api_url, start_time)
+            if not self.backends_available(ocr_engine.engine_name):
+                return self._build_deferred_result(file_data["filename"], "Servicios de OCR o IA no disponibles", start_time)
             enhanced_ocr = None
             enhanced_image_path = ""
             enhanced_bytes = None
-            if enhance_ocr:
-                enhanced_bytes = await self._enhance_image_quality(
-                    image_bytes, file_data["filename"]
+            enhancement_stats = None
+            early_cutoff = None
+            if enhance_ocr and speculative_ocr:
+                original_ocr, enhanced_ocr, enhanced_bytes, enhancement_stats, early_cutoff = await self._run_speculative_ocr(
+                    image_bytes, file_data["filename"], ocr_engine
                 )
-                enhanced_ocr = await self.ocr_service.extract_text(enhanced_bytes, f"enhanced_{file_data['filename']}")
+            else:
+                original_ocr = await ocr_engine.extract_text(image_bytes, file_data["filename"])
+                if enhance_ocr:
+                    enhanced_bytes, enhancement_stats = await self._enhance_image_quality(
+                        image_bytes, file_data["filename"]
+                    )
+                    if enhancement_stats.get("decision") != "skip":
+                        enhanced_ocr = await ocr_engine.extract_text(enhanced_bytes, f"enhanced_{file_data['filename']}")
             best_ocr = self._select_best_ocr_result(original_ocr, enhanced_ocr)
+            if not best_ocr["text"] and ocr_engine.breaker.failed_since(failures_since):
+                return self._build_deferred_result(file_data["filename"], f"OCR {ocr_engine.engine_name} no disponible", start_time)
             processing_time = (datetime.now() - start_time).total_seconds()
-            text_processor = AITextProcessorService()
-            invoice_type , structured_data = text_processor.process_extracted_text(best_ocr["text"],limit_thinking_ai)
-            file_manager = FileManagerService()
+            ai_result = await self.text_processor.process_extracted_text(best_ocr["text"],limit_thinking_ai)
+            invoice_type, structured_data = ai_result if ai_result else (None, None)
+            if structured_data is None and (self.ollama_client.breaker.failed_since(failures_since) or not self.ollama_client.breaker.is_closed):
+                return self._build_deferred_result(file_data["filename"], "Servicio de IA no disponible", start_time)
             if structured_data:
-                organizacion_result = file_manager.organize_invoice(
+                # organize_invoice registra las imágenes en el journal SQLite (synchronous=FULL) antes de devolver
+                organizacion_result = await asyncio.to_thread(
+                    self.file_manager.organize_invoice,
                     data=structured_data,
                     original_image= image_bytes, 
                     enhanced_image=enhanced_bytes,
@@ -143,6 +224,33 @@ class ImageProcessorService:
                 )
             else:
                 organizacion_result = {"success": False, "error": "No structured data"}
+            if not organizacion_result.get("success"):
+                return {
+                    "filename": file_data["filename"],
+                    "success": False,
+                    "error": organizacion_result.get("error") or "No se pudo organizar la factura",
+                    "data_crud": best_ocr["text"],
+                    "type_model": invoice_type,
+                    "confidence": best_ocr["confidence"],
+                    "word_count": best_ocr["word_count"],
+                    "processing_time": processing_time,
+                    "ocr_source": best_ocr["source"],
+                    "ocr_engine": ocr_engine.engine_name
+                }
+            if organizacion_result.get("success"):
+                self._cache_after_write(
+                    organizacion_result["write_future"],
+                    image_hash,
+                    invoice_type,
+                    best_ocr["text"],
+                    structured_data.dict(),
+                    organizacion_result["archivos_guardados"],
+                    {
+                        "confidence": best_ocr["confidence"],
+                        "word_count": best_ocr["word_count"],
+                        "source": best_ocr["source"]
+                    }
+                )
             return {
                 "filename": file_data["filename"],
                 "success": True,
@@ -156,19 +264,32 @@ class ImageProcessorService:
                 "word_count": best_ocr["word_count"],
                 "processing_time": processing_time,
                 "ocr_source": best_ocr["source"],
+                "ocr_engine": ocr_engine.engine_name,
                 "enhanced_image_path": enhanced_image_path if best_ocr["source"] == "enhanced" else "",
                 "comparison": {
                     "original": {
                         "word_count": original_ocr.get("word_count", 0),
                         "confidence": original_ocr.get("confidence", 0.0),
-                        "success": original_ocr.get("success", False)
+                        "success": original_ocr.get("success", False),
+                        "queue_wait": original_ocr.get("queue_wait", 0.0)
                     },
                     "enhanced": {
                         "word_count": enhanced_ocr.get("word_count", 0) if enhanced_ocr else 0,
                         "confidence": enhanced_ocr.get("confidence", 0.0) if enhanced_ocr else 0.0,
-                        "success": enhanced_ocr.get("success", False) if enhanced_ocr else False
-                    } if enhance_ocr else None
-                }
+                        "success": enhanced_ocr.get("success", False) if enhanced_ocr else False,
+                        "queue_wait": enhanced_ocr.get("queue_wait", 0.0) if enhanced_ocr else 0.0
+                    } if enhance_ocr else None,
+                    "early_cutoff": early_cutoff,
+                    "enhancement_decision": {
+                        "decision": enhancement_stats.get("decision"),
+                        "image_stats": enhancement_stats.get("image_stats")
+                    } if enhancement_stats else None
+                },
+                "enhancement": {
+                    "cpu_time": round(enhancement_stats.get("cpu_time", 0.0), 4),
+                    "queue_wait": round(enhancement_stats.get("queue_wait", 0.0), 4),
+                    "success": enhancement_stats.get("success", False)
+                } if enhancement_stats else None
             }
             
         except Exception as e:
@@ -184,6 +305,144 @@ class ImageProcessorService:
                 "ocr_source": "none"
             }
 
+    async def _run_speculative_ocr(
+        self,
+        image_bytes: bytes,
+        filename: str,
+        ocr_engine: OCREngine
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], bytes, Dict[str, Any], Optional[Dict[str, Any]]]:
+        enhance_task = asyncio.create_task(self._enhance_image_quality(image_bytes, filename))
+        original_task = asyncio.create_task(ocr_engine.extract_text(image_bytes, filename))
+        enhanced_task = asyncio.create_task(self._extract_enhanced_text(enhance_task, filename, ocr_engine))
+        early_cutoff = None
+        done, pending = await asyncio.wait({original_task, enhanced_task}, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            first_task = done.pop()
+            other_task = pending.pop()
+            if self._clears_early_cutoff(first_task.result()):
+                other_task.cancel()
+                try:
+                    await other_task
+                except asyncio.CancelledError:
+                    pass
+                early_cutoff = {
+                    "winner": "original" if first_task is original_task else "enhanced",
+                    "cancelled": "enhanced" if first_task is original_task else "original"
+                }
+            else:
+                await other_task
+        original_ocr = self._task_result_or_cancelled(original_task)
+        enhanced_ocr = self._task_result_or_cancelled(enhanced_task)
+        if early_cutoff and early_cutoff["winner"] == "original" and not enhance_task.done():
+            # El OCR original ya basta: no se espera la mejora y se guarda la imagen original en su lugar
+            enhance_task.cancel()
+            return original_ocr, enhanced_ocr, image_bytes, None, early_cutoff
+        enhanced_bytes, enhancement_stats = await enhance_task
+        return original_ocr, enhanced_ocr, enhanced_bytes, enhancement_stats, early_cutoff
+
+    async def _extract_enhanced_text(self, enhance_task: asyncio.Task, filename: str, ocr_engine: OCREngine) -> Dict[str, Any]:
+        enhanced_bytes, enhancement_stats = await asyncio.shield(enhance_task)
+        if enhancement_stats.get("decision") == "skip":
+            return {
+                "success": False,
+                "skipped": True,
+                "error": "Mejora omitida por la política adaptativa",
+                "text": "",
+                "word_count": 0,
+                "confidence": 0.0
+            }
+        return await ocr_engine.extract_text(enhanced_bytes, f"enhanced_{filename}")
+
+    def backends_available(self, ocr_engine_name: Optional[str] = None) -> bool:
+        ocr_engine = self.ocr_engines.get(ocr_engine_name or self.default_ocr_engine)
+        return self.ollama_client.breaker.is_closed and (ocr_engine is None or ocr_engine.breaker.is_closed)
+
+    async def probe_backends(self) -> bool:
+        """Sondea los servicios con el circuito abierto y los cierra si ya responden."""
+        backends = [self.ollama_client] + list(self.ocr_engines.values())
+        for backend in backends:
+            if backend.breaker.is_closed:
+                continue
+            if await backend.health_check():
+                backend.breaker.reset()
+            else:
+                print(f"⚠️ Sonda de salud fallida para {backend.breaker.name}")
+        return self.backends_available()
+
+    def get_circuit_breakers(self) -> Dict[str, Any]:
+        breakers = {"ollama": self.ollama_client.breaker.get_stats()}
+        for engine_name, engine in self.ocr_engines.items():
+            breakers[f"ocr:{engine_name}"] = engine.breaker.get_stats()
+        return breakers
+
+    def _build_deferred_result(self, filename: str, reason: str, start_time: datetime) -> Dict[str, Any]:
+        print(f"⏸️ {filename} se difiere: {reason}")
+        return {
+            "filename": filename,
+            "success": False,
+            "deferred": True,
+            "error": reason,
+            "confidence": 0.0,
+            "word_count": 0,
+            "processing_time": (datetime.now() - start_time).total_seconds(),
+            "extracted_text": "",
+            "ocr_source": "none"
+        }
+
+    def _get_ocr_engine(self, engine_name: Optional[str] = None) -> OCREngine:
+        engine_name = engine_name or self.default_ocr_engine
+        engine = self.ocr_engines.get(engine_name)
+        if engine is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Motor OCR no soportado: {engine_name}. Motores válidos: {list(self.ocr_engines.keys())}"
+            )
+        return engine
+
+    def _clears_early_cutoff(self, ocr_result: Dict[str, Any]) -> bool:
+        return (
+            ocr_result.get("success", False)
+            and ocr_result.get("word_count", 0) >= self.early_cutoff_word_count
+        )
+
+    def _task_result_or_cancelled(self, task: asyncio.Task) -> Dict[str, Any]:
+        if task.cancelled():
+            return {
+                "success": False,
+                "error": "OCR cancelado por corte temprano",
+                "text": "",
+                "word_count": 0,
+                "confidence": 0.0
+            }
+        return task.result()
+
+    def _build_cached_result(
+        self,
+        filename: str,
+        cached: Dict[str, Any],
+        base_api_url: str,
+        start_time: datetime
+    ) -> Dict[str, Any]:
+        archivos_guardados = cached["archivos_guardados"]
+        ocr_summary = cached["ocr_summary"]
+        return {
+            "filename": filename,
+            "success": True,
+            "cached": True,
+            "data_crud": cached["ocr_text"],
+            "type_model": cached["invoice_type"],
+            "data_text": cached["structured_data"],
+            "path_json_text": str(base_api_url) + archivos_guardados[0],
+            "path_original_image": str(base_api_url) + archivos_guardados[1] if len(archivos_guardados) > 1 else "",
+            "path_enhanced_image": str(base_api_url) + archivos_guardados[2] if len(archivos_guardados) > 2 else "",
+            "confidence": ocr_summary.get("confidence", 0.0),
+            "word_count": ocr_summary.get("word_count", 0),
+            "processing_time": (datetime.now() - start_time).total_seconds(),
+            "ocr_source": ocr_summary.get("source", "original"),
+            "enhanced_image_path": "",
+            "comparison": None
+        }
+
     def _select_best_ocr_result(self, original_ocr: Dict, enhanced_ocr: Optional[Dict]) -> Dict:
         if not enhanced_ocr or not enhanced_ocr.get("success", False):
             return {
@@ -234,99 +493,23 @@ class ImageProcessorService:
                 "source": "original"
             }
     
-    async def _enhance_image_quality(self, image_bytes: bytes, original_filename: str) -> bytes:
-        try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            if img is None:
-                return image_bytes, ""
-                
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            large_black_rectangles = self._detect_large_black_rectangles(gray)
-            
-            image_analysis = self._analyze_image_for_binarization(gray)
-            if image_analysis['needs_high_precision']:
-                binary = cv2.adaptiveThreshold(
-                    gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY, 13, 10
-                )
-                background_threshold = 120
-            else:
-                binary = cv2.adaptiveThreshold(
-                    gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                    cv2.THRESH_BINARY, 17, 14
-                )
-                background_threshold = 130
-            
-            if np.sum(binary == 0) > np.sum(binary == 255):
-                binary = cv2.bitwise_not(binary)
-                
-            _, background_mask = cv2.threshold(gray, background_threshold, 255, cv2.THRESH_BINARY)
-            final = binary.copy()
-            safe_background = cv2.bitwise_and(background_mask, cv2.bitwise_not(large_black_rectangles))
-            final[safe_background == 255] = 255
-            success, encoded_image = cv2.imencode('.png', final)
-            if success:
-                return encoded_image.tobytes()
-            else:
-                return image_bytes, ""
-                
-        except Exception as e:
-            print(f"❌ Error en mejora de imagen: {str(e)}")
-            return image_bytes, ""
-
-    def _detect_large_black_rectangles(self, gray_image: np.ndarray, min_area: int = 5000) -> np.ndarray:
-        try:
-            _, black_areas = cv2.threshold(gray_image, 80, 255, cv2.THRESH_BINARY_INV)
-            kernel_close = np.ones((7, 7), np.uint8)
-            closed_black = cv2.morphologyEx(black_areas, cv2.MORPH_CLOSE, kernel_close)
-            kernel_dilate = np.ones((5, 5), np.uint8)
-            dilated_black = cv2.dilate(closed_black, kernel_dilate, iterations=2)
-            contours, _ = cv2.findContours(dilated_black, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            large_rectangles_mask = np.zeros_like(gray_image, dtype=np.uint8)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                
-                if area > min_area:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    aspect_ratio = w / h if w > h else h / w
-                    if aspect_ratio < 8: 
-                        cv2.rectangle(large_rectangles_mask, (x, y), (x + w, y + h), 255, -1)
-            kernel_final = np.ones((10, 10), np.uint8)
-            large_rectangles_mask = cv2.dilate(large_rectangles_mask, kernel_final, iterations=1)
-            return large_rectangles_mask
-            
-        except Exception as e:
-            print(f"Error en detección de rectángulos: {e}")
-            return np.zeros_like(gray_image, dtype=np.uint8)
+    async def _enhance_image_quality(self, image_bytes: bytes, original_filename: str) -> Tuple[bytes, Dict[str, Any]]:
+        enhanced_bytes, job_stats = await self.enhancement_engine.enhance(image_bytes, self.enhancement_policy)
+        if not job_stats.get("success", False):
+            print(f"⚠️ No se pudo mejorar la imagen {original_filename}, se usará la original")
+        return enhanced_bytes, job_stats
 
-    def _analyze_image_for_binarization(self, gray_image: np.ndarray) -> dict:
-        mean_intensity = np.mean(gray_image)
-        std_intensity = np.std(gray_image)
-        grad_x = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
-        grad_y = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-        text_fineness = np.mean(gradient_magnitude) / 255.0
-        needs_high_precision = text_fineness > 0.15 
-        is_dark_image = mean_intensity < 100
-        
-        return {
-            'mean_intensity': mean_intensity,
-            'contrast': std_intensity / 255.0,
-            'text_fineness': text_fineness,
-            'needs_high_precision': needs_high_precision,
-            'is_dark_image': is_dark_image
-        }
-        
     def _format_results(self, results: List[Any]) -> Dict[str, Any]:
         successful = []
         failed = []
+        deferred = []
         for result in results:
             if isinstance(result, Exception):
                 failed.append({"error": str(result)})
             elif result.get("success"):
                 successful.append(result)
+            elif result.get("deferred"):
+                deferred.append(result)
             else:
                 failed.append(result)
         total_words = sum(r.get("word_count", 0) for r in successful)
@@ -336,14 +519,38 @@ class ImageProcessorService:
             "total_processed": len(results),
             "successful_count": len(successful),
             "failed_count": len(failed),
+            "deferred_count": len(deferred),
             "total_words_extracted": total_words,
             "average_confidence": round(avg_confidence, 3),
             "enhanced_selected_count": enhanced_selected,
             "original_selected_count": len(successful) - enhanced_selected,
             "successful_results": successful,
-            "failed_results": failed
+            "failed_results": failed,
+            "deferred_results": deferred
         }
+    def _cache_after_write(
+        self,
+        write_future,
+        image_hash: str,
+        invoice_type: str,
+        ocr_text: str,
+        structured_data: Dict[str, Any],
+        saved_files: List[str],
+        ocr_summary: Dict[str, Any]
+    ):
+        def record(future):
+            result = future.result()
+            if result["success"]:
+                self.processed_cache.put(image_hash, invoice_type, ocr_text, structured_data, saved_files, ocr_summary, result["folder"])
+        write_future.add_done_callback(record)
+    def _on_invoice_folder_removed(self, payload: Dict[str, Any]):
+        self.processed_cache.invalidate_folder(payload["folder"])
     async def cleanup(self):
+        event_bus.unsubscribe(INVOICE_FOLDER_REMOVED, self._on_invoice_folder_removed)
+        await self.enhancement_engine.shutdown()
+        self.processed_cache.close()
+        self.ocr_cache.close()
+        self.text_processor.response_cache.close()
         if hasattr(self, 'ai_service'):
             self.ai_service.cleanup()
 
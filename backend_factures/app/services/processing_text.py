@@ -1,28 +1,53 @@
+import os
 import re
 import json
-import requests
+import time
 from decimal import Decimal
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple, Union
 from app.models.model_recibe_facture import FactureWeekend
+from app.services.ollama_client import OllamaClient
+from app.services.llm_response_cache import LLMResponseCache
+from app.utils.invoice_type_classifier import invoice_type_classifier
+from app.utils.invoice_validation import validate_facture
 
 class AITextProcessorService:
-    def __init__(self, ollama_base_url: str = "http://localhost:11434"):
+    def __init__(
+        self,
+        ollama_base_url: str = "http://localhost:11434",
+        ollama_client: Optional[OllamaClient] = None,
+        response_cache: Optional[LLMResponseCache] = None
+    ):
         self.ollama_base_url = ollama_base_url
-        self.model_name = "qwen2.5vl:3b"
+        self.ollama_client = ollama_client or OllamaClient(ollama_base_url)
+        self.response_cache = response_cache or LLMResponseCache()
+        self.model_name = os.getenv("OLLAMA_MODEL", "qwen2.5vl:3b")
+        self.model_cascades = {
+            invoice_type: _parse_model_cascade(os.getenv(f"OLLAMA_MODEL_CASCADE_{invoice_type.upper()}", os.getenv("OLLAMA_MODEL_CASCADE", "")))
+            or [self.model_name]
+            for invoice_type in ("facture_weekend", "facture_trip")
+        }
+        self._cascade_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+    @property
+    def cascade_models(self) -> List[str]:
+        models = []
+        for cascade in self.model_cascades.values():
+            models.extend(model for model in cascade if model not in models)
+        return models
 
-    def process_extracted_text(self, text: str,limit_learning_examples: int = 2) -> Tuple[str,str]:
+    async def process_extracted_text(self, text: str,limit_learning_examples: int = 2) -> Tuple[str,str]:
         if not text or len(text.strip()) == 0:
             return None
         try:
             invoice_type = self._detect_invoice_type(text)
             if invoice_type == "facture_weekend":
                 from app.utils.facture_weekend_processor import process_facture_weekend_invoice
-                structured_data = process_facture_weekend_invoice(text, self.ollama_base_url, self.model_name)
+                structured_data = await self._run_cascade(invoice_type, text, process_facture_weekend_invoice)
                 return invoice_type, structured_data
             elif invoice_type == "facture_trip":
                 from app.utils.facture_trip_processor import process_facture_trip_invoice
-                structured_data = process_facture_trip_invoice(text, self.ollama_base_url, self.model_name) 
+                structured_data = await self._run_cascade(invoice_type, text, process_facture_trip_invoice)
                 return invoice_type, structured_data
             else:
                 print(f"❌ Tipo de factura no soportado: {invoice_type}")
@@ -31,67 +56,89 @@ class AITextProcessorService:
             print(f"❌ Error crítico en el proceso con IA: {e}")
             return None
 
-    def _detect_invoice_type(self, text: str) -> str:
-        text_lower = text.lower()
-        patterns = {
-            "facture_weekend": {
-                "rfc_emisor": [r'rfc\s*emisor', r'emisor\s*rfc', r'rfc'],
-                "folio_fiscal": [r'folio\s*fiscal', r'uuid', r'folio'],
-                "cfdi": [r'cfdi', r'comprobante'],
-                "conceptos": [r'conceptos?', r'descripcion'],
-                "nombre_receptor": [r'nombre\s*receptor', r'receptor'],
-                "rfc_receptor": [r'rfc\s*receptor', r'receptor\s*rfc'],
-                "metodo_pago": [r'metodo\s*pago', r'forma\s*pago'],
-                "moneda": [r'moneda', r'divisa']
-            },
-            "facture_trip": {
-                "clave": [r'(?i)clave'],
-                "peso_bruto": [r'(?i)peso\s*bruto', r'(?i)bruto'],
-                "peso_tara": [r'(?i)peso\s*tara', r'(?i)tara'],
-                "tipo_material": [r'(?i)tipo\s*material', r'(?i)material'],
-                "recibido": [r'(?i)recibido'],
-                "pacas": [r'(?i)pacas'],
-                "tipo_documento": [r'(?i)tipo\s*documento', r'(?i)documento'],
-                "placas": [r'(?i)placas'],
-                "salida": [r'(?i)salida'],
-                "tipo_movimiento": [r'(?i)tipo\s*movimiento', r'(?i)movimiento'],
-                "porcentaje_no_aptos": [r'(?i)%\s*no\s*aptos', r'(?i)no\s*aptos', r'(?i)porcentaje'],
-                "peso_neto": [r'(?i)peso\s*neto', r'(?i)neto'],
-                "humedad": [r'(?i)humedad']
-            }
-        }
-        scores = {}
-        for invoice_type, type_patterns in patterns.items():
-            score = 0
-            for pattern in type_patterns:
-                if re.search(pattern, text_lower):
-                    score += 1
-            scores[invoice_type] = score
+    async def _run_cascade(self, invoice_type: str, text: str, process_invoice) -> Optional[Any]:
+        """Prueba los modelos de menor a mayor y escala solo cuando la factura no pasa la validación."""
+        fallback = None
+        cascade = self.model_cascades.get(invoice_type, [self.model_name])
+        for tier, model_name in enumerate(cascade):
+            start_time = time.perf_counter()
+            generated_fields: List[str] = []
+            facture = await process_invoice(text, self.ollama_client, model_name, self.response_cache, generated_fields)
+            errors = validate_facture(invoice_type, facture)
+            messages = '; '.join(message for _, message in errors)
+            if not generated_fields:
+                # Reglas y plantillas dan la misma salida en cualquier nivel: ni cuenta como intento ni se escala
+                if errors:
+                    print(f"⚠️ La extracción sin IA no pasó la validación: {messages}")
+                return facture
+            self._record_tier(invoice_type, model_name, not errors, time.perf_counter() - start_time)
+            if not errors:
+                if tier > 0:
+                    print(f"✅ Factura aceptada con el modelo {model_name} (nivel {tier + 1})")
+                return facture
+            if facture is not None:
+                fallback = facture
+                if not any(set(fields) & set(generated_fields) for fields, _ in errors):
+                    print(f"⚠️ Los campos que no pasaron la validación no vienen del modelo: {messages}")
+                    return facture
+            if tier + 1 < len(cascade):
+                print(f"⬆️ {model_name} no pasó la validación ({messages}); escalando a {cascade[tier + 1]}")
+            else:
+                print(f"⚠️ Ningún modelo pasó la validación: {messages}")
+        return fallback
+
+    def _record_tier(self, invoice_type: str, model_name: str, accepted: bool, elapsed: float):
+        tier_stats = self._cascade_stats.setdefault(invoice_type, {}).setdefault(
+            model_name, {"attempts": 0, "accepted": 0, "total_time": 0.0}
+        )
+        tier_stats["attempts"] += 1
+        tier_stats["accepted"] += int(accepted)
+        tier_stats["total_time"] += elapsed
 
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for invoice_type, cascade in self.model_cascades.items():
+            tiers = []
+            for model_name in cascade:
+                tier_stats = self._cascade_stats.get(invoice_type, {}).get(model_name, {"attempts": 0, "accepted": 0, "total_time": 0.0})
+                attempts = tier_stats["attempts"]
+                tiers.append({
+                    "model": model_name,
+                    "attempts": attempts,
+                    "accepted": tier_stats["accepted"],
+                    "escalated": attempts - tier_stats["accepted"],
+                    "hit_rate": round(tier_stats["accepted"] / attempts, 4) if attempts else 0.0,
+                    "avg_latency": tier_stats["total_time"] / attempts if attempts else None
+                })
+            stats[invoice_type] = tiers
+        return stats
+
+    def _detect_invoice_type(self, text: str) -> str:
+        detected_type, scores = invoice_type_classifier.classify(text)
         print(f"🔍 Scores de detección: {scores}")
-        detected_type = max(scores, key=scores.get)
-        if scores[detected_type] == 0:
-            return "facture_weekend"
-            
         return detected_type
 
-    def process_specific_invoice_type(self, text: str, invoice_type: str) -> Tuple[str,str]:
+    async def process_specific_invoice_type(self, text: str, invoice_type: str) -> Tuple[str,str]:
         try:
             if invoice_type == "facture_weekend":
                 from app.utils.facture_weekend_processor import process_facture_weekend_invoice
-                structured_data = process_facture_weekend_invoice(text, self.ollama_base_url, self.model_name)
+                structured_data = await self._run_cascade(invoice_type, text, process_facture_weekend_invoice)
                 return invoice_type, structured_data
             
             # elif invoice_type == "services":
             #     from app.utils.invoice_processors.services_processor import process_services_invoice
-            #     return process_services_invoice(text, self.ollama_base_url, self.model_name)
+            #     return process_services_invoice(text, self.ollama_client, self.model_name)
             
             # elif invoice_type == "products":
             #     from app.utils.invoice_processors.products_processor import process_products_invoice
-            #     return process_products_invoice(text, self.ollama_base_url, self.model_name)
+            #     return process_products_invoice(text, self.ollama_client, self.model_name)
             else:
                 print(f"❌ Tipo de factura no soportado: {invoice_type}")
                 return None
         except Exception as e:
             print(f"❌ Error procesando factura tipo {invoice_type}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+def _parse_model_cascade(value: str) -> List[str]:
+    return [model.strip() for model in value.split(',') if model.strip()]
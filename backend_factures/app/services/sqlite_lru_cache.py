@@ -0,0 +1,158 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+BOOKKEEPING_COLUMNS = (
+    ("size_bytes", "INTEGER NOT NULL"),
+    ("created_at", "REAL NOT NULL"),
+    ("last_access", "REAL NOT NULL")
+)
+
+
+class SQLiteLRUCache:
+    """Caché persistente en SQLite (WAL) con desalojo LRU por bytes o por entradas y TTL opcional.
+
+    Las subclases definen la tabla y sus columnas; get/put son bloqueantes, así que desde el
+    event loop se usan get_async/put_async.
+    """
+
+    table_name = ""
+    key_column = "cache_key"
+    columns: Tuple[Tuple[str, str], ...] = ()
+
+    def __init__(
+        self,
+        db_path: str,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        column_definitions = [f"{self.key_column} TEXT PRIMARY KEY"] + [
+            f"{name} {definition}" for name, definition in self.columns + BOOKKEEPING_COLUMNS
+        ]
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} ({', '.join(column_definitions)})")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_last_access ON {self.table_name}(last_access)")
+        self._create_indexes()
+        self._conn.commit()
+
+    async def get_async(self, *args, **kwargs) -> Any:
+        return await asyncio.to_thread(self.get, *args, **kwargs)
+
+    async def put_async(self, *args, **kwargs):
+        await asyncio.to_thread(self.put, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM {self.table_name}"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "size_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _load(self, key: str, columns: Sequence[str]) -> Optional[Tuple[Any, ...]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT created_at, {', '.join(columns)} FROM {self.table_name} WHERE {self.key_column} = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl_seconds and now - row[0] > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table_name} WHERE {self.key_column} = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table_name} SET last_access = ? WHERE {self.key_column} = ?",
+                (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return row[1:]
+
+    def _store(self, key: str, values: Dict[str, Any], size_bytes: int):
+        now = time.time()
+        names = [self.key_column] + list(values) + ["size_bytes", "created_at", "last_access"]
+        with self._lock:
+            self._before_store_locked(key, values)
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table_name} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})",
+                (key, *values.values(), size_bytes, now, now)
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def _delete_where(self, condition: str, params: Sequence[Any]) -> int:
+        with self._lock:
+            removed = self._conn.execute(f"DELETE FROM {self.table_name} WHERE {condition}", params).rowcount
+            self._conn.commit()
+        return removed
+
+    def _evict_locked(self, now: float):
+        if self.ttl_seconds:
+            self.expirations += self._conn.execute(
+                f"DELETE FROM {self.table_name} WHERE created_at < ?",
+                (now - self.ttl_seconds,)
+            ).rowcount
+        if self.max_bytes is not None:
+            total_bytes = self._conn.execute(f"SELECT COALESCE(SUM(size_bytes), 0) FROM {self.table_name}").fetchone()[0]
+            if total_bytes > self.max_bytes:
+                rows = self._conn.execute(
+                    f"SELECT {self.key_column}, size_bytes FROM {self.table_name} ORDER BY last_access ASC"
+                ).fetchall()
+                to_delete = []
+                for key, size_bytes in rows:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    to_delete.append((key,))
+                    total_bytes -= size_bytes
+                self._conn.executemany(f"DELETE FROM {self.table_name} WHERE {self.key_column} = ?", to_delete)
+                self.evictions += len(to_delete)
+        if self.max_entries is not None:
+            overflow = self._conn.execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table_name} WHERE {self.key_column} IN "
+                    f"(SELECT {self.key_column} FROM {self.table_name} ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def _create_indexes(self):
+        pass
+
+    def _before_store_locked(self, key: str, values: Dict[str, Any]):
+        pass
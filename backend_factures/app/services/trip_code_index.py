@@ -0,0 +1,153 @@
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.utils import json_codec
+
+CODE_TOKEN_PATTERN = re.compile(r'[A-Z0-9]+')
+
+
+class TripCodeIndex:
+    _instances: Dict[str, "TripCodeIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, base_path: Path):
+        self.base_path = Path(base_path)
+        self.is_built = False
+        self._lock = threading.RLock()
+        self._codes: Dict[str, Dict[str, List[Tuple[datetime, Path]]]] = {}
+        self._folders: Dict[str, Tuple[str, Set[str]]] = {}
+
+    @classmethod
+    def for_base_path(cls, base_path: Path) -> "TripCodeIndex":
+        key = str(Path(base_path).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(base_path)
+            return cls._instances[key]
+
+    @staticmethod
+    def extract_codes(data_facture: Dict[str, Any]) -> Set[str]:
+        descriptions = [concept.get('description', '') for concept in data_facture.get('concepts', []) or [] if isinstance(concept, dict)]
+        descriptions.append(data_facture.get('description', ''))
+        codes = set()
+        for description in descriptions:
+            for token in CODE_TOKEN_PATTERN.findall(str(description or '').upper()):
+                if any(char.isdigit() for char in token) and any(char.isalpha() for char in token):
+                    codes.add(token)
+        return codes
+
+    def build(self):
+        codes: Dict[str, Dict[str, List[Tuple[datetime, Path]]]] = {}
+        folders: Dict[str, Tuple[str, Set[str]]] = {}
+        if self.base_path.exists():
+            for company_folder in self.base_path.iterdir():
+                if not company_folder.is_dir():
+                    continue
+                business_codes, business_folders = self._scan_business(company_folder)
+                if business_codes:
+                    codes[company_folder.name] = business_codes
+                folders.update(business_folders)
+        with self._lock:
+            self._codes = codes
+            self._folders = folders
+            self.is_built = True
+        print(f"✅ Índice de códigos de viaje construido: {len(folders)} facturas semanales")
+
+    def refresh_business(self, business: str) -> Dict[str, List[Tuple[datetime, Path]]]:
+        business_codes, business_folders = self._scan_business(self.base_path / business)
+        with self._lock:
+            for folder_key, (folder_business, _) in list(self._folders.items()):
+                if folder_business == business:
+                    del self._folders[folder_key]
+            self._folders.update(business_folders)
+            self._codes[business] = business_codes
+            return {code: list(entries) for code, entries in business_codes.items()}
+
+    def _scan_business(self, company_folder: Path) -> Tuple[Dict[str, List[Tuple[datetime, Path]]], Dict[str, Tuple[str, Set[str]]]]:
+        business_codes: Dict[str, List[Tuple[datetime, Path]]] = {}
+        business_folders: Dict[str, Tuple[str, Set[str]]] = {}
+        if not company_folder.is_dir():
+            return business_codes, business_folders
+        for weekend_folder in company_folder.iterdir():
+            folder_date = self._parse_folder_date(weekend_folder)
+            if folder_date is None:
+                continue
+            data_facture = self._read_data_facture(weekend_folder / "factura.json")
+            if data_facture is None:
+                continue
+            folder_codes = self.extract_codes(data_facture)
+            business_folders[str(weekend_folder)] = (company_folder.name, folder_codes)
+            for code in folder_codes:
+                business_codes.setdefault(code, []).append((folder_date, weekend_folder))
+        return business_codes, business_folders
+
+    def ensure_built(self):
+        if not self.is_built:
+            self.build()
+
+    def add_folder(self, business: str, weekend_folder: Path, data_facture: Dict[str, Any]):
+        folder_date = self._parse_folder_date(weekend_folder)
+        if folder_date is None:
+            return
+        with self._lock:
+            self._remove_folder_locked(weekend_folder)
+            folder_codes = self.extract_codes(data_facture)
+            self._folders[str(weekend_folder)] = (business, folder_codes)
+            for code in folder_codes:
+                self._codes.setdefault(business, {}).setdefault(code, []).append((folder_date, Path(weekend_folder)))
+
+    def remove_folder(self, weekend_folder: Path):
+        with self._lock:
+            self._remove_folder_locked(weekend_folder)
+
+    def find(self, code_facture: str, trip_date: datetime, business: str) -> Optional[Path]:
+        self.ensure_built()
+        code = str(code_facture or '').strip().upper()
+        with self._lock:
+            candidates = self._codes.get(business, {}).get(code, [])
+            eligible = [(folder_date, folder) for folder_date, folder in candidates if folder_date.date() >= trip_date.date()]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda item: item[0])[1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "is_built": self.is_built,
+                "weekend_folders": len(self._folders),
+                "codes": sum(len(business_codes) for business_codes in self._codes.values())
+            }
+
+    def _remove_folder_locked(self, weekend_folder: Path):
+        entry = self._folders.pop(str(weekend_folder), None)
+        if entry is None:
+            return
+        business, folder_codes = entry
+        business_codes = self._codes.get(business, {})
+        for code in folder_codes:
+            remaining = [item for item in business_codes.get(code, []) if str(item[1]) != str(weekend_folder)]
+            if remaining:
+                business_codes[code] = remaining
+            else:
+                business_codes.pop(code, None)
+
+    def _parse_folder_date(self, weekend_folder: Path) -> Optional[datetime]:
+        weekend_folder = Path(weekend_folder)
+        if not weekend_folder.is_dir():
+            return None
+        try:
+            return datetime.strptime(weekend_folder.name.split('_')[0], "%Y-%m-%d")
+        except ValueError:
+            return None
+
+    def _read_data_facture(self, json_file: Path) -> Optional[Dict[str, Any]]:
+        if not json_file.exists():
+            return None
+        try:
+            weekend_data = json_codec.load_file(json_file)
+        except Exception as e:
+            print(f"⚠️ Error leyendo JSON de {json_file}: {e}")
+            return None
+        return weekend_data.get('data_facture')
@@ -0,0 +1,281 @@
+import re
+import sys
+import threading
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from app.utils.invoice_validation import AMOUNT_TOLERANCE
+
+REQUIRED_WEEKEND_FIELDS = (
+    "rfc_emisor",
+    "name_emisor",
+    "rfc_receptor",
+    "name_receptor",
+    "postal_code_receptor",
+    "tax_folio",
+    "no_csd",
+    "postal_code_emisor",
+    "datetime_emisor",
+    "concepts",
+    "type_money",
+    "type_pay",
+    "method_pay",
+    "subtotal",
+    "transferred_taxes",
+    "stoped_taxes",
+    "total",
+    "url_qr"
+)
+MIN_FIELD_CONFIDENCE = 0.75
+
+RFC = r'([A-ZÑ&]{3,4}\d{6}[A-Z0-9]{3})'
+AMOUNT = r'\$?\s*([0-9][0-9,]*\.\d{2})(?!\d|\s*%)'
+LINE_VALUE = r'([^\t\r\n]+)'
+UUID_PATTERN = re.compile(r'[A-F0-9]{8}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{12}', re.IGNORECASE)
+DATETIME_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+# El número de serie del CSD siempre tiene 20 dígitos; uno más corto viene truncado por el OCR
+CSD_PATTERN = re.compile(r'No\.?\s*de\s*serie\s*del\s*CSD(?!\s*del\s*SAT)[\s:]*(\d{20})(?!\d)', re.IGNORECASE)
+RETENTION_PATTERNS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r'Impuestos\s+retenidos[\s\S]{0,80}?' + AMOUNT, re.IGNORECASE), 0.9),
+    (re.compile(r'IVA\s+Retenci[óo]n[\s\S]{0,80}?' + AMOUNT, re.IGNORECASE), 0.85)
+]
+
+LABELED_PATTERNS: Dict[str, List[Tuple[re.Pattern, float]]] = {
+    "rfc_emisor": [(re.compile(r'RFC\s+(?:del\s+)?emisor[\s:]*' + RFC, re.IGNORECASE), 0.95)],
+    "name_emisor": [(re.compile(r'Nombre\s+(?:del\s+)?emisor[\s:]*' + LINE_VALUE, re.IGNORECASE), 0.9)],
+    "rfc_receptor": [(re.compile(r'RFC\s+(?:del\s+)?receptor[\s:]*' + RFC, re.IGNORECASE), 0.95)],
+    "name_receptor": [(re.compile(r'Nombre\s+(?:del\s+)?receptor[\s:]*' + LINE_VALUE, re.IGNORECASE), 0.9)],
+    "postal_code_receptor": [
+        (re.compile(r'C[óo]digo\s+postal\s+del\s+receptor[\s:]*(\d{5})', re.IGNORECASE), 0.95),
+        (re.compile(r'Domicilio\s+fiscal\s+(?:del\s+)?receptor[\s:]*(\d{5})', re.IGNORECASE), 0.9)
+    ],
+    "tax_folio": [(re.compile(r'Folio\s+fiscal[\s:]*(' + UUID_PATTERN.pattern + ')', re.IGNORECASE), 0.98)],
+    "no_csd": [(CSD_PATTERN, 0.95)],
+    "postal_code_emisor": [
+        (re.compile(r'hora\s+de\s+emisi[óo]n[\s:]*(\d{5})', re.IGNORECASE), 0.95),
+        (re.compile(r'Lugar\s+de\s+expedici[óo]n[\s:]*(\d{5})', re.IGNORECASE), 0.9)
+    ],
+    "type_money": [(re.compile(r'Moneda[\s:]*' + LINE_VALUE, re.IGNORECASE), 0.9)],
+    "type_pay": [(re.compile(r'Forma\s+de\s+pago[\s:]*' + LINE_VALUE, re.IGNORECASE), 0.9)],
+    "method_pay": [(re.compile(r'M[ée]todo\s+de\s+pago[\s:]*' + LINE_VALUE, re.IGNORECASE), 0.9)],
+    "subtotal": [(re.compile(r'Subtotal[\s:]*' + AMOUNT, re.IGNORECASE), 0.9)],
+    "transferred_taxes": [(re.compile(r'Impuestos\s+trasladados[\s\S]{0,80}?' + AMOUNT, re.IGNORECASE), 0.9)],
+    "stoped_taxes": RETENTION_PATTERNS,
+    "total": [(re.compile(r'(?<![Ss]ub)(?<![Ss]ub )Total[\s:]*' + AMOUNT, re.IGNORECASE), 0.9)]
+}
+
+CONCEPT_ROW_PATTERN = re.compile(r'(\d{8})\s+(?:(\d+(?:\.\d+)?)\s+)?([A-Z0-9]{2,3})\s+(Unidad\s+de\s+servicio|[A-Za-zÁÉÍÓÚáéíóú ]+?)\s+' + AMOUNT)
+DESCRIPTION_PATTERN = re.compile(r'Descripci[óo]n[\s:]*' + LINE_VALUE, re.IGNORECASE)
+FREIGHT_LINE_PATTERN = re.compile(r'(Flete[^\t\r\n]*)', re.IGNORECASE)
+EMISSION_LABEL_PATTERN = re.compile(r'emisi[óo]n', re.IGNORECASE)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "documents": 0,
+    "llm_skipped": 0,
+    "llm_partial": 0,
+    "fields_from_rules": 0,
+    "fields_from_llm": 0
+}
+
+
+def extract_weekend_fields(text: str) -> Tuple[Dict[str, Any], Dict[str, float]]:
+    fields: Dict[str, Any] = {}
+    confidence: Dict[str, float] = {}
+    if not text:
+        return fields, confidence
+
+    for field, patterns in LABELED_PATTERNS.items():
+        for pattern, score in patterns:
+            match = pattern.search(text)
+            if match:
+                fields[field] = match.group(1).strip()
+                confidence[field] = score
+                break
+
+    if "tax_folio" not in fields:
+        uuid_match = UUID_PATTERN.search(text)
+        if uuid_match:
+            fields["tax_folio"] = uuid_match.group(0)
+            confidence["tax_folio"] = 0.8
+    if "tax_folio" in fields:
+        fields["tax_folio"] = fields["tax_folio"].upper()
+        fields["url_qr"] = f"https://verificacfdi.facturaelectronica.sat.gob.mx/default.aspx?id={fields['tax_folio']}"
+        confidence["url_qr"] = confidence["tax_folio"]
+
+    emission_label = EMISSION_LABEL_PATTERN.search(text)
+    datetime_match = DATETIME_PATTERN.search(text, emission_label.start() if emission_label else 0)
+    if datetime_match:
+        fields["datetime_emisor"] = f"{datetime_match.group(1)} {datetime_match.group(2)}"
+        confidence["datetime_emisor"] = 0.9 if emission_label else 0.7
+
+    for field in ("subtotal", "transferred_taxes", "stoped_taxes", "total"):
+        if field in fields:
+            fields[field] = _to_decimal(fields[field])
+    if "stoped_taxes" not in fields and {"subtotal", "transferred_taxes", "total"} <= fields.keys():
+        if abs(fields["subtotal"] + fields["transferred_taxes"] - fields["total"]) < AMOUNT_TOLERANCE:
+            fields["stoped_taxes"] = Decimal("0.00")
+            confidence["stoped_taxes"] = 0.85
+    if _amounts_balance(fields):
+        for field in ("subtotal", "transferred_taxes", "stoped_taxes", "total"):
+            confidence[field] = max(confidence[field], 0.98)
+
+    concept = _extract_single_concept(text, fields)
+    if concept is not None:
+        fields["concepts"] = [concept]
+        confidence["concepts"] = 0.85 if _amounts_balance(fields) else 0.6
+
+    return fields, confidence
+
+
+def missing_weekend_fields(confidence: Dict[str, float], min_confidence: float = MIN_FIELD_CONFIDENCE) -> List[str]:
+    return [field for field in REQUIRED_WEEKEND_FIELDS if confidence.get(field, 0.0) < min_confidence]
+
+
+def record_weekend_extraction(missing_fields: List[str]):
+    with _stats_lock:
+        _stats["documents"] += 1
+        _stats["fields_from_rules"] += len(REQUIRED_WEEKEND_FIELDS) - len(missing_fields)
+        _stats["fields_from_llm"] += len(missing_fields)
+        if missing_fields:
+            _stats["llm_partial"] += 1
+        else:
+            _stats["llm_skipped"] += 1
+
+
+def get_rule_extraction_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["llm_skip_rate"] = stats["llm_skipped"] / stats["documents"] if stats["documents"] else 0.0
+    return stats
+
+
+def _extract_single_concept(text: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    rows = CONCEPT_ROW_PATTERN.findall(text)
+    if len(rows) != 1 or "subtotal" not in fields:
+        return None
+    product_code, quantity, key_unit, _, _ = rows[0]
+    description_match = DESCRIPTION_PATTERN.search(text) or FREIGHT_LINE_PATTERN.search(text)
+    if not description_match:
+        return None
+    description = description_match.group(1).strip()
+    sac_codes = set(re.findall(r'SAC\d+', description))
+    if sac_codes:
+        cuantity_trips = len(sac_codes)
+    elif quantity:
+        cuantity_trips = max(1, int(float(quantity)))
+    else:
+        cuantity_trips = 1
+    import_total = fields["subtotal"]
+    dutys_of_concept = []
+    if fields.get("transferred_taxes"):
+        dutys_of_concept.append(_duty("Traslado", import_total, fields["transferred_taxes"]))
+    if fields.get("stoped_taxes"):
+        dutys_of_concept.append(_duty("Retención", import_total, fields["stoped_taxes"]))
+    return {
+        "product_code": product_code,
+        "cuantity_trips": cuantity_trips,
+        "key_unit": key_unit,
+        "type_unit": "Unidad de servicio",
+        "value_unit": (import_total / cuantity_trips).quantize(Decimal("0.01")),
+        "import_total": import_total,
+        "discount": None,
+        "object_duty": bool(dutys_of_concept),
+        "description": description,
+        "dutys_of_concept": dutys_of_concept
+    }
+
+
+def _duty(type_duty: str, base_import: Decimal, amount: Decimal) -> Dict[str, Any]:
+    rate = (amount / base_import * 100) if base_import else Decimal("0")
+    return {
+        "duty": "IVA",
+        "type_duty": type_duty,
+        "base_import": base_import,
+        "type_factor": "Tasa",
+        "rate_fee": f"{rate:.2f}%",
+        "import_with_fee_rate": amount
+    }
+
+
+def _amounts_balance(fields: Dict[str, Any]) -> bool:
+    if not {"subtotal", "transferred_taxes", "stoped_taxes", "total"} <= fields.keys():
+        return False
+    expected_total = fields["subtotal"] + fields["transferred_taxes"] - fields["stoped_taxes"]
+    return abs(expected_total - fields["total"]) < AMOUNT_TOLERANCE
+
+
+def _to_decimal(value: str) -> Decimal:
+    try:
+        return Decimal(value.replace(',', '').replace('$', '').strip())
+    except InvalidOperation:
+        return Decimal('0.00')
+
+
+CONCEPT_BENCHMARK_FIELDS = ("product_code", "cuantity_trips", "key_unit", "value_unit", "import_total", "description")
+
+
+def _field_matches(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(expected) == len(actual) and all(
+            _field_matches(expected_item.get(field), actual_item.get(field))
+            for expected_item, actual_item in zip(expected, actual)
+            for field in CONCEPT_BENCHMARK_FIELDS
+        )
+    if expected is None or actual is None:
+        return expected == actual
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        try:
+            return abs(Decimal(str(expected)) - Decimal(str(actual))) < Decimal("0.01")
+        except InvalidOperation:
+            return False
+    return str(expected).replace('T', ' ').strip().upper() == str(actual).replace('T', ' ').strip().upper()
+
+
+def run_benchmark(paths: List[Path], min_confidence: float = MIN_FIELD_CONFIDENCE) -> Dict[str, Any]:
+    from app.utils import json_codec
+
+    rows = []
+    for base_path in paths:
+        for json_path in sorted(base_path.rglob("factura.json")):
+            document = json_codec.load_file(json_path)
+            expected = document.get("data_facture")
+            if (document.get("metadata") or {}).get("type") != "facture_weekend" or not document.get("data_crud") or not isinstance(expected, dict):
+                continue
+            fields, confidence = extract_weekend_fields(document["data_crud"])
+            missing_fields = missing_weekend_fields(confidence, min_confidence)
+            accepted_fields = [field for field in REQUIRED_WEEKEND_FIELDS if field not in missing_fields]
+            wrong_fields = [field for field in accepted_fields if not _field_matches(expected.get(field), fields.get(field))]
+            rows.append({
+                "path": str(json_path.parent),
+                "missing_fields": missing_fields,
+                "accepted_fields": len(accepted_fields),
+                "wrong_fields": wrong_fields
+            })
+
+    documents = len(rows)
+    accepted = sum(row["accepted_fields"] for row in rows)
+    wrong = sum(len(row["wrong_fields"]) for row in rows)
+    return {
+        "documents": documents,
+        "llm_skip_rate": sum(1 for row in rows if not row["missing_fields"]) / documents if documents else 0.0,
+        "rule_coverage": accepted / (documents * len(REQUIRED_WEEKEND_FIELDS)) if documents else 0.0,
+        "field_accuracy": (accepted - wrong) / accepted if accepted else 0.0,
+        "rows": rows
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "benchmark":
+        print("Uso: python -m app.utils.cfdi_rule_extractor benchmark [carpetas...]")
+        sys.exit(1)
+    folders = [Path(argument) for argument in sys.argv[2:]] or [Path("tests/fixtures/cfdi"), Path("Facturas")]
+    result = run_benchmark(folders)
+    for row in result["rows"]:
+        status = "⚡ sin IA" if not row["missing_fields"] else f"🤖 IA para {row['missing_fields']}"
+        errors = f" | ❌ incorrectos {row['wrong_fields']}" if row["wrong_fields"] else ""
+        print(f"📄 {row['path']}: {status}{errors}")
+    print(
+        f"✅ {result['documents']} facturas: {result['llm_skip_rate']:.1%} sin llamada a la IA, "
+        f"cobertura por reglas {result['rule_coverage']:.1%}, precisión de campos aceptados {result['field_accuracy']:.1%}"
+    )
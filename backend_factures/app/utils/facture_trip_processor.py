@@ -1,17 +1,42 @@
 import re
-import json
-import requests
 from decimal import Decimal
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from app.services.ollama_client import OllamaClient
+from app.services.llm_response_cache import LLMResponseCache
 from app.models.model_truck_facture import FactureTrip
+from app.utils.ocr_text_compactor import compact_ocr_text
 
-def process_facture_trip_invoice(text: str, ollama_base_url: str, model_name: str) -> Optional[FactureTrip]:
+MAX_GENERATION_TOKENS = 1024
+SPANISH_MONTHS = {
+    "ENE": 1, "JAN": 1, "FEB": 2, "MAR": 3, "ABR": 4, "APR": 4, "MAY": 5, "JUN": 6,
+    "JUL": 7, "AGO": 8, "AUG": 8, "SEP": 9, "SET": 9, "OCT": 10, "NOV": 11, "DIC": 12, "DEC": 12
+}
+
+async def process_facture_trip_invoice(
+    text: str,
+    ollama_client: OllamaClient,
+    model_name: str,
+    response_cache: Optional[LLMResponseCache] = None,
+    generated_fields: Optional[List[str]] = None
+) -> Optional[FactureTrip]:
     if not text or len(text.strip()) == 0:
         return None
 
+    # Importación diferida: las plantillas reutilizan los convertidores de este módulo
+    from app.utils.trip_ticket_templates import parse_trip_ticket, record_trip_extraction
+
     try:
-        structured_data = _get_structured_data_from_ai(text, ollama_base_url, model_name, _get_enhanced_prompt())
+        template_name, structured_data = parse_trip_ticket(text)
+        record_trip_extraction(template_name)
+        if structured_data is not None:
+            print(f"⚡ Ticket de viaje extraído con la plantilla {template_name}, sin llamada a la IA")
+        else:
+            if generated_fields is not None:
+                generated_fields.extend(FactureTrip.model_fields)
+            structured_data = await _get_structured_data_from_ai(
+                compact_ocr_text(text, "facture_trip"), ollama_client, model_name, _get_enhanced_prompt(), response_cache
+            )
         
         if not structured_data:
             print("❌ La IA no devolvió datos estructurados.")
@@ -136,36 +161,43 @@ def _get_enhanced_prompt() -> str:
     Devuelve ÚNICAMENTE el JSON, sin texto adicional.
     """
 
-def _get_structured_data_from_ai(text: str, ollama_base_url: str, model_name: str, system_prompt: str) -> Optional[Dict[str, Any]]:
-    """Obtiene datos estructurados de la IA de Ollama"""
+async def _get_structured_data_from_ai(
+    text: str,
+    ollama_client: OllamaClient,
+    model_name: str,
+    system_prompt: str,
+    response_cache: Optional[LLMResponseCache] = None
+) -> Optional[Dict[str, Any]]:
+    """Obtiene datos estructurados de la IA de Ollama, reutilizando respuestas previas para el mismo texto"""
+    if response_cache is not None:
+        cache_key = LLMResponseCache.build_key(text, model_name, system_prompt)
+        cached_data = await response_cache.get_async(cache_key)
+        if cached_data is not None:
+            print(f"⚡ Datos de la IA recuperados de caché: {len(cached_data)} campos")
+            return cached_data
+
     payload = {
         "model": model_name,
         "prompt": f"Texto completo del documento (EXTRAE TODAS LAS FECHAS y conviértelas al formato requerido):\n{text}",
         "system": system_prompt,
-        "stream": False,
+        "stream": True,
         "format": "json"
     }
     
     try:
-        response = requests.post(
-            f"{ollama_base_url}/api/generate",
-            json=payload,
-            timeout=120
+        generation = await ollama_client.generate_stream(
+            payload,
+            expected_keys=FactureTrip.model_fields.keys(),
+            max_tokens=MAX_GENERATION_TOKENS
         )
-        response.raise_for_status()
-        response_json = response.json()
-        ai_response_text = response_json.get("response", "").strip()
-        
-        # Extraer JSON de la respuesta
-        start = ai_response_text.find('{')
-        end = ai_response_text.rfind('}') + 1
-        if start == -1 or end == 0:
+        if generation["aborted"] or generation["data"] is None:
             print("❌ La IA no devolvió un JSON válido.")
             return None
 
-        json_string = ai_response_text[start:end]
-        structured_data = json.loads(json_string)
-        print(f"✅ Datos extraídos por IA: {len(structured_data)} campos")
+        structured_data = generation["data"]
+        print(f"✅ Datos extraídos por IA: {len(structured_data)} campos (primer campo en {generation['time_to_first_field'] or 0:.2f}s)")
+        if response_cache is not None:
+            await response_cache.put_async(cache_key, model_name, LLMResponseCache.prompt_hash(system_prompt), structured_data)
         return structured_data
 
     except Exception as e:
@@ -252,8 +284,6 @@ def _extract_all_dates_from_text(text: str) -> list:
         (r'(\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}:\d{2}[AP]M)', "%m/%d/%Y %I:%M:%S%p"),
         # 25/09/2025
         (r'(\d{1,2}/\d{1,2}/\d{4})', "%d/%m/%Y"),
-        # 27 SEP 2025
-        (r'(\d{1,2}\s+[A-Z]{3}\s+\d{4})', "%d %b %Y"),
         # 2025-09-25
         (r'(\d{4}-\d{2}-\d{2})', "%Y-%m-%d"),
     ]
@@ -266,6 +296,14 @@ def _extract_all_dates_from_text(text: str) -> list:
                 dates.append(dt)
             except ValueError:
                 continue
+
+    # 27 SEP 2025 / 10 OCT 2025: los sellos usan abreviaturas en español que %b no reconoce
+    for day, month, year in re.findall(r'(\d{1,2})\s+([A-Z]{3})\s+(\d{4})', text, re.IGNORECASE):
+        if month.upper() in SPANISH_MONTHS:
+            try:
+                dates.append(datetime(int(year), SPANISH_MONTHS[month.upper()], int(day)))
+            except ValueError:
+                continue
     
     return sorted(dates)  # Ordenadas cronológicamente
 
@@ -1,20 +1,53 @@
 import re
-import json
-import requests
 from decimal import Decimal
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from app.services.ollama_client import OllamaClient
+from app.services.llm_response_cache import LLMResponseCache
 from app.models.model_recibe_facture import FactureWeekend
-
-def process_facture_weekend_invoice(text: str, ollama_base_url: str, model_name: str) -> Optional[FactureWeekend]:
+from app.utils.cfdi_rule_extractor import (
+    CSD_PATTERN,
+    RETENTION_PATTERNS,
+    UUID_PATTERN,
+    extract_weekend_fields,
+    missing_weekend_fields,
+    record_weekend_extraction
+)
+from app.utils.ocr_text_compactor import compact_ocr_text
+
+MAX_GENERATION_TOKENS = 2048
+
+async def process_facture_weekend_invoice(
+    text: str,
+    ollama_client: OllamaClient,
+    model_name: str,
+    response_cache: Optional[LLMResponseCache] = None,
+    generated_fields: Optional[List[str]] = None
+) -> Optional[FactureWeekend]:
     if not text or len(text.strip()) == 0:
         return None
 
     try:
-        structured_data = _get_structured_data_from_ai(text, ollama_base_url, model_name, _get_transport_prompt())
-        
-        if not structured_data:
-            return None
+        rule_data, confidence = extract_weekend_fields(text)
+        missing_fields = missing_weekend_fields(confidence)
+        structured_data = {field: value for field, value in rule_data.items() if field not in missing_fields}
+        if missing_fields:
+            print(f"🤖 Campos sin regla confiable, se piden a la IA: {missing_fields}")
+            if generated_fields is not None:
+                generated_fields.extend(missing_fields)
+            ai_data = await _get_structured_data_from_ai(
+                compact_ocr_text(text, "facture_weekend"), ollama_client, model_name, _get_transport_prompt(), missing_fields, response_cache
+            )
+            if not ai_data:
+                return None
+            for field in missing_fields:
+                if field in ai_data:
+                    structured_data[field] = ai_data[field]
+                elif field in rule_data:
+                    structured_data[field] = rule_data[field]
+        else:
+            print("⚡ Factura semanal extraída por reglas, sin llamada a la IA")
+        record_weekend_extraction(missing_fields)
         if not structured_data.get('rfc_emisor') or not structured_data.get('tax_folio'):
             print("❌ JSON de la IA carece de campos críticos (RFC Emisor o Folio Fiscal).")
             return None
@@ -128,32 +161,43 @@ def _get_transport_prompt() -> str:
     Devuelve ÚNICAMENTE el JSON, sin texto adicional.
     """
 
-def _get_structured_data_from_ai(text: str, ollama_base_url: str, model_name: str, system_prompt: str) -> Optional[Dict[str, Any]]:
+async def _get_structured_data_from_ai(
+    text: str,
+    ollama_client: OllamaClient,
+    model_name: str,
+    system_prompt: str,
+    fields: Optional[List[str]] = None,
+    response_cache: Optional[LLMResponseCache] = None
+) -> Optional[Dict[str, Any]]:
+    prompt = f"Texto de la factura CFDI a analizar (PRESTA ATENCIÓN A LOS DETALLES):\n{text}"
+    fields_instruction = f"\n\nDevuelve ÚNICAMENTE un JSON con estas claves: {', '.join(fields)}" if fields else ""
+    prompt += fields_instruction
+    if response_cache is not None:
+        cache_key = LLMResponseCache.build_key(text, model_name, system_prompt, fields_instruction)
+        cached_data = await response_cache.get_async(cache_key)
+        if cached_data is not None:
+            print("⚡ Respuesta de la IA recuperada de caché")
+            return cached_data
     payload = {
         "model": model_name,
-        "prompt": f"Texto de la factura CFDI a analizar (PRESTA ATENCIÓN A LOS DETALLES):\n{text}",
+        "prompt": prompt,
         "system": system_prompt,
-        "stream": False,
+        "stream": True,
         "format": "json"
     }
     try:
-        response = requests.post(
-            f"{ollama_base_url}/api/generate",
-            json=payload,
-            timeout=120
+        generation = await ollama_client.generate_stream(
+            payload,
+            expected_keys=FactureWeekend.model_fields.keys(),
+            max_tokens=MAX_GENERATION_TOKENS
         )
-        response.raise_for_status()
-        response_json = response.json()
-        ai_response_text = response_json.get("response", "").strip()
-        start = ai_response_text.find('{')
-        end = ai_response_text.rfind('}') + 1
-        if start == -1 or end == 0:
+        if generation["aborted"] or generation["data"] is None:
             print("❌ La IA no devolvió un JSON válido.")
             return None
-
-        json_string = ai_response_text[start:end]
-        structured_data = json.loads(json_string)
-        return structured_data
+        print(f"✅ Primer campo de la IA en {generation['time_to_first_field'] or 0:.2f}s, total {generation['total_time']:.2f}s")
+        if response_cache is not None:
+            await response_cache.put_async(cache_key, model_name, LLMResponseCache.prompt_hash(system_prompt, fields_instruction), generation["data"])
+        return generation["data"]
 
     except Exception as e:
         print(f"❌ Error al obtener datos de la IA para transporte: {e}")
@@ -161,24 +205,16 @@ def _get_structured_data_from_ai(text: str, ollama_base_url: str, model_name: st
 
 def _apply_transport_corrections(ai_data: Dict[str, Any], original_text: str) -> Dict[str, Any]:
     corrected_data = ai_data.copy()
-    uuid_pattern = r'[A-F0-9]{8}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{12}'
-    uuid_match = re.search(uuid_pattern, original_text, re.IGNORECASE)
+    uuid_match = UUID_PATTERN.search(original_text)
     if uuid_match:
         correct_uuid = uuid_match.group(0)
         if corrected_data.get('tax_folio') != correct_uuid:
             corrected_data['tax_folio'] = correct_uuid
 
     if not corrected_data.get('no_csd') or corrected_data['no_csd'] == '2025-10-29 19:19:49':
-        csd_patterns = [
-            r'No\.?\s*de\s*serie\s*del\s*CSD[^\d]*(\d{10,})',
-            r'CSD[^\d]*(\d{10,})',
-            r'00001000000718612524'
-        ]
-        for pattern in csd_patterns:
-            match = re.search(pattern, original_text)
-            if match:
-                corrected_data['no_csd'] = match.group(1)
-                break
+        match = CSD_PATTERN.search(original_text)
+        if match:
+            corrected_data['no_csd'] = match.group(1)
         else:
             corrected_data['no_csd'] = ""
             print("⚠️ No se encontró el número CSD")
@@ -224,23 +260,19 @@ def _apply_transport_corrections(ai_data: Dict[str, Any], original_text: str) ->
                 calculated_value_unit > Decimal('0.01') and 
                 calculated_value_unit < Decimal('1000000')):
                 
-                concept['value_unit'] = float(calculated_value_unit) if isinstance(calculated_value_unit, Decimal) else calculated_value_unit
-    subtotal = corrected_data.get('subtotal', 0)
-    transferred_taxes = corrected_data.get('transferred_taxes', 0)
-    total = corrected_data.get('total', 0)
-    current_stoped_taxes = corrected_data.get('stoped_taxes', 0)
+                # El CFDI admite hasta seis decimales en el valor unitario
+                concept['value_unit'] = calculated_value_unit.quantize(Decimal('0.000001'))
+    # Los montos de las reglas llegan como Decimal y los de la IA como float
+    subtotal = _safe_decimal_convert(corrected_data.get('subtotal', 0))
+    transferred_taxes = _safe_decimal_convert(corrected_data.get('transferred_taxes', 0))
+    total = _safe_decimal_convert(corrected_data.get('total', 0))
+    current_stoped_taxes = _safe_decimal_convert(corrected_data.get('stoped_taxes', 0))
     
     expected_stoped_taxes = total - subtotal - transferred_taxes
     
-    retencion_patterns = [
-        r'Impuestos\s+retenidos[^\d]*\$?\s*([0-9,]+\.\d{2})',
-        r'IVA\s+Retención[^\d]*([0-9,]+\.\d{2,6})',
-        r'retenidos[^\d]*\$?\s*([0-9,]+\.\d{2})'
-    ]
-    
     found_retencion = None
-    for pattern in retencion_patterns:
-        match = re.search(pattern, original_text)
+    for pattern, _ in RETENTION_PATTERNS:
+        match = pattern.search(original_text)
         if match:
             found_retencion = _safe_decimal_convert(match.group(1))
             break
@@ -0,0 +1,89 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class IncrementalJSONError(ValueError):
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class IncrementalJSONParser:
+    """Parsea un objeto JSON que llega por fragmentos y entrega cada campo de primer nivel al completarse."""
+
+    def __init__(self, expected_keys: Optional[Iterable[str]] = None, max_leading_chars: int = 200):
+        self.expected_keys = set(expected_keys) if expected_keys else None
+        self.max_leading_chars = max_leading_chars
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self._started = False
+        self._leading_chars = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._segment: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        completed: List[Tuple[str, Any]] = []
+        for char in chunk:
+            if self.done:
+                break
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                else:
+                    self._leading_chars += 1
+                    if self._leading_chars > self.max_leading_chars:
+                        raise IncrementalJSONError("malformed", "La respuesta no empieza con un objeto JSON")
+                continue
+            if self._in_string:
+                self._segment.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+                self._segment.append(char)
+            elif char in '{[':
+                self._depth += 1
+                self._segment.append(char)
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_segment(completed, closing=True)
+                    self.done = True
+                elif self._depth < 0:
+                    raise IncrementalJSONError("malformed", "Cierre de JSON sin apertura")
+                else:
+                    self._segment.append(char)
+            elif char == ',' and self._depth == 1:
+                self._finish_segment(completed, closing=False)
+            else:
+                self._segment.append(char)
+        return completed
+
+    def _finish_segment(self, completed: List[Tuple[str, Any]], closing: bool):
+        segment = ''.join(self._segment).strip()
+        self._segment = []
+        if not segment:
+            if closing and not self.fields:
+                return
+            raise IncrementalJSONError("malformed", "Campo JSON vacío")
+        try:
+            parsed = json.loads('{' + segment + '}')
+        except json.JSONDecodeError as e:
+            raise IncrementalJSONError("malformed", f"Campo JSON inválido: {e}")
+        if len(parsed) != 1:
+            raise IncrementalJSONError("malformed", "Campo JSON inválido")
+        key, value = next(iter(parsed.items()))
+        if self.expected_keys is not None and key not in self.expected_keys:
+            raise IncrementalJSONError("unexpected_key", f"Clave inesperada en la respuesta: {key}")
+        if key in self.fields:
+            raise IncrementalJSONError("duplicate_key", f"Clave repetida en la respuesta: {key}")
+        self.fields[key] = value
+        completed.append((key, value))
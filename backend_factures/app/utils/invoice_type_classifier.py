@@ -0,0 +1,122 @@
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Tuple
+
+DEFAULT_INVOICE_TYPE = "facture_weekend"
+
+INVOICE_TYPE_FEATURES: Dict[str, Dict[str, List[str]]] = {
+    "facture_weekend": {
+        "rfc_emisor": [r'rfc\s*emisor', r'emisor\s*rfc', r'rfc'],
+        "folio_fiscal": [r'folio\s*fiscal', r'uuid', r'folio'],
+        "cfdi": [r'cfdi', r'comprobante'],
+        "conceptos": [r'conceptos?', r'descripcion'],
+        "nombre_receptor": [r'nombre\s*receptor', r'receptor'],
+        "rfc_receptor": [r'rfc\s*receptor', r'receptor\s*rfc'],
+        "metodo_pago": [r'metodo\s*pago', r'forma\s*pago'],
+        "moneda": [r'moneda', r'divisa']
+    },
+    "facture_trip": {
+        "clave": [r'clave'],
+        "peso_bruto": [r'peso\s*bruto', r'bruto'],
+        "peso_tara": [r'peso\s*tara', r'tara'],
+        "tipo_material": [r'tipo\s*material', r'material'],
+        "recibido": [r'recibido'],
+        "pacas": [r'pacas'],
+        "tipo_documento": [r'tipo\s*documento', r'documento'],
+        "placas": [r'placas'],
+        "salida": [r'salida'],
+        "tipo_movimiento": [r'tipo\s*movimiento', r'movimiento'],
+        "porcentaje_no_aptos": [r'%\s*no\s*aptos', r'no\s*aptos', r'porcentaje'],
+        "peso_neto": [r'peso\s*neto', r'neto'],
+        "humedad": [r'humedad']
+    }
+}
+
+
+class InvoiceTypeClassifier:
+    def __init__(self, features: Optional[Dict[str, Dict[str, List[str]]]] = None, default_type: str = DEFAULT_INVOICE_TYPE):
+        self.features = {invoice_type: dict(type_features) for invoice_type, type_features in (features or INVOICE_TYPE_FEATURES).items()}
+        self.default_type = default_type
+        self._lock = threading.Lock()
+        self._feature_patterns = self._compile(self.features)
+
+    def register(self, invoice_type: str, type_features: Dict[str, List[str]]):
+        with self._lock:
+            features = dict(self.features)
+            features[invoice_type] = dict(type_features)
+            self._feature_patterns = self._compile(features)
+            self.features = features
+
+    def classify(self, text: str) -> Tuple[str, Dict[str, int]]:
+        with self._lock:
+            feature_patterns = self._feature_patterns
+        lowered = text.lower()
+        scores = {invoice_type: 0 for invoice_type in self.features}
+        # Cada característica busca por separado: en una sola alternancia "rfc" consumía "rfc receptor"
+        for (invoice_type, _), feature_pattern in feature_patterns:
+            if feature_pattern.search(lowered):
+                scores[invoice_type] += 1
+        detected_type = max(scores, key=scores.get)
+        if scores[detected_type] == 0:
+            return self.default_type, scores
+        return detected_type, scores
+
+    def _compile(self, features: Dict[str, Dict[str, List[str]]]) -> List[Tuple[Tuple[str, str], Pattern]]:
+        return [
+            ((invoice_type, feature), re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)))
+            for invoice_type, type_features in features.items()
+            for feature, patterns in type_features.items()
+        ]
+
+
+invoice_type_classifier = InvoiceTypeClassifier()
+
+
+def register_invoice_type(invoice_type: str, type_features: Dict[str, List[str]]):
+    invoice_type_classifier.register(invoice_type, type_features)
+
+
+def run_benchmark(paths: List[Path], repeat: int = 200) -> Dict[str, float]:
+    from app.utils import json_codec
+
+    texts = [
+        document["data_crud"]
+        for base_path in paths
+        for document in (json_codec.load_file(json_path) for json_path in sorted(base_path.rglob("factura.json")))
+        if document.get("data_crud")
+    ]
+    classifier = InvoiceTypeClassifier()
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            classifier.classify(text)
+    elapsed = time.perf_counter() - started
+    documents = len(texts) * repeat
+    return {
+        "documents": documents,
+        "seconds": elapsed,
+        "documents_per_second": documents / elapsed if elapsed else 0.0,
+        "mb_per_second": total_bytes / 1024 / 1024 / elapsed if elapsed else 0.0,
+        "average_kb": total_bytes / documents / 1024 if documents else 0.0
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "benchmark":
+        print("Uso: python -m app.utils.invoice_type_classifier benchmark [--repeat N] [carpetas...]")
+        sys.exit(1)
+    arguments = sys.argv[2:]
+    repeat = 200
+    if "--repeat" in arguments:
+        repeat = int(arguments[arguments.index("--repeat") + 1])
+        del arguments[arguments.index("--repeat"):arguments.index("--repeat") + 2]
+    folders = [Path(argument) for argument in arguments] or [Path("temp"), Path("tests/fixtures/cfdi")]
+    result = run_benchmark(folders, repeat)
+    print(
+        f"✅ {result['documents']} textos ({result['average_kb']:.1f} kB promedio) en {result['seconds']:.3f}s: "
+        f"{result['documents_per_second']:,.0f} textos/s, {result['mb_per_second']:.1f} MB/s"
+    )
@@ -0,0 +1,55 @@
+from decimal import Decimal
+from typing import Any, List, Optional, Tuple
+
+AMOUNT_TOLERANCE = Decimal("0.01")
+WEIGHT_TOLERANCE = 1.0
+
+
+def validate_facture(invoice_type: str, facture: Optional[Any]) -> List[Tuple[Tuple[str, ...], str]]:
+    """Devuelve los errores de consistencia de la factura con los campos que intervienen en cada uno; una lista vacía significa que es aceptable."""
+    if facture is None:
+        return [((), "La respuesta no pudo validarse contra el modelo de la factura")]
+    if invoice_type == "facture_weekend":
+        return _validate_weekend(facture)
+    if invoice_type == "facture_trip":
+        return _validate_trip(facture)
+    return []
+
+
+def _validate_weekend(facture: Any) -> List[Tuple[Tuple[str, ...], str]]:
+    errors = []
+    expected_total = facture.subtotal + facture.transferred_taxes - facture.stoped_taxes
+    if abs(expected_total - facture.total) > AMOUNT_TOLERANCE:
+        errors.append((
+            ("subtotal", "transferred_taxes", "stoped_taxes", "total"),
+            f"subtotal + impuestos trasladados - retenidos ({expected_total}) no coincide con el total ({facture.total})"
+        ))
+    if facture.concepts:
+        concepts_total = sum((concept.import_total for concept in facture.concepts), Decimal("0"))
+        if abs(concepts_total - facture.subtotal) > AMOUNT_TOLERANCE:
+            errors.append((
+                ("concepts", "subtotal"),
+                f"la suma de los conceptos ({concepts_total}) no coincide con el subtotal ({facture.subtotal})"
+            ))
+    return errors
+
+
+def _validate_trip(facture: Any) -> List[Tuple[Tuple[str, ...], str]]:
+    errors = []
+    if facture.gross_weight <= facture.tare_weight:
+        errors.append((
+            ("gross_weight", "tare_weight"),
+            f"el peso bruto ({facture.gross_weight}) no es mayor que la tara ({facture.tare_weight})"
+        ))
+    expected_net = facture.gross_weight - facture.tare_weight
+    if abs(expected_net - facture.net_weight) > WEIGHT_TOLERANCE:
+        errors.append((
+            ("gross_weight", "tare_weight", "net_weight"),
+            f"peso bruto - tara ({expected_net}) no coincide con el peso neto ({facture.net_weight})"
+        ))
+    if facture.kg_desc_accepted_weight > facture.net_weight + WEIGHT_TOLERANCE:
+        errors.append((
+            ("kg_desc_accepted_weight", "net_weight"),
+            f"el peso aceptado ({facture.kg_desc_accepted_weight}) es mayor que el peso neto ({facture.net_weight})"
+        ))
+    return errors
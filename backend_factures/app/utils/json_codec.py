@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_MODE = os.getenv("FACTURA_JSON_MODE", "compact")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        # Igual que json_encoders={Decimal: str} de los modelos: float perdería centavos en montos grandes
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict"):
+        return value.dict()
+    if isinstance(value, Path):
+        return str(value)
+    return str(value)
+
+
+def dumps(value: Any, pretty: Optional[bool] = None) -> bytes:
+    if pretty is None:
+        pretty = JSON_MODE == "pretty"
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(value, default=_default, option=option)
+    return stdlib_dumps(value, pretty)
+
+
+def stdlib_dumps(value: Any, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(value, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_file(path: Union[str, Path], value: Any, pretty: Optional[bool] = None):
+    with open(path, "wb") as f:
+        f.write(dumps(value, pretty))
+
+
+def load_file(path: Union[str, Path]) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def run_benchmark(paths: List[Path], records: int = 10000, pretty: bool = False) -> Dict[str, Any]:
+    from app.models.model_recibe_facture import FactureWeekend
+    from app.models.model_truck_facture import FactureTrip
+
+    models = {"facture_weekend": FactureWeekend, "facture_trip": FactureTrip}
+    samples = []
+    for base_path in paths:
+        for json_path in sorted(base_path.rglob("factura.json")):
+            document = load_file(json_path)
+            model = models.get((document.get("metadata") or {}).get("type"))
+            if model is None or not isinstance(document.get("data_facture"), dict):
+                continue
+            # Se pasa por el modelo para medir la serialización de Decimal y datetime como en producción
+            document["data_facture"] = model(**document["data_facture"]).model_dump()
+            samples.append(document)
+    if not samples:
+        raise ValueError("No se encontraron factura.json para el benchmark")
+    documents = [samples[index % len(samples)] for index in range(records)]
+    codecs = {"json": (lambda value: stdlib_dumps(value, pretty), json.loads)}
+    if orjson is not None:
+        codecs["orjson"] = (lambda value: dumps(value, pretty), orjson.loads)
+    results = {}
+    for name, (encode, decode) in codecs.items():
+        started = time.perf_counter()
+        encoded = [encode(document) for document in documents]
+        dump_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for payload in encoded:
+            decode(payload)
+        load_seconds = time.perf_counter() - started
+        results[name] = {
+            "dump_seconds": dump_seconds,
+            "load_seconds": load_seconds,
+            "dump_per_second": records / dump_seconds,
+            "load_per_second": records / load_seconds,
+            "bytes": sum(len(payload) for payload in encoded)
+        }
+    return {"records": records, "samples": len(samples), "pretty": pretty, "codecs": results}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "benchmark":
+        print("Uso: python -m app.utils.json_codec benchmark [--records N] [--pretty] [carpetas...]")
+        sys.exit(1)
+    arguments = sys.argv[2:]
+    records = 10000
+    if "--records" in arguments:
+        records = int(arguments[arguments.index("--records") + 1])
+        del arguments[arguments.index("--records"):arguments.index("--records") + 2]
+    folders = [Path(argument) for argument in arguments if not argument.startswith("--")] or [Path("tests/fixtures/json_codec"), Path("temp")]
+    result = run_benchmark(folders, records, pretty="--pretty" in arguments)
+    for name, stats in result["codecs"].items():
+        print(
+            f"📄 {name}: {result['records']} registros | dump {stats['dump_seconds']:.3f}s ({stats['dump_per_second']:,.0f}/s) "
+            f"| load {stats['load_seconds']:.3f}s ({stats['load_per_second']:,.0f}/s) | {stats['bytes'] / 1024 / 1024:.1f} MB"
+        )
@@ -0,0 +1,288 @@
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_TOKEN_BUDGET = int(os.getenv("LLM_TEXT_TOKEN_BUDGET", "1500"))
+
+TOKEN_PATTERN = re.compile(r'\w{1,4}|[^\w\s]')
+ALNUM_PATTERN = re.compile(r'[A-Za-z0-9]')
+DIGIT_PATTERN = re.compile(r'\d')
+WORD_PATTERN = re.compile(r'[^\W\d_]{3,}')
+SPACES_PATTERN = re.compile(r' {2,}')
+BASE64_RUN_PATTERN = re.compile(r'[A-Za-z0-9+/]{40,}={0,2}')
+BASE64_LINE_PATTERN = re.compile(r'^[A-Za-z0-9+/=\s|]{20,}$')
+SEAL_LABEL_PATTERN = re.compile(
+    r'sello\s+digital|sello\s+del\s+(?:cfdi|sat|emisor)|cadena\s+original|certificado\s+digital',
+    re.IGNORECASE
+)
+BOILERPLATE_PATTERNS = [
+    re.compile(r'representaci[óo]n\s+impresa\s+de\s+un\s+cfdi', re.IGNORECASE),
+    re.compile(r'uso\s+confidencial', re.IGNORECASE)
+]
+
+SECTION_KEYWORDS: Dict[str, List[str]] = {
+    "facture_weekend": [
+        r'rfc', r'emisor', r'receptor', r'folio\s+fiscal', r'csd', r'c[óo]digo\s+postal', r'expedici[óo]n',
+        r'domicilio\s+fiscal', r'fecha', r'emisi[óo]n', r'concepto', r'clave', r'cantidad', r'unidad',
+        r'descripci[óo]n', r'valor\s+unitario', r'importe', r'moneda', r'forma\s+de\s+pago', r'm[ée]todo\s+de\s+pago',
+        r'subtotal', r'impuesto', r'trasladad', r'retenid', r'retenci[óo]n', r'iva', r'total', r'flete'
+    ],
+    "facture_trip": [
+        r'clave', r'material', r'peso', r'bruto', r'tara', r'neto', r'movimiento', r'entrada', r'salida',
+        r'pacas', r'contenedor', r'documento', r'factura', r'proveedor', r'transportista', r'operador',
+        r'pla\w{1,2}s', r'ubicaci', r'aptos', r'prohibidos', r'humedad', r'desc', r'aceptado', r'recibido',
+        r'elabor'
+    ]
+}
+SECTION_PATTERNS = {
+    invoice_type: re.compile('|'.join(keywords), re.IGNORECASE)
+    for invoice_type, keywords in SECTION_KEYWORDS.items()
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "documents": 0,
+    "tokens_in": 0,
+    "tokens_out": 0,
+    "seal_lines_dropped": 0,
+    "duplicate_lines_dropped": 0,
+    "section_lines_dropped": 0,
+    "budget_trims": 0
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def compact_ocr_text(text: str, invoice_type: Optional[str] = None, token_budget: Optional[int] = None) -> str:
+    compacted, stats = compact_ocr_text_with_stats(text, invoice_type, token_budget)
+    with _stats_lock:
+        _stats["documents"] += 1
+        for key in ("tokens_in", "tokens_out", "seal_lines_dropped", "duplicate_lines_dropped", "section_lines_dropped"):
+            _stats[key] += stats[key]
+        if stats["budget_trimmed"]:
+            _stats["budget_trims"] += 1
+    return compacted
+
+
+def compact_ocr_text_with_stats(
+    text: str,
+    invoice_type: Optional[str] = None,
+    token_budget: Optional[int] = None
+) -> Tuple[str, Dict[str, Any]]:
+    token_budget = DEFAULT_TOKEN_BUDGET if token_budget is None else token_budget
+    stats = {
+        "tokens_in": estimate_tokens(text or ""),
+        "tokens_out": 0,
+        "seal_lines_dropped": 0,
+        "duplicate_lines_dropped": 0,
+        "section_lines_dropped": 0,
+        "budget_trimmed": False
+    }
+    if not text:
+        return "", stats
+
+    lines: List[str] = []
+    seen = set()
+    in_seal_block = False
+    for raw_line in text.splitlines():
+        line = SPACES_PATTERN.sub(' ', raw_line.strip().strip('\t').strip())
+        if SEAL_LABEL_PATTERN.search(line):
+            in_seal_block = True
+            stats["seal_lines_dropped"] += 1
+            continue
+        if in_seal_block:
+            if BASE64_LINE_PATTERN.match(line):
+                stats["seal_lines_dropped"] += 1
+                continue
+            in_seal_block = False
+        line = BASE64_RUN_PATTERN.sub('', line).strip()
+        if not ALNUM_PATTERN.search(line) or any(pattern.search(line) for pattern in BOILERPLATE_PATTERNS):
+            continue
+        normalized = line.lower()
+        if WORD_PATTERN.search(line):
+            # Las líneas de solo valores (p. ej. "0.00") se repiten legítimamente bajo etiquetas distintas
+            if normalized in seen:
+                stats["duplicate_lines_dropped"] += 1
+                continue
+            seen.add(normalized)
+        lines.append(line)
+
+    priorities = _line_priorities(lines, invoice_type)
+    if invoice_type in SECTION_PATTERNS:
+        # Fuera de las secciones del tipo de factura solo quedan líneas sin etiqueta ni cifras
+        kept = [index for index, priority in enumerate(priorities) if priority > 0]
+        stats["section_lines_dropped"] = len(lines) - len(kept)
+        lines = [lines[index] for index in kept]
+        priorities = [priorities[index] for index in kept]
+
+    line_tokens = [estimate_tokens(line) for line in lines]
+    total_tokens = sum(line_tokens)
+    if token_budget and total_tokens > token_budget:
+        stats["budget_trimmed"] = True
+        removal_order = sorted(range(len(lines)), key=lambda index: (priorities[index], -index))
+        removed = set()
+        for index in removal_order:
+            if total_tokens <= token_budget:
+                break
+            removed.add(index)
+            total_tokens -= line_tokens[index]
+        lines = [line for index, line in enumerate(lines) if index not in removed]
+
+    compacted = '\n'.join(lines)
+    stats["tokens_out"] = total_tokens
+    return compacted, stats
+
+
+def get_text_compaction_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["token_budget"] = DEFAULT_TOKEN_BUDGET
+    stats["reduction_rate"] = 1 - stats["tokens_out"] / stats["tokens_in"] if stats["tokens_in"] else 0.0
+    return stats
+
+
+def _line_priorities(lines: List[str], invoice_type: Optional[str]) -> List[int]:
+    section_pattern = SECTION_PATTERNS.get(invoice_type)
+    priorities = []
+    previous_is_label = False
+    for line in lines:
+        is_label = bool(section_pattern and section_pattern.search(line))
+        if is_label or previous_is_label:
+            priorities.append(2)
+        elif DIGIT_PATTERN.search(line):
+            priorities.append(1)
+        else:
+            priorities.append(0)
+        previous_is_label = is_label
+    return priorities
+
+
+def _field_matches(expected: Any, actual: Any) -> bool:
+    if expected is None or expected == "":
+        return actual is None or actual == ""
+    try:
+        return abs(float(str(expected).replace(',', '')) - float(str(actual).replace(',', ''))) < 0.01
+    except (TypeError, ValueError):
+        return str(expected).strip().upper() == str(actual or "").strip().upper()
+
+
+def _accuracy(expected: Dict[str, Any], actual: Optional[Dict[str, Any]]) -> float:
+    scalar_fields = [field for field, value in expected.items() if not isinstance(value, (dict, list))]
+    if not scalar_fields:
+        return 0.0
+    actual = actual or {}
+    return sum(_field_matches(expected[field], actual.get(field)) for field in scalar_fields) / len(scalar_fields)
+
+
+def _extract_with_rules(text: str, invoice_type: str) -> Optional[Dict[str, Any]]:
+    if invoice_type == "facture_weekend":
+        from app.utils.cfdi_rule_extractor import extract_weekend_fields, missing_weekend_fields
+        fields, confidence = extract_weekend_fields(text)
+        missing_fields = missing_weekend_fields(confidence)
+        return {field: value for field, value in fields.items() if field not in missing_fields}
+    from app.utils.trip_ticket_templates import parse_trip_ticket
+    return parse_trip_ticket(text)[1]
+
+
+async def _extract_with_llm(client: Any, model_name: str, text: str, invoice_type: str) -> Optional[Dict[str, Any]]:
+    if invoice_type == "facture_weekend":
+        from app.utils.facture_weekend_processor import _get_structured_data_from_ai, _get_transport_prompt
+        return await _get_structured_data_from_ai(text, client, model_name, _get_transport_prompt())
+    from app.utils.facture_trip_processor import _get_structured_data_from_ai, _get_enhanced_prompt
+    return await _get_structured_data_from_ai(text, client, model_name, _get_enhanced_prompt())
+
+
+async def _measure_llm_accuracy(rows: List[Dict[str, Any]]) -> bool:
+    """Solo la ruta de la IA recibe el texto compactado; reglas y plantillas siempre leen el texto completo."""
+    from app.services.ollama_client import OllamaClient
+    client = OllamaClient()
+    model_name = os.getenv("OLLAMA_MODEL", "qwen2.5vl:3b")
+    try:
+        if not await client.health_check():
+            return False
+        for row in rows:
+            raw_result = await _extract_with_llm(client, model_name, row.pop("raw_text"), row["type"])
+            compact_result = await _extract_with_llm(client, model_name, row.pop("compacted_text"), row["type"])
+            row["raw_accuracy"] = _accuracy(row["expected"], raw_result)
+            row["compact_accuracy"] = _accuracy(row.pop("expected"), compact_result)
+        return True
+    finally:
+        await client.close()
+
+
+def run_benchmark(paths: List[Path], token_budget: Optional[int] = None, measure_accuracy: bool = True) -> Dict[str, Any]:
+    import asyncio
+    from app.utils import json_codec
+
+    rows = []
+    for base_path in paths:
+        for json_path in sorted(base_path.rglob("factura.json")):
+            document = json_codec.load_file(json_path)
+            raw_text = document.get("data_crud")
+            invoice_type = (document.get("metadata") or {}).get("type")
+            expected = document.get("data_facture")
+            if not raw_text or invoice_type not in SECTION_KEYWORDS or not isinstance(expected, dict):
+                continue
+            compacted, stats = compact_ocr_text_with_stats(raw_text, invoice_type, token_budget)
+            rows.append({
+                "path": str(json_path.parent),
+                "type": invoice_type,
+                "tokens_in": stats["tokens_in"],
+                "tokens_out": stats["tokens_out"],
+                # Reglas y plantillas son deterministas: miden sin Ollama si la compactación pierde datos
+                "raw_rule_accuracy": _accuracy(expected, _extract_with_rules(raw_text, invoice_type)),
+                "compact_rule_accuracy": _accuracy(expected, _extract_with_rules(compacted, invoice_type)),
+                "raw_accuracy": None,
+                "compact_accuracy": None,
+                "raw_text": raw_text,
+                "compacted_text": compacted,
+                "expected": expected
+            })
+
+    accuracy_measured = bool(rows) and measure_accuracy and asyncio.run(_measure_llm_accuracy(rows))
+    for row in rows:
+        for key in ("raw_text", "compacted_text", "expected"):
+            row.pop(key, None)
+    tokens_in = sum(row["tokens_in"] for row in rows)
+    tokens_out = sum(row["tokens_out"] for row in rows)
+    return {
+        "documents": len(rows),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "token_reduction": 1 - tokens_out / tokens_in if tokens_in else 0.0,
+        "rule_accuracy_delta": sum(row["compact_rule_accuracy"] - row["raw_rule_accuracy"] for row in rows) / len(rows) if rows else 0.0,
+        "accuracy_measured": accuracy_measured,
+        "accuracy_delta": sum(row["compact_accuracy"] - row["raw_accuracy"] for row in rows) / len(rows) if accuracy_measured else None,
+        "rows": rows
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "benchmark":
+        print("Uso: python -m app.utils.ocr_text_compactor benchmark [--tokens-only] [--budget N] [carpetas...]")
+        sys.exit(1)
+    arguments = sys.argv[2:]
+    measure_accuracy = "--tokens-only" not in arguments
+    budget = None
+    if "--budget" in arguments:
+        budget = int(arguments[arguments.index("--budget") + 1])
+        del arguments[arguments.index("--budget"):arguments.index("--budget") + 2]
+    folders = [Path(argument) for argument in arguments if not argument.startswith("--")] or [Path("temp"), Path("tests/fixtures/cfdi"), Path("Facturas")]
+    result = run_benchmark(folders, token_budget=budget, measure_accuracy=measure_accuracy)
+    for row in result["rows"]:
+        rule_accuracy = f" | precisión reglas {row['raw_rule_accuracy']:.2%} → {row['compact_rule_accuracy']:.2%}"
+        accuracy = f" | precisión IA {row['raw_accuracy']:.2%} → {row['compact_accuracy']:.2%}" if result["accuracy_measured"] else ""
+        print(f"📄 {row['path']} [{row['type']}] tokens {row['tokens_in']} → {row['tokens_out']}{rule_accuracy}{accuracy}")
+    summary = (
+        f"✅ {result['documents']} documentos: tokens {result['tokens_in']} → {result['tokens_out']} (-{result['token_reduction']:.1%}), "
+        f"delta de precisión de reglas y plantillas {result['rule_accuracy_delta']:+.2%}"
+    )
+    if result["accuracy_measured"]:
+        print(f"{summary}, delta de precisión de la IA {result['accuracy_delta']:+.2%}")
+    else:
+        print(f"{summary}; precisión de la IA no verificada (se requiere Ollama en ejecución)")
@@ -0,0 +1,179 @@
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from app.utils.facture_trip_processor import SPANISH_MONTHS, _safe_float_convert
+
+WEIGHT = r'([0-9][0-9,]*\.\d{2})'
+PERCENT = r'(\d+[.,]\d{2})'
+LINE_VALUE = r'([^\t\r\n]+)'
+TIMESTAMP = r'(\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}:\d{2}\s*[AP]M)'
+# Las básculas imprimen las marcas de entrada y salida en formato estadounidense: mes/día/año
+TIMESTAMP_FORMAT = "%m/%d/%Y %I:%M:%S%p"
+DAY_MONTH_YEAR = r'\b(\d\s?\d?)\s+(' + '|'.join(SPANISH_MONTHS) + r')\s+(\d{4})\b'
+PERCENT_FIELDS = ("not_suitable", "forbiden_weight", "humidity")
+
+
+class TripTicketTemplate:
+    def __init__(
+        self,
+        name: str,
+        markers: List[str],
+        code_pattern: Pattern,
+        code_prefix: str,
+        label_patterns: Dict[str, Pattern],
+        received_date_pattern: Pattern,
+        constants: Dict[str, Any],
+        required_fields: Tuple[str, ...] = ("code_facture", "gross_weight", "tare_weight", "date_entry", "date_exit", "recibes_trip", "plates")
+    ):
+        self.name = name
+        self.markers = [marker.upper() for marker in markers]
+        self.code_pattern = code_pattern
+        self.code_prefix = code_prefix
+        self.label_patterns = label_patterns
+        self.received_date_pattern = received_date_pattern
+        self.constants = constants
+        self.required_fields = required_fields
+
+    def matches(self, text: str) -> bool:
+        upper_text = text.upper()
+        return any(marker in upper_text for marker in self.markers)
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        fields: Dict[str, Any] = dict(self.constants)
+        for field, pattern in self.label_patterns.items():
+            match = pattern.search(text)
+            if match:
+                fields[field] = match.group(1).strip().rstrip(':').strip()
+
+        code_match = self.code_pattern.search(text)
+        if code_match:
+            fields["code_facture"] = f"{self.code_prefix}{code_match.group(1)}"
+        for field in ("date_entry", "date_exit"):
+            if field in fields:
+                timestamp = re.sub(r'\s+([AP]M)$', r'\1', fields[field].upper())
+                try:
+                    fields[field] = datetime.strptime(timestamp, TIMESTAMP_FORMAT).strftime("%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    del fields[field]
+        for field in PERCENT_FIELDS:
+            if field in fields:
+                fields[field] = fields[field].replace(',', '.')
+        for field in ("name_operator", "plates"):
+            if field in fields:
+                fields[field] = fields[field].upper()
+        received_match = self.received_date_pattern.search(text)
+        if received_match:
+            received_date = _parse_day_month_year(*received_match.groups())
+            if received_date:
+                fields["recibes_trip"] = received_date
+
+        if any(not fields.get(field) for field in self.required_fields):
+            return None
+        gross_weight = _safe_float_convert(fields["gross_weight"])
+        tare_weight = _safe_float_convert(fields["tare_weight"])
+        if gross_weight <= tare_weight:
+            return None
+        if "net_weight" in fields and abs(gross_weight - tare_weight - _safe_float_convert(fields["net_weight"])) > 1:
+            return None
+        # El peso neto se deja como se leyó; si falta, _map_to_pydantic_format lo calcula de bruto - tara
+        if "kg_desc_accepted_weight" not in fields:
+            net_weight = _safe_float_convert(fields["net_weight"]) if "net_weight" in fields else gross_weight - tare_weight
+            discounts = sum(_safe_float_convert(fields.get(field, 0)) for field in ("kg_desc_not_suitable", "kg_desc_forbiden", "kg_desc_humidity"))
+            fields["kg_desc_accepted_weight"] = net_weight - discounts
+        return fields
+
+
+_registry_lock = threading.Lock()
+TRIP_TICKET_TEMPLATES: List[TripTicketTemplate] = []
+_stats: Dict[str, Any] = {"documents": 0, "llm_fallbacks": 0, "template_hits": {}}
+
+
+def register_trip_template(template: TripTicketTemplate):
+    with _registry_lock:
+        TRIP_TICKET_TEMPLATES.append(template)
+
+
+def parse_trip_ticket(text: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    with _registry_lock:
+        templates = list(TRIP_TICKET_TEMPLATES)
+    for template in templates:
+        if not template.matches(text):
+            continue
+        fields = template.parse(text)
+        if fields is not None:
+            return template.name, fields
+    return None, None
+
+
+def record_trip_extraction(template_name: Optional[str]):
+    with _registry_lock:
+        _stats["documents"] += 1
+        if template_name is None:
+            _stats["llm_fallbacks"] += 1
+        else:
+            _stats["template_hits"][template_name] = _stats["template_hits"].get(template_name, 0) + 1
+
+
+def get_trip_template_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        stats = {
+            "templates": [template.name for template in TRIP_TICKET_TEMPLATES],
+            "documents": _stats["documents"],
+            "llm_fallbacks": _stats["llm_fallbacks"],
+            "template_hits": dict(_stats["template_hits"])
+        }
+    stats["llm_skip_rate"] = (stats["documents"] - stats["llm_fallbacks"]) / stats["documents"] if stats["documents"] else 0.0
+    return stats
+
+
+def _parse_day_month_year(day: str, month: str, year: str) -> Optional[str]:
+    try:
+        # El OCR de los sellos suele separar los dígitos del día: "1 0 OCT 2025"
+        received = datetime(int(year), SPANISH_MONTHS[month.upper()], int(day.replace(' ', '')))
+    except ValueError:
+        return None
+    return received.strftime("%Y-%m-%d %H:%M:%S")
+
+
+register_trip_template(TripTicketTemplate(
+    name="refisesa_guadalupe",
+    markers=["RECICLADORA GUADALUPE", "VAQUERIAS"],
+    code_pattern=re.compile(r'[G•]?\s*P\s*[E2]\s*(\d{4})\b'),
+    code_prefix="GPE",
+    label_patterns={
+        "key": re.compile(r'Clave[\s:]*([A-Z0-9]+(?:-[A-Z0-9]+)+)'),
+        "type_material": re.compile(r'Tipo\s+de\s+Material\t' + LINE_VALUE, re.IGNORECASE),
+        "type_movement": re.compile(r'Tipo\s+Movimiento\t' + LINE_VALUE, re.IGNORECASE),
+        "date_entry": re.compile(r'Entrada\t' + TIMESTAMP, re.IGNORECASE),
+        "date_exit": re.compile(r'Salida\t' + TIMESTAMP, re.IGNORECASE),
+        "cuantity_bales": re.compile(r'Pacas\t(\d+)', re.IGNORECASE),
+        "container": re.compile(r'Contenedor\t(\d+)', re.IGNORECASE),
+        "type_document": re.compile(r'Tipo\s+Documento\t' + LINE_VALUE, re.IGNORECASE),
+        "proveedor": re.compile(r'Proveedor\t' + LINE_VALUE, re.IGNORECASE),
+        "name_transport": re.compile(r'Transportista\t' + LINE_VALUE, re.IGNORECASE),
+        "name_operator": re.compile(r'Operador\t' + LINE_VALUE, re.IGNORECASE),
+        "plates": re.compile(r'Pla\w{1,2}s\t([A-Z0-9]{5,8})\b', re.IGNORECASE),
+        "ubication_trip": re.compile(r'Ubicaci\w{1,2}n\t' + LINE_VALUE, re.IGNORECASE),
+        "gross_weight": re.compile(r'Peso\s+Bruto\t' + WEIGHT, re.IGNORECASE),
+        "tare_weight": re.compile(r'Peso\s+Tara\t' + WEIGHT, re.IGNORECASE),
+        "net_weight": re.compile(r'Peso\s+Neto:?\s+' + WEIGHT, re.IGNORECASE),
+        "not_suitable": re.compile(r'%\s*No\s+Aptos\s+' + PERCENT, re.IGNORECASE),
+        "forbiden_weight": re.compile(r'%\s*Prohibidos\s+' + PERCENT, re.IGNORECASE),
+        "humidity": re.compile(r'(?<!Desc )Humedad\s+' + PERCENT, re.IGNORECASE),
+        "kg_desc_not_suitable": re.compile(r'Kg\s+Desc\s+No\s+Aptos\.?\s+' + WEIGHT, re.IGNORECASE),
+        "kg_desc_forbiden": re.compile(r'Kg\s+Desc\s+Prohibidos\s+' + WEIGHT, re.IGNORECASE),
+        "kg_desc_humidity": re.compile(r'Kg\s+Desc\s+Humedad\s+' + WEIGHT, re.IGNORECASE),
+        "kg_desc_accepted_weight": re.compile(r'Peso\s+Aceptado\s+' + WEIGHT, re.IGNORECASE)
+    },
+    # El sello de recepción de la planta de papel; el de PLANTA GUADALUPE es la fecha de elaboración
+    received_date_pattern=re.compile(r'PLANTA\s+PAPEL[\s\S]{0,120}?' + DAY_MONTH_YEAR, re.IGNORECASE),
+    constants={
+        "name_business": "RECOLECTORA DE FIBRAS SECUNDARIAS, S.A. DE C.V.",
+        "business_region": "GUADALUPE",
+        "business_ubication": "GUADALUPE CAMINO A VAQUERIAS NO. 300 COL XOCHIMILCO NUEVO LEON MEXICO 67190",
+        "key": "F-02-CBB-FSC",
+        "container": "0"
+    }
+))
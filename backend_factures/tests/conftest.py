@@ -0,0 +1,16 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
+
+
+@pytest.fixture
+def in_tmp_dir(tmp_path, monkeypatch):
+    """Los servicios crean cache/, Facturas/ y temp/ relativos al directorio actual."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
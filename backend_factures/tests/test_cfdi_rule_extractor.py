@@ -0,0 +1,48 @@
+import asyncio
+from decimal import Decimal
+from pathlib import Path
+
+from app.utils import json_codec
+from app.utils.cfdi_rule_extractor import extract_weekend_fields, missing_weekend_fields, run_benchmark
+from app.utils.facture_weekend_processor import process_facture_weekend_invoice
+
+CORPUS = Path(__file__).parent / "fixtures" / "cfdi"
+
+
+def test_benchmark_over_fixture_corpus():
+    result = run_benchmark([CORPUS])
+    rows = {Path(row["path"]).name: row for row in result["rows"]}
+    assert result["documents"] == 5
+    assert rows["01_flete_con_retencion"]["missing_fields"] == []
+    assert rows["01_flete_con_retencion"]["wrong_fields"] == []
+    assert rows["02_flete_sin_retencion"]["missing_fields"] == []
+    assert rows["02_flete_sin_retencion"]["wrong_fields"] == []
+    assert rows["03_dos_conceptos"]["missing_fields"] == ["concepts"]
+    assert "total" in rows["05_totales_desbalanceados"]["missing_fields"]
+    assert result["llm_skip_rate"] == 0.4
+    assert "no_csd" in rows["04_ocr_con_ruido"]["missing_fields"]
+    assert result["field_accuracy"] == 1.0
+
+
+def _fixture_text(name):
+    return json_codec.load_file(CORPUS / name / "factura.json")["data_crud"]
+
+
+def test_truncated_csd_serial_is_left_to_the_llm():
+    fields, confidence = extract_weekend_fields(_fixture_text("04_ocr_con_ruido"))
+    assert "no_csd" not in fields
+    assert "no_csd" in missing_weekend_fields(confidence)
+    fields, _ = extract_weekend_fields(_fixture_text("01_flete_con_retencion"))
+    assert fields["no_csd"] == "00001000000512345678"
+
+
+def test_rule_only_invoice_keeps_decimal_amounts():
+    text = _fixture_text("01_flete_con_retencion")
+    fields, _ = extract_weekend_fields(text)
+    assert fields["total"] == Decimal("4827.58")
+    assert fields["concepts"][0]["value_unit"] == Decimal("2155.17")
+    # Sin campos faltantes no se llama a la IA, así que no hace falta cliente de Ollama
+    facture = asyncio.run(process_facture_weekend_invoice(text, None, "modelo"))
+    assert facture.total == Decimal("4827.58")
+    assert facture.stoped_taxes == Decimal("172.41")
+    assert facture.no_csd == "00001000000512345678"
@@ -0,0 +1,47 @@
+import json
+import shutil
+from datetime import datetime
+
+from app.services.file_manager_service import FileManagerService
+
+
+def test_correct_invoice_data_goes_through_the_atomic_writer(in_tmp_dir):
+    file_manager = FileManagerService(str(in_tmp_dir / "Facturas"))
+    folder = in_tmp_dir / "Facturas" / "ACME" / "2025-10-09_08-00-00"
+    folder.mkdir(parents=True)
+    (folder / "factura.json").write_text(json.dumps({"data_crud": "texto", "data_facture": {"total": "1.00"}}))
+
+    result = file_manager.correct_invoice_data(
+        str(folder),
+        "facture_weekend",
+        {"datetime_emisor": "2025-10-09T08:00:00", "total": "1160.00"}
+    )
+
+    assert result["success"]
+    assert not result["carpeta_renombrada"]
+    saved = json.loads((folder / "factura.json").read_text())
+    assert saved["data_facture"]["total"] == "1160.00"
+    assert saved["data_crud"] == "texto"
+    assert saved["corrected"] is True
+    assert sorted(path.name for path in folder.iterdir()) == ["factura.json"]
+    assert file_manager.writer.get_stats()["journaled_writes"] == 0
+
+
+def test_listing_picks_up_weekend_folders_written_outside_the_catalog(in_tmp_dir):
+    file_manager = FileManagerService(str(in_tmp_dir / "Facturas"))
+    legacy = in_tmp_dir / "Facturas" / "ACME" / "2025-09-27_10-00-00"
+    legacy.mkdir(parents=True)
+    (legacy / "factura.json").write_text(json.dumps({"data_facture": {"code_facture": "GPE3164", "total": "500.00"}}))
+    without_json = in_tmp_dir / "Facturas" / "ACME" / "2025-10-09_08-00-00"
+    without_json.mkdir()
+
+    businesses = file_manager.get_business_folders()
+    assert [business["nombre"] for business in businesses] == ["ACME"]
+    assert [folder["nombre"] for folder in businesses[0]["carpetas_fecha"]] == ["2025-10-09_08-00-00", "2025-09-27_10-00-00"]
+
+    found = file_manager.search_invoices_by_date_range("ACME", datetime(2025, 9, 1), datetime(2025, 9, 30))
+    assert [folder["carpeta_fecha"] for folder in found] == ["2025-09-27_10-00-00"]
+    assert [archivo["nombre"] for archivo in found[0]["archivos"]] == ["factura.json"]
+
+    shutil.rmtree(without_json)
+    assert [folder["nombre"] for folder in file_manager.get_business_folders()[0]["carpetas_fecha"]] == ["2025-09-27_10-00-00"]
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from app.services.image_enhancement_engine import ImageEnhancementEngine
+from app.services.ocr_engine import OCREngine
+from app.services.processing_images import ImageProcessorService
+
+
+def _png_bytes() -> bytes:
+    image = np.full((64, 64, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "GPE", (4, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def test_shutdown_runs_off_the_event_loop():
+    async def scenario():
+        engine = ImageEnhancementEngine(max_workers=1)
+        enhanced_bytes, job_stats = await engine.enhance(_png_bytes())
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker_task = asyncio.create_task(ticker())
+        await engine.shutdown()
+        ticker_task.cancel()
+        return enhanced_bytes, job_stats, ticks, engine.get_stats()
+
+    enhanced_bytes, job_stats, ticks, stats = asyncio.run(scenario())
+    assert job_stats["success"] and enhanced_bytes
+    assert ticks > 0
+    assert stats["is_running"] is False
+
+
+def test_enhancement_and_tesseract_pools_share_one_cpu_budget(in_tmp_dir, monkeypatch):
+    monkeypatch.setenv("CPU_WORKER_BUDGET", "6")
+    processor = ImageProcessorService()
+    assert processor.enhancement_engine.max_workers == 3
+    assert processor.ocr_engines["tesseract"].max_workers == 3
+
+    explicit = ImageProcessorService(enhancement_workers=4)
+    assert explicit.enhancement_engine.max_workers == 4
+    assert explicit.ocr_engines["tesseract"].max_workers == 2
+
+    for service in (processor, explicit):
+        asyncio.run(service.cleanup())
+
+
+class _InstantOCREngine(OCREngine):
+    engine_name = "instant"
+
+    async def _request_ocr(self, image_bytes: bytes, filename: str):
+        words = " ".join(f"palabra{index}" for index in range(60))
+        return {"success": True, "text": words, "word_count": 60, "confidence": 0.0}
+
+
+def test_early_cutoff_does_not_wait_for_enhancement(in_tmp_dir):
+    processor = ImageProcessorService(early_cutoff_word_count=40)
+    enhancement_cancelled = asyncio.Event()
+
+    async def slow_enhancement(image_bytes, filename):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            enhancement_cancelled.set()
+            raise
+
+    processor._enhance_image_quality = slow_enhancement
+
+    async def scenario():
+        started = time.perf_counter()
+        result = await processor._run_speculative_ocr(b"imagen", "ticket.jpeg", _InstantOCREngine())
+        elapsed = time.perf_counter() - started
+        await asyncio.wait_for(enhancement_cancelled.wait(), 1)
+        await processor.cleanup()
+        return result, elapsed
+
+    (original_ocr, enhanced_ocr, enhanced_bytes, enhancement_stats, early_cutoff), elapsed = asyncio.run(scenario())
+    assert elapsed < 5
+    assert original_ocr["word_count"] == 60
+    assert early_cutoff == {"winner": "original", "cancelled": "enhanced"}
+    assert enhanced_bytes == b"imagen"
+    assert enhancement_stats is None
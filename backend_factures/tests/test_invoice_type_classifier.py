@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from app.utils import json_codec
+from app.utils.invoice_type_classifier import InvoiceTypeClassifier
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_overlapping_features_do_not_block_each_other():
+    invoice_type, scores = InvoiceTypeClassifier().classify("RFC Receptor: RFS850101XY2\nNombre Receptor: foo")
+    assert invoice_type == "facture_weekend"
+    assert scores["facture_weekend"] == 3
+
+
+def test_fixtures_are_classified_by_their_type():
+    classifier = InvoiceTypeClassifier()
+    paths = sorted((BACKEND_ROOT / "temp").rglob("factura.json")) + sorted((BACKEND_ROOT / "tests" / "fixtures" / "cfdi").rglob("factura.json"))
+    assert paths
+    for json_path in paths:
+        document = json_codec.load_file(json_path)
+        assert classifier.classify(document["data_crud"])[0] == document["metadata"]["type"], json_path
+
+
+def test_registered_type_is_scored():
+    classifier = InvoiceTypeClassifier()
+    classifier.register("nota_credito", {"nota": [r'nota\s*de\s*cr[eé]dito'], "egreso": [r'egreso']})
+    invoice_type, scores = classifier.classify("Nota de crédito\nTipo de comprobante: Egreso")
+    assert invoice_type == "nota_credito"
+    assert scores["nota_credito"] == 2
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app.services.job_manager import FactureJobManager
+
+
+def _write_job(jobs_path, state, age):
+    job_id = uuid.uuid4().hex
+    job_folder = jobs_path / job_id
+    job_folder.mkdir(parents=True)
+    (job_folder / "000_factura.png").write_bytes(b"imagen")
+    updated_at = (datetime.now() - age).isoformat()
+    job = {
+        "job_id": job_id,
+        "state": state,
+        "created_at": updated_at,
+        "updated_at": updated_at,
+        "options": {"ocr_engine": None},
+        "images": [{"index": 0, "filename": "factura.png", "path": str(job_folder / "000_factura.png"), "state": "done" if state == "completed" else state, "result": None}]
+    }
+    (job_folder / "job.json").write_text(json.dumps(job))
+    return job_id
+
+
+def test_retention_evicts_old_and_excess_finished_jobs(in_tmp_dir):
+    jobs_path = in_tmp_dir / "jobs"
+    jobs_path.mkdir()
+    expired = _write_job(jobs_path, "completed", timedelta(days=2))
+    oldest_recent = _write_job(jobs_path, "failed", timedelta(minutes=30))
+    recent = [_write_job(jobs_path, "completed", timedelta(minutes=minutes)) for minutes in (20, 10)]
+    deferred = _write_job(jobs_path, "deferred", timedelta(days=3))
+
+    manager = FactureJobManager(None, jobs_path=str(jobs_path), retention_seconds=24 * 3600, max_finished_jobs=2)
+
+    async def scenario():
+        await manager.start()
+        await manager.stop()
+
+    asyncio.run(scenario())
+    assert not (jobs_path / expired).exists()
+    assert not (jobs_path / oldest_recent).exists()
+    assert all((jobs_path / job_id).exists() for job_id in recent)
+    assert (jobs_path / deferred).exists()
+    assert deferred in manager.jobs
+    assert manager.get_job(expired) is None
+    assert manager.get_stats()["evicted_jobs"] == 2
+    assert manager.get_stats()["finished_jobs_retained"] == 2
+
+
+class _DeferringImageProcessor:
+    async def validate_files(self, files):
+        return [{"filename": file.filename, "file": file} for file in files]
+
+    async def process_image_bytes(self, image_bytes, filename, **options):
+        return {"filename": filename, "success": False, "deferred": True, "error": "Servicio de IA no disponible"}
+
+    def backends_available(self, ocr_engine=None):
+        return False
+
+    async def probe_backends(self):
+        return False
+
+
+def test_deferred_job_publishes_a_terminal_event_and_saves_atomically(in_tmp_dir):
+    import io
+    from fastapi import UploadFile
+
+    manager = FactureJobManager(_DeferringImageProcessor(), jobs_path=str(in_tmp_dir / "jobs"))
+
+    async def scenario():
+        await manager.start()
+        try:
+            job = await manager.submit([UploadFile(io.BytesIO(b"imagen"), filename="factura.png")])
+            events = manager.subscribe(job["job_id"])
+            received = []
+            while not received or received[-1]["event"] not in ("job_finished", "job_deferred"):
+                received.append(await asyncio.wait_for(events.get(), timeout=5))
+            return job["job_id"], received
+        finally:
+            await manager.stop()
+
+    job_id, received = asyncio.run(scenario())
+    assert [event["event"] for event in received] == ["image_started", "image_finished", "job_deferred"]
+    assert received[-1]["deferred_images"] == 1
+    job_folder = in_tmp_dir / "jobs" / job_id
+    assert json.loads((job_folder / "job.json").read_text())["state"] == "deferred"
+    assert not (job_folder / ".job.json.tmp").exists()
+
+
+def test_job_state_saves_stay_ordered_off_the_event_loop(in_tmp_dir):
+    jobs_path = in_tmp_dir / "jobs"
+    job_id = _write_job(jobs_path, "processing", timedelta(0))
+    manager = FactureJobManager(None, jobs_path=str(jobs_path))
+    job = json.loads((jobs_path / job_id / "job.json").read_text())
+
+    async def save(step):
+        job["images"][0]["result"] = {"step": step, "total": Decimal("1234567.89")}
+        await manager._touch(job)
+
+    async def scenario():
+        await asyncio.gather(*(save(step) for step in range(20)))
+
+    asyncio.run(scenario())
+    saved = json.loads((jobs_path / job_id / "job.json").read_text())
+    assert saved["images"][0]["result"] == {"step": 19, "total": "1234567.89"}
+
+
+def test_job_state_save_fsyncs_file_and_folder(in_tmp_dir, monkeypatch):
+    jobs_path = in_tmp_dir / "jobs"
+    job_id = _write_job(jobs_path, "processing", timedelta(0))
+    manager = FactureJobManager(None, jobs_path=str(jobs_path))
+    job = json.loads((jobs_path / job_id / "job.json").read_text())
+    calls = []
+    real_fsync, real_replace = os.fsync, os.replace
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append("fsync") or real_fsync(fd))
+    monkeypatch.setattr(os, "replace", lambda src, dst: calls.append("replace") or real_replace(src, dst))
+
+    asyncio.run(manager._touch(job))
+    # En Windows no se puede abrir la carpeta para sincronizarla
+    assert calls == (["fsync", "replace"] if os.name == "nt" else ["fsync", "replace", "fsync"])
@@ -0,0 +1,49 @@
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from app.models.model_recibe_facture import FactureWeekend
+from app.models.model_truck_facture import FactureTrip
+from app.utils import json_codec
+
+FIXTURES = Path(__file__).parent / "fixtures" / "json_codec"
+WEEKEND_DATA = json_codec.load_file(FIXTURES / "weekend" / "factura.json")["data_facture"]
+TRIP_DATA = json_codec.load_file(FIXTURES / "trip" / "factura.json")["data_facture"]
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_facture_weekend_round_trip_keeps_decimal_precision(pretty):
+    facture = FactureWeekend(**WEEKEND_DATA)
+    restored = FactureWeekend(**json_codec.loads(json_codec.dumps(facture.model_dump(), pretty=pretty)))
+    assert restored == facture
+    assert restored.total == Decimal("4827.5864")
+    assert restored.concepts[0].dutys_of_concept[0].import_with_fee_rate == Decimal("689.6552")
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_facture_trip_round_trip(pretty):
+    facture = FactureTrip(**TRIP_DATA)
+    restored = FactureTrip(**json_codec.loads(json_codec.dumps(facture.model_dump(), pretty=pretty)))
+    assert restored == facture
+
+
+def test_decimal_is_serialized_as_exact_string():
+    amount = Decimal("12345678901234567.89")
+    assert json_codec.loads(json_codec.dumps({"total": amount})) == {"total": "12345678901234567.89"}
+    assert json_codec.loads(json_codec.stdlib_dumps({"total": amount}, False)) == {"total": "12345678901234567.89"}
+
+
+def test_dump_file_and_load_file(tmp_path):
+    document = {"data_facture": FactureTrip(**TRIP_DATA).model_dump(), "data_crud": "Peso Bruto"}
+    path = tmp_path / "factura.json"
+    json_codec.dump_file(path, document)
+    loaded = json_codec.load_file(path)
+    assert FactureTrip(**loaded["data_facture"]) == FactureTrip(**TRIP_DATA)
+    assert loaded["data_crud"] == "Peso Bruto"
+
+
+def test_benchmark_cycles_the_fixture_documents():
+    result = json_codec.run_benchmark([FIXTURES], records=20)
+    assert result["samples"] == 2
+    assert all(stats["bytes"] > 0 for stats in result["codecs"].values())
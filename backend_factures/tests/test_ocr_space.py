@@ -0,0 +1,125 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.ocr_space import OCRSpaceService
+
+
+def _parsed(text):
+    return {
+        "IsErroredOnProcessing": False,
+        "ParsedResults": [{"ParsedText": text, "TextOverlay": {"Lines": []}}]
+    }
+
+
+async def _with_stand_in(handler, scenario):
+    calls = {"count": 0, "transports": set()}
+
+    async def parse_image(request):
+        calls["count"] += 1
+        calls["transports"].add(id(request.transport))
+        form = await request.post()
+        assert form["apikey"] == "test-key"
+        assert form["file"].file.read()
+        return await handler(request, calls)
+
+    app = web.Application()
+    app.router.add_post("/parse/image", parse_image)
+    server = TestServer(app)
+    await server.start_server()
+    service = OCRSpaceService(
+        "test-key",
+        base_url=str(server.make_url("/parse/image")),
+        requests_per_second=1000,
+        max_retries=1,
+        backoff_base=0.01,
+        backoff_max=0.01
+    )
+    try:
+        return await scenario(service, calls)
+    finally:
+        await service.close()
+        await server.close()
+
+
+def test_successful_parse_reuses_the_session():
+    async def handler(request, calls):
+        return web.json_response(_parsed(f"Peso Bruto 39,450.00 llamada {calls['count']}"))
+
+    async def scenario(service, calls):
+        first = await service.extract_text(b"imagen-1", "a.png")
+        session = service._session
+        second = await service.extract_text(b"imagen-2", "b.png")
+        third = await service.extract_text(b"imagen-3", "c.png")
+        assert service._session is session
+        return first, second, third, calls
+
+    first, second, third, calls = asyncio.run(_with_stand_in(handler, scenario))
+    assert first["success"] and second["success"] and third["success"]
+    assert first["text"] == "Peso Bruto 39,450.00 llamada 1"
+    assert first["word_count"] == 5
+    assert first["engine"] == "ocr_space"
+    assert calls["count"] == 3
+    assert len(calls["transports"]) == 1
+
+
+def test_errored_on_processing_is_not_retried():
+    async def handler(request, calls):
+        return web.json_response({"IsErroredOnProcessing": True, "ErrorMessage": ["Unable to recognize the file type"]})
+
+    async def scenario(service, calls):
+        return await service.extract_text(b"imagen", "a.png"), calls
+
+    result, calls = asyncio.run(_with_stand_in(handler, scenario))
+    assert not result["success"]
+    assert result["error"] == ["Unable to recognize the file type"]
+    assert result["attempts"] == 1
+    assert not result["backend_error"]
+    assert calls["count"] == 1
+
+
+def test_http_5xx_is_retried_and_reported_as_backend_error():
+    async def handler(request, calls):
+        return web.Response(status=503)
+
+    async def scenario(service, calls):
+        return await service.extract_text(b"imagen", "a.png"), calls
+
+    result, calls = asyncio.run(_with_stand_in(handler, scenario))
+    assert not result["success"]
+    assert result["error"] == "Error en API OCR: 503"
+    assert result["attempts"] == 2
+    assert result["backend_error"]
+    assert calls["count"] == 2
+
+
+def test_file_size_error_is_not_a_backend_error():
+    async def handler(request, calls):
+        return web.json_response({
+            "IsErroredOnProcessing": True,
+            "ErrorMessage": ["File failed validation. File size exceeds the maximum permissible file size limit of 1024 KB"]
+        })
+
+    async def scenario(service, calls):
+        return await service.extract_text(b"imagen", "a.png"), calls
+
+    result, calls = asyncio.run(_with_stand_in(handler, scenario))
+    assert not result["success"]
+    assert not result["backend_error"]
+    assert calls["count"] == 1
+
+
+def test_rate_limit_message_is_retried():
+    async def handler(request, calls):
+        if calls["count"] == 1:
+            return web.json_response({"IsErroredOnProcessing": True, "ErrorMessage": ["Too many requests, rate limit reached"]})
+        return web.json_response(_parsed("Peso Neto 12,000.00"))
+
+    async def scenario(service, calls):
+        return await service.extract_text(b"imagen", "a.png"), calls
+
+    result, calls = asyncio.run(_with_stand_in(handler, scenario))
+    assert result["success"]
+    assert result["attempts"] == 2
+    assert calls["count"] == 2
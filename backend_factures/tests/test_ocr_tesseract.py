@@ -0,0 +1,50 @@
+import asyncio
+import io
+import time
+
+import pytest
+from PIL import Image
+
+from app.services.ocr_engine import OCREngine
+from app.services.ocr_tesseract import TesseractOCRService, run_tesseract
+
+
+def test_ocr_engine_requires_request_ocr():
+    class IncompleteEngine(OCREngine):
+        engine_name = "incompleto"
+
+    with pytest.raises(TypeError):
+        IncompleteEngine()
+
+
+def test_missing_tesseract_binary_is_a_backend_error(monkeypatch):
+    pytesseract = pytest.importorskip("pytesseract")
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", "/ruta/inexistente/tesseract")
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, format="PNG")
+    result = run_tesseract(buffer.getvalue(), "spa", "--oem 1 --psm 6")
+    assert not result["success"]
+    assert result["backend_error"]
+
+
+def test_close_runs_off_the_event_loop():
+    engine = TesseractOCRService(max_workers=1)
+
+    async def scenario():
+        await engine.start()
+        engine._executor.submit(time.sleep, 0.2)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker_task = asyncio.create_task(ticker())
+        await engine.close()
+        ticker_task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) > 0
+    assert engine.get_stats()["is_running"] is False
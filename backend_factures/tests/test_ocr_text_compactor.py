@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from app.utils.ocr_text_compactor import compact_ocr_text_with_stats, run_benchmark
+
+CORPUS = Path(__file__).parent / "fixtures" / "cfdi"
+TICKETS = Path(__file__).resolve().parents[1] / "temp"
+
+
+def test_seal_blocks_are_dropped_and_value_lines_kept():
+    text = "\r\n".join([
+        "Subtotal\t$4,310.34",
+        "Impuestos retenidos",
+        "0.00",
+        "Impuestos trasladados",
+        "0.00",
+        "Sello digital del CFDI:",
+        "QmFzZTY0c2VsbG9kaWdpdGFsZGVsY2ZkaWZpY3RpY2lvYWJjZGVmZ2hpamtsbW5vcA==",
+        "Este documento es una representación impresa de un CFDI",
+    ])
+    compacted, stats = compact_ocr_text_with_stats(text, "facture_weekend")
+    assert compacted.splitlines() == ["Subtotal\t$4,310.34", "Impuestos retenidos", "0.00", "Impuestos trasladados", "0.00"]
+    assert stats["seal_lines_dropped"] == 2
+
+
+def test_lines_outside_the_invoice_sections_are_dropped_within_budget():
+    text = "\n".join(["Peso Bruto", "37,570.00", "Gracias por su preferencia", "Tara", "16,290.00"])
+    compacted, stats = compact_ocr_text_with_stats(text, "facture_trip")
+    assert compacted.splitlines() == ["Peso Bruto", "37,570.00", "Tara", "16,290.00"]
+    assert stats["section_lines_dropped"] == 1
+    assert not stats["budget_trimmed"]
+
+
+def test_compaction_keeps_rule_and_template_accuracy():
+    result = run_benchmark([CORPUS, TICKETS], measure_accuracy=False)
+    assert result["documents"] == 7
+    assert result["token_reduction"] > 0.05
+    assert result["rule_accuracy_delta"] == 0.0
+    assert all(row["compact_rule_accuracy"] == row["raw_rule_accuracy"] for row in result["rows"])
+
+
+def test_benchmark_without_llm_leaves_accuracy_unverified():
+    result = run_benchmark([CORPUS], measure_accuracy=False)
+    assert result["documents"] == 5
+    assert result["tokens_out"] < result["tokens_in"]
+    assert not result["accuracy_measured"]
+    assert result["accuracy_delta"] is None
+    assert all(row["compact_accuracy"] is None for row in result["rows"])
@@ -0,0 +1,94 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.ollama_client import OllamaClient
+
+
+async def _with_ollama_stand_in(scenario, failures_before_ready=1):
+    requests = []
+
+    async def generate(request):
+        payload = await request.json()
+        requests.append(payload)
+        if len(requests) <= failures_before_ready:
+            return web.json_response({"error": "model is loading"}, status=500)
+        return web.json_response({"model": payload["model"], "response": "", "done": True, "load_duration": 2_500_000_000})
+
+    app = web.Application()
+    app.router.add_post("/api/generate", generate)
+    server = TestServer(app)
+    await server.start_server()
+    client = OllamaClient(str(server.make_url("")), keep_alive="30m", require_warm_up=True)
+    try:
+        return await scenario(client, requests)
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_warm_up_retries_until_the_model_loads_and_pins_it():
+    async def scenario(client, requests):
+        assert not client.is_ready()
+        status = await client.warm_up(["qwen2.5vl:3b"], retry_delay=0.01)
+        return status, client.is_ready(), client.breaker.state, requests
+
+    status, ready, breaker_state, requests = asyncio.run(_with_ollama_stand_in(scenario))
+    assert status["state"] == "ready"
+    assert status["attempts"] == 2
+    assert status["models"]["qwen2.5vl:3b"]["load_duration"] == 2.5
+    assert ready
+    assert breaker_state == "closed"
+    assert requests == [{"model": "qwen2.5vl:3b", "prompt": "", "keep_alive": "30m"}] * 2
+
+
+def test_warm_up_gives_up_after_max_attempts():
+    async def scenario(client, requests):
+        return await client.warm_up(["qwen2.5vl:3b"], max_attempts=2, retry_delay=0.01), client.is_ready()
+
+    status, ready = asyncio.run(_with_ollama_stand_in(scenario, failures_before_ready=5))
+    assert status["state"] == "failed"
+    assert status["attempts"] == 2
+    assert not ready
+
+
+def test_generate_payload_carries_keep_alive():
+    async def scenario(client, requests):
+        await client.generate({"model": "qwen2.5vl:3b", "prompt": "hola", "stream": False})
+        return requests
+
+    requests = asyncio.run(_with_ollama_stand_in(scenario, failures_before_ready=0))
+    assert requests[0]["keep_alive"] == "30m"
+
+
+def test_uploads_get_503_until_the_model_is_ready(in_tmp_dir):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import router_facture
+
+    app = FastAPI()
+    app.include_router(router_facture.router, prefix="/api")
+    original_client = router_facture.image_processor.ollama_client
+    upload = {"files": ("factura.txt", b"no es una imagen", "text/plain")}
+    try:
+        async def scenario(client, requests):
+            router_facture.image_processor.ollama_client = client
+            with TestClient(app) as http:
+                assert http.get("/api/facture/ready").status_code == 503
+                response = http.post("/api/facture/image", files=upload, data={"enhance_ocr": "false"})
+                assert response.status_code == 503
+                assert response.headers["Retry-After"] == "5"
+            await client.warm_up(["qwen2.5vl:3b"], retry_delay=0.01)
+            with TestClient(app) as http:
+                ready = http.get("/api/facture/ready")
+                response = http.post("/api/facture/image", files=upload, data={"enhance_ocr": "false"})
+            return ready, response
+
+        ready, response = asyncio.run(_with_ollama_stand_in(scenario))
+    finally:
+        router_facture.image_processor.ollama_client = original_client
+    assert ready.status_code == 200
+    assert ready.json()["keep_alive"] == "30m"
+    assert response.status_code != 503
+    assert "Tipo de archivo no soportado" in response.json()["error"]
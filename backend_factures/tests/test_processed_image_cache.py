@@ -0,0 +1,63 @@
+from app.services.event_bus import INVOICE_FOLDER_REMOVED, event_bus
+from app.services.processed_image_cache import ProcessedImageCache
+
+
+def _put(cache, image_hash, folder):
+    cache.put(
+        image_hash,
+        "facture_trip",
+        "texto ocr",
+        {"code_facture": image_hash},
+        [f"{folder}/factura.json", f"{folder}/factura_original.jpeg", f"{folder}/factura_enhanced.png"],
+        {"confidence": 0.0, "word_count": 2, "source": "original"},
+        folder
+    )
+
+
+def test_get_does_not_depend_on_files_existing(in_tmp_dir):
+    cache = ProcessedImageCache(str(in_tmp_dir / "cache.sqlite3"))
+    _put(cache, "a", "Facturas/ACME/2025-10-09_08-00-00")
+    cached = cache.get("a")
+    assert cached["structured_data"] == {"code_facture": "a"}
+    assert cached["archivos_guardados"][0] == "Facturas/ACME/2025-10-09_08-00-00/factura.json"
+    cache.close()
+
+
+def test_invalidate_folder_removes_folder_and_nested_trips_only(in_tmp_dir):
+    cache = ProcessedImageCache(str(in_tmp_dir / "cache.sqlite3"))
+    _put(cache, "weekend", "Facturas/ACME/2025-10-09_08-00-00")
+    _put(cache, "trip", "Facturas/ACME/2025-10-09_08-00-00/2025-10-09_GPE")
+    _put(cache, "sibling", "Facturas/ACME/2025-10-09_08-00-001")
+    assert cache.invalidate_folder("Facturas/ACME/2025-10-09_08-00-00") == 2
+    assert cache.get("weekend") is None
+    assert cache.get("trip") is None
+    assert cache.get("sibling") is not None
+    assert cache.get_stats()["invalidations"] == 2
+    cache.close()
+
+
+def test_rewriting_a_folder_drops_the_previous_image(in_tmp_dir):
+    cache = ProcessedImageCache(str(in_tmp_dir / "cache.sqlite3"))
+    _put(cache, "old", "Facturas/ACME/2025-10-09_08-00-00")
+    _put(cache, "new", "Facturas/ACME/2025-10-09_08-00-00")
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    cache.close()
+
+
+def test_delete_invoice_publishes_folder_removed(in_tmp_dir):
+    from app.services.file_manager_service import FileManagerService
+
+    removed = []
+    handler = lambda payload: removed.append(payload["folder"])
+    event_bus.subscribe(INVOICE_FOLDER_REMOVED, handler)
+    try:
+        file_manager = FileManagerService(str(in_tmp_dir / "Facturas"))
+        folder = in_tmp_dir / "Facturas" / "ACME" / "2025-10-09_08-00-00"
+        folder.mkdir(parents=True)
+        (folder / "factura.json").write_text("{}")
+        result = file_manager.delete_invoice("ACME", "2025-10-09_08-00-00")
+    finally:
+        event_bus.unsubscribe(INVOICE_FOLDER_REMOVED, handler)
+    assert result["success"]
+    assert removed == [str(folder)]
@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services.processing_text import AITextProcessorService
+
+
+def _trip(net_weight):
+    return SimpleNamespace(gross_weight=30000.0, tare_weight=10000.0, net_weight=net_weight, kg_desc_accepted_weight=net_weight)
+
+
+def _service(monkeypatch):
+    monkeypatch.setenv("OLLAMA_MODEL_CASCADE", "chico,grande")
+    return AITextProcessorService()
+
+
+def _cascade_calls(service, generated, net_weight):
+    calls = []
+
+    async def process_invoice(text, ollama_client, model_name, response_cache, generated_fields):
+        calls.append(model_name)
+        generated_fields.extend(generated)
+        return _trip(net_weight)
+
+    facture = asyncio.run(service._run_cascade("facture_trip", "texto", process_invoice))
+    return facture, calls
+
+
+def test_template_extraction_is_not_counted_as_a_tier_attempt(in_tmp_dir, monkeypatch):
+    service = _service(monkeypatch)
+    facture, calls = _cascade_calls(service, [], 20000.0)
+    assert facture.net_weight == 20000.0
+    assert calls == ["chico"]
+    assert all(tier["attempts"] == 0 for tier in service.get_cascade_stats()["facture_trip"])
+
+
+def test_rule_values_failing_validation_do_not_escalate(in_tmp_dir, monkeypatch):
+    service = _service(monkeypatch)
+    facture, calls = _cascade_calls(service, ["name_operator"], 19000.0)
+    assert facture.net_weight == 19000.0
+    assert calls == ["chico"]
+    assert service.get_cascade_stats()["facture_trip"][0]["escalated"] == 1
+
+
+def test_model_values_failing_validation_escalate(in_tmp_dir, monkeypatch):
+    service = _service(monkeypatch)
+    _, calls = _cascade_calls(service, ["net_weight"], 19000.0)
+    assert calls == ["chico", "grande"]
+    assert [tier["attempts"] for tier in service.get_cascade_stats()["facture_trip"]] == [1, 1]
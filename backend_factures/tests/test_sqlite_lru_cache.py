@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from app.services.llm_response_cache import LLMResponseCache
+from app.services.ocr_result_cache import OCRResultCache
+from app.services.processed_image_cache import ProcessedImageCache
+
+
+def test_byte_limit_evicts_least_recently_used(in_tmp_dir):
+    cache = OCRResultCache(str(in_tmp_dir / "ocr.sqlite3"), max_bytes=300)
+    result = {"success": True, "text": "x" * 60}
+    for key in ("a", "b", "c"):
+        cache.put(key, key.encode(), {"engine": "test"}, result)
+        time.sleep(0.01)
+    assert cache.get("a") is not None
+    cache.put("d", b"d", {"engine": "test"}, result)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get_stats()["evictions"] == 1
+    cache.close()
+
+
+def test_ttl_expires_entries(in_tmp_dir):
+    cache = LLMResponseCache(str(in_tmp_dir / "llm.sqlite3"), ttl_seconds=0.05)
+    cache.put("clave", "modelo", "prompt", {"total": "10.00"})
+    assert cache.get("clave") == {"total": "10.00"}
+    time.sleep(0.1)
+    assert cache.get("clave") is None
+    assert cache.get_stats()["expirations"] == 1
+    cache.close()
+
+
+def test_async_access_runs_off_the_event_loop(in_tmp_dir):
+    cache = LLMResponseCache(str(in_tmp_dir / "llm.sqlite3"))
+
+    async def scenario():
+        await cache.put_async("clave", "modelo", "prompt", {"code_facture": "GPE3420"})
+        return await cache.get_async("clave")
+
+    assert asyncio.run(scenario()) == {"code_facture": "GPE3420"}
+    cache.close()
+
+
+def test_processed_cache_evicts_by_entry_count(in_tmp_dir):
+    cache = ProcessedImageCache(str(in_tmp_dir / "processed.sqlite3"), max_entries=1)
+    cache.put("a", "facture_trip", "", {}, [], {}, "temp/2025-10-09_GPE")
+    time.sleep(0.01)
+    cache.put("b", "facture_trip", "", {}, [], {}, "temp/2025-09-27_GPE3164")
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get_stats()["evictions"] == 1
+    cache.close()
@@ -0,0 +1,54 @@
+import asyncio
+import unicodedata
+from pathlib import Path
+
+import pytest
+
+from app.models.model_truck_facture import FactureTrip
+from app.utils import json_codec
+from app.utils.facture_trip_processor import process_facture_trip_invoice
+from app.utils.trip_ticket_templates import parse_trip_ticket
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+TICKET_PATHS = sorted((BACKEND_ROOT / "temp").rglob("factura.json"))
+# La razón social sale de la constante de la plantilla; en data_facture quedó como la leyó el OCR
+OCR_FREE_FIELDS = ("name_business",)
+
+
+def _without_accents(value: str) -> str:
+    return unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+
+
+@pytest.mark.parametrize("json_path", TICKET_PATHS, ids=lambda path: path.parent.name)
+def test_ticket_matches_its_reviewed_data(json_path):
+    document = json_codec.load_file(json_path)
+    template_name, _ = parse_trip_ticket(document["data_crud"])
+    assert template_name is not None
+
+    facture = asyncio.run(process_facture_trip_invoice(document["data_crud"], None, "modelo"))
+    extracted = json_codec.loads(json_codec.dumps(facture.model_dump()))
+    # Se pasa por el modelo para comparar fechas y decimales con la misma serialización
+    expected = json_codec.loads(json_codec.dumps(FactureTrip(**document["data_facture"]).model_dump()))
+    for field, value in expected.items():
+        if field in OCR_FREE_FIELDS:
+            continue
+        if field == "name_operator":
+            # El modelo añadía los acentos que el ticket no imprime
+            assert _without_accents(extracted[field]) == _without_accents(value)
+        else:
+            assert extracted[field] == value, field
+
+
+def test_timestamps_are_month_first_and_received_date_follows_its_label():
+    document = json_codec.load_file(BACKEND_ROOT / "temp" / "2025-10-09_GPE" / "factura.json")
+    _, fields = parse_trip_ticket(document["data_crud"])
+    assert fields["date_entry"] == "2025-10-09 09:26:08"
+    assert fields["date_exit"] == "2025-10-09 10:13:38"
+    assert fields["recibes_trip"] == "2025-10-10 00:00:00"
+
+
+def test_net_weight_is_kept_as_read():
+    document = json_codec.load_file(BACKEND_ROOT / "temp" / "2025-10-09_GPE" / "factura.json")
+    text = document["data_crud"].replace("21,280.00", "21,279.50")
+    _, fields = parse_trip_ticket(text)
+    assert fields["net_weight"] == "21,279.50"
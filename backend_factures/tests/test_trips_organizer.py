@@ -0,0 +1,32 @@
+import threading
+
+from app.api.trips_organizer import BackgroundTripOrganizer
+
+
+class _RecordingFileManager:
+    def __init__(self):
+        self.sweep_threads = []
+
+    def get_all_trips_in_temp(self):
+        self.sweep_threads.append(threading.current_thread().name)
+        return []
+
+
+def test_organize_now_runs_on_the_organizer_thread():
+    file_manager = _RecordingFileManager()
+    organizer = BackgroundTripOrganizer(file_manager)
+    organizer.start()
+    try:
+        result = organizer.request_sweep().result(timeout=5)
+    finally:
+        organizer.stop()
+    assert result["success"]
+    # El barrido inicial del planificador y el solicitado comparten el mismo hilo
+    assert file_manager.sweep_threads == ["BackgroundTripOrganizer", "BackgroundTripOrganizer"]
+
+
+def test_organize_now_runs_inline_when_the_organizer_is_stopped():
+    file_manager = _RecordingFileManager()
+    result = BackgroundTripOrganizer(file_manager).request_sweep().result(timeout=5)
+    assert result["success"]
+    assert file_manager.sweep_threads == [threading.current_thread().name]